@@ -0,0 +1,477 @@
+from sqlalchemy import func, case, text, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+import copy
+import math
+
+from database import SessionLocal, Analytics, AnalyticsSketch, Complaint, User
+from sketches import QuantileSketch
+
+DECISION_STATUSES = ("approved", "rejected")
+RESPONSE_TIME_SKETCH = "response_time_hours"
+
+def _month(value: datetime = None):
+    return (value or datetime.utcnow()).strftime("%Y-%m")
+
+def _bump(counter: dict, key, delta: int):
+    counter[key] = counter.get(key, 0) + delta
+
+def _trend_entry(trends: list, month: str):
+    for entry in trends:
+        if entry["month"] == month:
+            return entry
+    entry = {"month": month, "count": 0, "approved": 0, "rejected": 0}
+    trends.append(entry)
+    trends.sort(key=lambda e: e["month"])
+    return entry
+
+def lock_analytics(db: Session):
+    """Hold the write lock on the counters until the caller commits, so
+    concurrent writers (outbox dispatchers, registrations) cannot overwrite
+    each other's JSON counters. SELECT ... FOR UPDATE (PostgreSQL) locks the
+    rows as they are read; SQLite ignores it, so there a no-op UPDATE takes
+    the database write lock before anything is read."""
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(update(Analytics).values(updated_at=Analytics.updated_at))
+
+def get_or_create_analytics(db: Session):
+    # Also locks the response time sketch, which is only loaded after this
+    lock_analytics(db)
+    analytics = db.query(Analytics).with_for_update().first()
+    if not analytics:
+        analytics = Analytics(total_complaints=0)
+        db.add(analytics)
+    return analytics
+
+# JSON columns are not mutation-tracked, so work on copies and assign back
+def _load_state(analytics: Analytics):
+    return copy.deepcopy({
+        "total_complaints": analytics.total_complaints or 0,
+        "complaints_by_status": analytics.complaints_by_status or {},
+        "complaints_by_category": analytics.complaints_by_category or {},
+        "complaints_by_priority": analytics.complaints_by_priority or {},
+        "monthly_trends": analytics.monthly_trends or [],
+        "user_stats": analytics.user_stats or {},
+    })
+
+def _store_state(analytics: Analytics, state: dict):
+    analytics.total_complaints = state["total_complaints"]
+    analytics.complaints_by_status = state["complaints_by_status"]
+    analytics.complaints_by_category = state["complaints_by_category"]
+    analytics.complaints_by_priority = state["complaints_by_priority"]
+    analytics.monthly_trends = state["monthly_trends"]
+    analytics.user_stats = state["user_stats"]
+    analytics.updated_at = datetime.utcnow()
+
+# Incremental updates: each touches only the single analytics row, so the
+# cost of a write no longer grows with the number of complaints or users.
+# The caller owns the transaction and commits together with the domain change.
+def record_complaint_created(db: Session, complaint: Complaint):
+    record_complaints_created(db, [complaint])
+
+def record_complaints_created(db: Session, complaints: list):
+    # Anything with status, complaint_type, priority and created_at
+    analytics = get_or_create_analytics(db)
+    state = _load_state(analytics)
+    _count_created(state, complaints)
+    _store_state(analytics, state)
+
+def _count_created(state: dict, complaints: list):
+    for complaint in complaints:
+        state["total_complaints"] += 1
+        _bump(state["complaints_by_status"], complaint.status or "pending", 1)
+        _bump(state["complaints_by_category"], complaint.complaint_type, 1)
+        _bump(state["complaints_by_priority"], complaint.priority or "medium", 1)
+
+        entry = _trend_entry(state["monthly_trends"], _month(complaint.created_at))
+        entry["count"] += 1
+        if complaint.status in DECISION_STATUSES:
+            entry[complaint.status] += 1
+
+def decision_time(complaint: Complaint):
+    # When the complaint was approved or rejected, None while it is undecided
+    if complaint.status in DECISION_STATUSES and complaint.approved_by is not None:
+        return complaint.updated_at
+    return None
+
+def record_status_change(db: Session, complaint: Complaint, old_status: str, old_decided_at: datetime = None):
+    new_status = complaint.status
+    new_decided_at = decision_time(complaint)
+    if old_status == new_status and old_decided_at == new_decided_at:
+        return
+
+    analytics = get_or_create_analytics(db)
+    if old_status != new_status:
+        state = _load_state(analytics)
+
+        _bump(state["complaints_by_status"], old_status, -1)
+        _bump(state["complaints_by_status"], new_status, 1)
+
+        # Trends are bucketed by the month the complaint was filed
+        entry = _trend_entry(state["monthly_trends"], _month(complaint.created_at))
+        if old_status in DECISION_STATUSES:
+            entry[old_status] -= 1
+        if new_status in DECISION_STATUSES:
+            entry[new_status] += 1
+
+        _store_state(analytics, state)
+
+    # Response time is measured to the latest decision, so a re-decision
+    # swaps the old sample for the new one
+    if old_decided_at != new_decided_at:
+        row, sketch = load_sketch(db, RESPONSE_TIME_SKETCH)
+        old_hours = _response_hours(complaint.created_at, old_decided_at)
+        new_hours = _response_hours(complaint.created_at, new_decided_at)
+        if old_hours is not None:
+            sketch.remove(old_hours)
+        if new_hours is not None:
+            sketch.add(new_hours)
+        _store_sketch(row, sketch)
+        analytics.response_time_stats = summarize_response_times(sketch)
+
+class ComplaintChange(NamedTuple):
+    created_at: datetime
+    old_status: str
+    new_status: str
+    old_decided_at: Optional[datetime]
+    new_decided_at: Optional[datetime]
+    old_priority: str
+    new_priority: str
+
+def record_complaint_changes(db: Session, changes: List[ComplaintChange]):
+    # Batch form of record_status_change (plus priority moves) for bulk
+    # moderation: the analytics row and the sketch are loaded and stored once
+    analytics = get_or_create_analytics(db)
+    state = _load_state(analytics)
+    row, sketch = None, None
+    if any(change.old_decided_at != change.new_decided_at for change in changes):
+        row, sketch = load_sketch(db, RESPONSE_TIME_SKETCH)
+    _count_changes(state, sketch, changes)
+    _store_state(analytics, state)
+    if sketch is not None:
+        _store_sketch(row, sketch)
+        analytics.response_time_stats = summarize_response_times(sketch)
+
+def _count_changes(state: dict, sketch: Optional[QuantileSketch], changes: List[ComplaintChange]):
+    for change in changes:
+        if change.old_status != change.new_status:
+            _bump(state["complaints_by_status"], change.old_status, -1)
+            _bump(state["complaints_by_status"], change.new_status, 1)
+            entry = _trend_entry(state["monthly_trends"], _month(change.created_at))
+            if change.old_status in DECISION_STATUSES:
+                entry[change.old_status] -= 1
+            if change.new_status in DECISION_STATUSES:
+                entry[change.new_status] += 1
+        if change.old_priority != change.new_priority:
+            _bump(state["complaints_by_priority"], change.old_priority, -1)
+            _bump(state["complaints_by_priority"], change.new_priority, 1)
+        if change.old_decided_at != change.new_decided_at:
+            old_hours = _response_hours(change.created_at, change.old_decided_at)
+            new_hours = _response_hours(change.created_at, change.new_decided_at)
+            if old_hours is not None:
+                sketch.remove(old_hours)
+            if new_hours is not None:
+                sketch.add(new_hours)
+
+def record_user_created(db: Session, user: User):
+    analytics = get_or_create_analytics(db)
+    state = _load_state(analytics)
+
+    stats = state["user_stats"]
+    current_month = _month()
+    if stats.get("month") != current_month:
+        stats["month"] = current_month
+        stats["newUsersThisMonth"] = 0
+
+    _bump(stats, "totalUsers", 1)
+    if user.is_active is not False:
+        _bump(stats, "activeUsers", 1)
+    if _month(user.created_at) == current_month:
+        _bump(stats, "newUsersThisMonth", 1)
+
+    _store_state(analytics, state)
+
+# Response times (hours from filing to approval/rejection) are kept in a
+# mergeable quantile sketch so percentiles never require rescanning history
+def _response_hours(created_at: datetime, decided_at: datetime):
+    if created_at is None or decided_at is None:
+        return None
+    return max((decided_at - created_at).total_seconds() / 3600, 0.0)
+
+def load_sketch(db: Session, name: str):
+    row = db.query(AnalyticsSketch).filter(AnalyticsSketch.name == name).with_for_update().first()
+    if not row:
+        row = AnalyticsSketch(name=name)
+        db.add(row)
+        return row, QuantileSketch()
+    return row, QuantileSketch.from_dict(row.state or {})
+
+def _store_sketch(row: AnalyticsSketch, sketch: QuantileSketch):
+    row.state = sketch.to_dict()
+    row.updated_at = datetime.utcnow()
+
+def summarize_response_times(sketch: QuantileSketch):
+    if not sketch.count:
+        return {"count": 0}
+
+    def hours(value):
+        return round(value, 2)
+
+    return {
+        "count": sketch.count,
+        "average": hours(sketch.sum / sketch.count),
+        "median": hours(sketch.quantile(0.5)),
+        "p90": hours(sketch.quantile(0.9)),
+        "p99": hours(sketch.quantile(0.99)),
+        "fastest": hours(sketch.min),
+        "slowest": hours(sketch.max)
+    }
+
+def compute_response_time_sketch(db: Session, batch_size: int = 5000):
+    sketch = QuantileSketch()
+    rows = db.query(Complaint.created_at, Complaint.updated_at).filter(
+        Complaint.status.in_(DECISION_STATUSES),
+        Complaint.approved_by.isnot(None)
+    ).yield_per(batch_size)
+    for created_at, decided_at in rows:
+        hours = _response_hours(created_at, decided_at)
+        if hours is not None:
+            sketch.add(hours)
+    return sketch
+
+# Full recompute, used to verify and repair the incrementally maintained
+# counters. All counting is pushed into the database as GROUP BY queries so
+# no complaint or user rows are loaded into Python.
+def _month_expr(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def _count_by(db: Session, column):
+    return {key: count for key, count in db.query(column, func.count()).group_by(column)}
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def query_complaint_counts(db: Session):
+    by_status = _count_by(db, Complaint.status)
+    return {
+        "total_complaints": sum(by_status.values()),
+        "complaints_by_status": by_status,
+        "complaints_by_category": _count_by(db, Complaint.complaint_type),
+        "complaints_by_priority": _count_by(db, Complaint.priority),
+    }
+
+def query_monthly_trends(db: Session):
+    month = _month_expr(db, Complaint.created_at)
+    rows = db.query(
+        month,
+        func.count(),
+        _count_if(Complaint.status == "approved"),
+        _count_if(Complaint.status == "rejected")
+    ).group_by(month).order_by(month)
+    return [
+        {"month": row[0], "count": row[1], "approved": row[2], "rejected": row[3]}
+        for row in rows
+    ]
+
+def query_user_stats(db: Session):
+    current_month = _month()
+    month_start = datetime.strptime(current_month, "%Y-%m")
+    total, active, new = db.query(
+        func.count(),
+        _count_if(User.is_active == True),
+        _count_if(User.created_at >= month_start)
+    ).one()
+    return {
+        "totalUsers": total,
+        "activeUsers": active,
+        "newUsersThisMonth": new,
+        "month": current_month
+    }
+
+def query_monthly_user_activity(db: Session):
+    # New registrations and distinct complaint filers per month
+    user_month = _month_expr(db, User.created_at)
+    complaint_month = _month_expr(db, Complaint.created_at)
+    new_users = dict(db.query(user_month, func.count()).group_by(user_month))
+    active_users = dict(
+        db.query(complaint_month, func.count(func.distinct(Complaint.user_id)))
+        .group_by(complaint_month)
+    )
+    return [
+        {"month": month, "newUsers": new_users.get(month, 0), "activeUsers": active_users.get(month, 0)}
+        for month in sorted(set(new_users) | set(active_users))
+        if month
+    ]
+
+def compute_analytics(db: Session):
+    state = query_complaint_counts(db)
+    state["monthly_trends"] = query_monthly_trends(db)
+    state["user_stats"] = query_user_stats(db)
+    return state
+
+# Live statistics straight from the database, in the AnalyticsResponse shape
+def aggregate_analytics(db: Session):
+    state = compute_analytics(db)
+    user_stats = dict(state["user_stats"])
+    user_stats["monthly"] = query_monthly_user_activity(db)
+
+    analytics = db.query(Analytics).first()
+    response_time_stats = (analytics.response_time_stats or {}) if analytics else {}
+
+    return {
+        "totalComplaints": state["total_complaints"],
+        "complaintsByStatus": state["complaints_by_status"],
+        "complaintsByCategory": state["complaints_by_category"],
+        "complaintsByPriority": state["complaints_by_priority"],
+        "monthlyTrends": state["monthly_trends"],
+        "userStats": user_stats,
+        "responseTimeStats": response_time_stats
+    }
+
+def _nonzero(counter: dict):
+    return {key: value for key, value in counter.items() if value}
+
+def _diff_state(expected: dict, actual: dict):
+    drift = {}
+    for field, value in expected.items():
+        current = actual.get(field)
+        if isinstance(value, dict) and field != "user_stats":
+            if _nonzero(value) != _nonzero(current or {}):
+                drift[field] = {"expected": value, "actual": current}
+        elif value != current:
+            drift[field] = {"expected": value, "actual": current}
+    return drift
+
+def _sketch_matches(expected: QuantileSketch, actual: QuantileSketch):
+    return (
+        expected.bins == actual.bins
+        and expected.zero_count == actual.zero_count
+        and math.isclose(expected.sum, actual.sum, rel_tol=1e-6, abs_tol=1e-6)
+    )
+
+def _begin_snapshot(db: Session):
+    # One read transaction for the whole recompute: REPEATABLE READ on
+    # PostgreSQL, and an explicit deferred BEGIN on SQLite, which only takes
+    # a shared lock (otherwise pysqlite runs every SELECT on its own)
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    else:
+        db.execute(text("BEGIN"))
+
+TREND_COUNTS = ("count", "approved", "rejected")
+USER_COUNTS = ("totalUsers", "activeUsers", "newUsersThisMonth")
+
+def _counter_delta(expected: dict, actual: dict):
+    return {key: expected.get(key, 0) - actual.get(key, 0) for key in set(expected) | set(actual)}
+
+def _trend_counts(trends: list):
+    return {entry["month"]: {key: entry.get(key, 0) for key in TREND_COUNTS} for entry in trends}
+
+def _state_delta(expected: dict, actual: dict):
+    # What to add to the counters to turn ``actual`` into ``expected``
+    delta = {"total_complaints": expected["total_complaints"] - actual["total_complaints"]}
+    for field in ("complaints_by_status", "complaints_by_category", "complaints_by_priority"):
+        delta[field] = _counter_delta(expected[field], actual[field])
+    expected_trends, actual_trends = _trend_counts(expected["monthly_trends"]), _trend_counts(actual["monthly_trends"])
+    delta["monthly_trends"] = {
+        month: _counter_delta(expected_trends.get(month, {}), actual_trends.get(month, {}))
+        for month in set(expected_trends) | set(actual_trends)
+    }
+    users, current = expected["user_stats"], actual["user_stats"]
+    if current.get("month") != users["month"]:
+        current = {}
+    delta["user_stats"] = _counter_delta(
+        {key: users[key] for key in USER_COUNTS}, {key: current.get(key, 0) for key in USER_COUNTS}
+    )
+    delta["month"] = users["month"]
+    return delta
+
+def _apply_delta(state: dict, delta: dict):
+    state["total_complaints"] += delta["total_complaints"]
+    for field in ("complaints_by_status", "complaints_by_category", "complaints_by_priority"):
+        for key, change in delta[field].items():
+            _bump(state[field], key, change)
+    for month, changes in delta["monthly_trends"].items():
+        entry = _trend_entry(state["monthly_trends"], month)
+        for key, change in changes.items():
+            entry[key] += change
+    state["monthly_trends"] = [
+        entry for entry in state["monthly_trends"] if any(entry[key] for key in TREND_COUNTS)
+    ]
+    stats = state["user_stats"]
+    if stats.get("month") != delta["month"]:
+        stats["month"] = delta["month"]
+        stats["newUsersThisMonth"] = 0
+    for key, change in delta["user_stats"].items():
+        _bump(stats, key, change)
+
+def reconcile_analytics(db: Session, repair: bool = True):
+    """Compare the counters with a full recompute and repair any drift.
+
+    The recompute reads one snapshot without taking the write lock, so
+    complaint writes and the outbox dispatcher carry on meanwhile. Analytics
+    deltas still queued in the outbox at the snapshot are replayed onto the
+    counters read there, and only the remaining difference is added to the
+    current counters afterwards, in a short write transaction: whatever was
+    applied since the snapshot is kept, and nothing is counted twice.
+    """
+    from outbox import pending_analytics
+
+    db.commit()
+    _begin_snapshot(db)
+    try:
+        expected = compute_analytics(db)
+        expected_sketch = compute_response_time_sketch(db)
+        analytics = db.query(Analytics).first()
+        actual = _load_state(analytics or Analytics(total_complaints=0))
+        actual_stats = (analytics.response_time_stats or {}) if analytics else {}
+        row = db.query(AnalyticsSketch).filter(AnalyticsSketch.name == RESPONSE_TIME_SKETCH).first()
+        actual_sketch = QuantileSketch.from_dict(row.state or {}) if row else QuantileSketch()
+        created, changes = pending_analytics(db)
+    finally:
+        db.rollback()
+
+    queued_decisions = any(change.old_decided_at != change.new_decided_at for change in changes)
+    _count_created(actual, created)
+    _count_changes(actual, actual_sketch, changes)
+    drift = _diff_state(expected, actual)
+
+    expected_stats = summarize_response_times(expected_sketch)
+    sketch_drift = not _sketch_matches(expected_sketch, actual_sketch)
+    if sketch_drift or (expected_stats != actual_stats and not queued_decisions):
+        drift["response_time_stats"] = {"expected": expected_stats, "actual": actual_stats}
+
+    if drift and repair:
+        analytics = get_or_create_analytics(db)
+        state = _load_state(analytics)
+        _apply_delta(state, _state_delta(expected, actual))
+        _store_state(analytics, state)
+        row, sketch = load_sketch(db, RESPONSE_TIME_SKETCH)
+        if sketch_drift:
+            sketch.shift(expected_sketch, actual_sketch)
+            _store_sketch(row, sketch)
+        analytics.response_time_stats = summarize_response_times(sketch)
+        db.commit()
+
+    return {"drift": drift, "repaired": bool(drift) and repair}
+
+def run_reconciliation(repair: bool = True):
+    db = SessionLocal()
+    try:
+        return reconcile_analytics(db, repair=repair)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import sys
+
+    result = run_reconciliation(repair="--check" not in sys.argv)
+    if not result["drift"]:
+        print("Analytics counters are consistent.")
+    else:
+        for field, values in result["drift"].items():
+            print(f"{field}: expected {values['expected']}, found {values['actual']}")
+        print("Repaired." if result["repaired"] else "Run without --check to repair.")
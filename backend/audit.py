@@ -0,0 +1,373 @@
+"""Append-only audit log, partitioned by month.
+
+Entries go to one table per calendar month (audit_logs_YYYYMM), created on
+first write and listed in audit_partitions. They arrive in batches from the
+outbox dispatcher, one INSERT per month touched, so the outbox is the write
+buffer and no entry is ever held only in memory. Listings read just the
+partitions in the requested time range, newest first.
+
+Months older than AUDIT_RETENTION_MONTHS are archived by
+``python audit.py archive``: the partition is written to a compressed file
+under AUDIT_ARCHIVE_DIR (Parquet with zstd when pyarrow is installed, gzip
+NDJSON otherwise) and its table dropped. Exports read archives too.
+
+Usage (from the backend directory):
+    python audit.py archive [--dry-run] [--retention-months N]
+    python audit.py export [--format csv] [--user-id N] [--action A] [--since 2026-01-01] > audit.ndjson
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from decouple import config
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, JSON, Index, insert, select, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Optional
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import orjson
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+from database import SessionLocal, AuditPartition
+from exports import csv_chunk, ndjson_chunk
+from pagination import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+
+AUDIT_RETENTION_MONTHS = config("AUDIT_RETENTION_MONTHS", default=12, cast=int)
+AUDIT_ARCHIVE_DIR = config("AUDIT_ARCHIVE_DIR", default="archive/audit")
+EXPORT_CHUNK_ROWS = 1000
+
+AUDIT_COLUMNS = [
+    "id", "user_id", "user_name", "action", "resource", "resource_id",
+    "details", "ip_address", "user_agent", "timestamp",
+]
+ENTRY_COLUMNS = AUDIT_COLUMNS[1:]
+
+if pyarrow is not None:
+    ARCHIVE_SCHEMA = pyarrow.schema([
+        ("id", pyarrow.int64()), ("user_id", pyarrow.int64()), ("user_name", pyarrow.string()),
+        ("action", pyarrow.string()), ("resource", pyarrow.string()), ("resource_id", pyarrow.string()),
+        ("details", pyarrow.string()),  # JSON text
+        ("ip_address", pyarrow.string()), ("user_agent", pyarrow.string()),
+        ("timestamp", pyarrow.timestamp("us")),
+    ])
+
+metadata = MetaData()
+_metadata_lock = threading.Lock()
+_timestamp = Column("timestamp", DateTime)  # for decoding cursors
+
+def partition_table(month: str):
+    name = f"audit_logs_{month}"
+    with _metadata_lock:
+        table = metadata.tables.get(name)
+        if table is None:
+            # Same layout as migrations/0010_audit_partitions.py
+            table = Table(
+                name, metadata,
+                Column("id", Integer, primary_key=True),
+                Column("user_id", Integer),
+                Column("user_name", String),
+                Column("action", String),
+                Column("resource", String),
+                Column("resource_id", String, nullable=True),
+                Column("details", JSON(none_as_null=True)),
+                Column("ip_address", String, nullable=True),
+                Column("user_agent", String, nullable=True),
+                Column("timestamp", DateTime),
+                Index(f"ix_{name}_timestamp", "timestamp"),
+                Index(f"ix_{name}_user_id_timestamp", "user_id", "timestamp"),
+            )
+        return table
+
+def month_key(timestamp: datetime):
+    return timestamp.strftime("%Y%m")
+
+def shift_month(month: str, months: int):
+    year, index = divmod(int(month[:4]) * 12 + int(month[4:]) - 1 + months, 12)
+    return f"{year:04d}{index + 1:02d}"
+
+def _naive_utc(value: Optional[datetime]):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class AuditFilters:
+    # Query parameters shared by the audit listing and export, used with Depends()
+    def __init__(
+        self,
+        user_id: Optional[int] = None,
+        action: Optional[str] = None,
+        resource: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        self.user_id = user_id
+        self.action = action
+        self.resource = resource
+        self.resource_id = resource_id
+        self.since = _naive_utc(since)
+        self.until = _naive_utc(until)
+
+    def _conditions(self):
+        return {
+            "user_id": self.user_id, "action": self.action,
+            "resource": self.resource, "resource_id": self.resource_id,
+        }
+
+    def apply(self, table, statement):
+        for name, value in self._conditions().items():
+            if value is not None:
+                statement = statement.where(table.c[name] == value)
+        if self.since:
+            statement = statement.where(table.c.timestamp >= self.since)
+        if self.until:
+            statement = statement.where(table.c.timestamp < self.until)
+        return statement
+
+    def matches(self, entry: dict):
+        # The same test for rows read back from archive files
+        for name, value in self._conditions().items():
+            if value is not None and entry[name] != value:
+                return False
+        timestamp = entry["timestamp"]
+        if self.since and (timestamp is None or timestamp < self.since):
+            return False
+        if self.until and (timestamp is None or timestamp >= self.until):
+            return False
+        return True
+
+    def months(self, statement, until: Optional[datetime] = None):
+        """Restrict a query on AuditPartition to the months in range."""
+        until = until or self.until
+        if self.since:
+            statement = statement.filter(AuditPartition.month >= month_key(self.since))
+        if until:
+            statement = statement.filter(AuditPartition.month <= month_key(until))
+        return statement
+
+def ensure_partitions(db: Session, months):
+    live = set(db.execute(
+        select(AuditPartition.month).filter(AuditPartition.month.in_(months), AuditPartition.live == True)
+    ).scalars())
+    dialect = db.get_bind().dialect.name
+    insert_partition = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    for month in sorted(set(months) - live):
+        # New month, or late entries for one already archived: those get a
+        # fresh table, archived again on the next run
+        partition_table(month).create(db.connection(), checkfirst=True)
+        statement = insert_partition(AuditPartition).values(month=month, live=True, created_at=datetime.utcnow())
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[AuditPartition.month], set_={"live": True}
+        ))
+
+def write(db: Session, entries: list):
+    """Append audit entries (dicts of ENTRY_COLUMNS); committed by the caller."""
+    by_month = defaultdict(list)
+    for entry in entries:
+        row = {column: entry.get(column) for column in ENTRY_COLUMNS}
+        row["timestamp"] = row["timestamp"] or datetime.utcnow()
+        by_month[month_key(row["timestamp"])].append(row)
+    if not by_month:
+        return
+    ensure_partitions(db, list(by_month))
+    for month, rows in by_month.items():
+        db.execute(insert(partition_table(month)), rows)
+
+async def list_entries(db: AsyncSession, filters: AuditFilters, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Newest first across the live partitions, keyset paginated on
+    (timestamp, id); each partition is read with its timestamp index and
+    older months only when the page is not yet full."""
+    after = decode_cursor(cursor, "-timestamp", _timestamp) if cursor else None
+    months = (await db.execute(
+        filters.months(select(AuditPartition.month).filter(AuditPartition.live == True), after and after[0])
+        .order_by(AuditPartition.month.desc())
+    )).scalars().all()
+
+    rows = []
+    for month in months:
+        table = partition_table(month)
+        statement = filters.apply(table, select(table))
+        if after:
+            statement = statement.where(tuple_(table.c.timestamp, table.c.id) < after)
+        statement = statement.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit + 1 - len(rows))
+        rows.extend(dict(row) for row in (await db.execute(statement)).mappings())
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("-timestamp", rows[-1]["timestamp"], rows[-1]["id"])
+    return rows, next_cursor
+
+def archive_files(month: str):
+    pattern = os.path.join(AUDIT_ARCHIVE_DIR, f"audit_logs_{month}_*")
+    return sorted(path for path in glob.glob(pattern) if path.endswith((".parquet", ".ndjson.gz")))
+
+def read_archive(path: str):
+    """Batches of entry dicts from an archive file."""
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            raise RuntimeError(f"pyarrow is required to read {path}")
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=EXPORT_CHUNK_ROWS):
+            rows = batch.to_pylist()
+            for row in rows:
+                row["details"] = json.loads(row["details"]) if row["details"] is not None else None
+            yield rows
+        return
+    with gzip.open(path, "rb") as f:
+        rows = []
+        for line in f:
+            row = orjson.loads(line)
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"]) if row["timestamp"] else None
+            rows.append(row)
+            if len(rows) == EXPORT_CHUNK_ROWS:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+def encode(rows, export_format: str):
+    if export_format == "csv":
+        return csv_chunk(rows, AUDIT_COLUMNS)
+    return ndjson_chunk(rows, AUDIT_COLUMNS)
+
+def export_entries(filters: AuditFilters, export_format: str = "ndjson"):
+    """Encoded chunks of every matching entry, archived or live, oldest month
+    first. A blocking generator: StreamingResponse runs it in a thread, and
+    rows are fetched EXPORT_CHUNK_ROWS at a time, so memory stays flat."""
+    db = SessionLocal()
+    try:
+        if export_format == "csv":
+            yield csv_chunk([], AUDIT_COLUMNS, header=True)
+        months = db.execute(
+            filters.months(select(AuditPartition.month, AuditPartition.live)).order_by(AuditPartition.month)
+        ).all()
+        for month, live in months:
+            for path in archive_files(month):
+                for rows in read_archive(path):
+                    rows = [row for row in rows if filters.matches(row)]
+                    if rows:
+                        yield encode(rows, export_format)
+            if live:
+                table = partition_table(month)
+                statement = filters.apply(table, select(table)).order_by(table.c.timestamp, table.c.id)
+                result = db.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+                for rows in result.mappings().partitions():
+                    yield encode(rows, export_format)
+    finally:
+        db.close()
+
+def _archive_record(row):
+    record = dict(row)
+    record["details"] = json.dumps(record["details"]) if record["details"] is not None else None
+    return record
+
+def write_archive(db: Session, month: str):
+    """Write one partition to a new archive file; returns (path, rows)."""
+    table = partition_table(month)
+    os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    extension = "parquet" if pyarrow is not None else "ndjson.gz"
+    path = os.path.join(AUDIT_ARCHIVE_DIR, f"audit_logs_{month}_{stamp}.{extension}")
+    statement = select(table).order_by(table.c.timestamp, table.c.id)
+    count = 0
+    try:
+        with open(path + ".tmp", "wb") as f:
+            if pyarrow is not None:
+                writer = parquet.ParquetWriter(f, ARCHIVE_SCHEMA, compression="zstd")
+            else:
+                writer = gzip.GzipFile(fileobj=f, mode="wb")
+            for rows in db.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS)).mappings().partitions():
+                if pyarrow is not None:
+                    writer.write_table(pyarrow.Table.from_pylist([_archive_record(row) for row in rows], schema=ARCHIVE_SCHEMA))
+                else:
+                    writer.write(encode(rows, "ndjson"))
+                count += len(rows)
+            writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            raise FileExistsError(path)
+        os.replace(path + ".tmp", path)
+    except Exception:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        raise
+    return path, count
+
+def archive_expired(db: Session, retention_months: int = AUDIT_RETENTION_MONTHS, dry_run: bool = False):
+    """Archive and drop the live partitions older than the retention window
+    (the current month plus ``retention_months`` before it)."""
+    cutoff = shift_month(month_key(datetime.utcnow()), -retention_months)
+    months = db.execute(
+        select(AuditPartition.month).filter(AuditPartition.live == True, AuditPartition.month < cutoff)
+        .order_by(AuditPartition.month)
+    ).scalars().all()
+    db.rollback()
+    if dry_run:
+        return [(month, None, None) for month in months]
+
+    archived = []
+    for month in months:
+        # Marking the month archived first takes SQLite's write lock, so no
+        # entry can be appended between reading the partition and dropping it
+        db.execute(update(AuditPartition).where(AuditPartition.month == month).values(live=False, archived_at=datetime.utcnow()))
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text(f"LOCK TABLE {partition_table(month).name} IN EXCLUSIVE MODE"))
+        try:
+            path, count = write_archive(db, month)
+            partition_table(month).drop(db.connection())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        archived.append((month, path, count))
+    return archived
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit log retention and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive = commands.add_parser("archive", help="archive and drop partitions past retention")
+    archive.add_argument("--retention-months", type=int, default=AUDIT_RETENTION_MONTHS)
+    archive.add_argument("--dry-run", action="store_true")
+    export = commands.add_parser("export", help="write matching entries to stdout")
+    export.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export.add_argument("--user-id", type=int)
+    export.add_argument("--action")
+    export.add_argument("--resource")
+    export.add_argument("--since", type=datetime.fromisoformat)
+    export.add_argument("--until", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        filters = AuditFilters(args.user_id, args.action, args.resource, None, args.since, args.until)
+        for chunk in export_entries(filters, args.format):
+            sys.stdout.buffer.write(chunk)
+        return
+
+    db = SessionLocal()
+    try:
+        archived = archive_expired(db, args.retention_months, args.dry_run)
+    finally:
+        db.close()
+    for month, path, count in archived:
+        if args.dry_run:
+            print(f"{month}: would archive")
+        else:
+            print(f"{month}: {count} entries -> {path}")
+    if not archived:
+        print("Nothing to archive")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,119 @@
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from database import get_db, User
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from decouple import config
+from typing import NamedTuple
+from database import get_db, AsyncSessionLocal, User
+from cache import TTLCache
+from passwords import pwd_context
+from tokens import create_access_token, create_refresh_token, decode_token, InvalidToken
 
-SECRET_KEY = "your-secret-key-change-in-production"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-REFRESH_TOKEN_EXPIRE_DAYS = 7
+# Authenticated users are cached per worker by token subject. Writes through
+# the ORM invalidate immediately; the TTL bounds staleness across workers
+PRINCIPAL_CACHE_SIZE = config("PRINCIPAL_CACHE_SIZE", default=10000, cast=int)
+PRINCIPAL_CACHE_TTL_SECONDS = config("PRINCIPAL_CACHE_TTL_SECONDS", default=60, cast=float)
+# Put uid and role in access tokens so require_role decides from the token
+# alone. Role changes then only take effect when the token expires
+TOKEN_ROLE_CLAIMS = config("TOKEN_ROLE_CLAIMS", default=False, cast=bool)
+
+PRINCIPAL_COLUMNS = [User.id, User.email, User.full_name, User.phone, User.address, User.role, User.created_at, User.is_active]
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Blocking versions for scripts; endpoints use the async pool in passwords.py
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "type": "access"})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+_invalidations = 0
+
+class Principal(NamedTuple):
+    # Identity taken from token claims, without a database round trip
+    id: int
+    email: str
+    role: str
+
+def invalidate_principal(email: str = None):
+    # Drop one cached user, or all of them after bulk UPDATEs that bypass the ORM
+    global _invalidations
+    _invalidations += 1
+    if email is None:
+        principal_cache.clear()
+    else:
+        principal_cache.pop(email)
 
-def create_refresh_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    invalidate_principal(target.email)
+    # An email change leaves the old subject cached too
+    for old_email in inspect(target).attrs.email.history.deleted:
+        invalidate_principal(old_email)
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def token_claims(user: User):
+    claims = {"sub": user.email}
+    if TOKEN_ROLE_CLAIMS:
+        claims.update({"uid": user.id, "role": user.role})
+    return claims
+
+def verify_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None or payload.get("type") != "access":
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email
-    except JWTError:
+        return decode_token(credentials.credentials, "access")
+    except InvalidToken:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def get_current_user(email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+def verify_token(payload: dict = Depends(verify_token_claims)):
+    return payload["sub"]
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+async def get_current_user(email: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """The authenticated user, served from the principal cache when possible.
+
+    The result is a detached User built from a column snapshot: read its
+    attributes freely, but load the row through ``db`` before changing it.
+    """
+    snapshot = principal_cache.get(email)
+    if snapshot is None:
+        invalidations = _invalidations
+        row = (await db.execute(select(*PRINCIPAL_COLUMNS).filter(User.email == email))).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        snapshot = dict(row._mapping)
+        # Skip caching if the user may have changed while we were reading
+        if invalidations == _invalidations:
+            principal_cache.set(email, snapshot)
+    return User(**snapshot)
+
+async def stream_user(token: str):
+    """The user behind a long-lived stream (SSE, WebSocket).
+
+    Browsers cannot set headers on those connections, so the access token may
+    come from a query parameter. The lookup uses a short session of its own
+    rather than holding a pooled connection for the life of the stream.
+    """
+    try:
+        claims = decode_token(token or "", "access")
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if TOKEN_ROLE_CLAIMS and "role" in claims and "uid" in claims:
+        return Principal(claims["uid"], claims["sub"], claims["role"])
+    async with AsyncSessionLocal() as db:
+        return await get_current_user(claims["sub"], db)
 
 def require_role(required_roles: list):
-    def role_checker(current_user: User = Depends(get_current_user)):
+    async def role_checker(claims: dict = Depends(verify_token_claims), db: AsyncSession = Depends(get_db)):
+        if TOKEN_ROLE_CLAIMS and "role" in claims and "uid" in claims:
+            current_user = Principal(claims["uid"], claims["sub"], claims["role"])
+        else:
+            current_user = await get_current_user(claims["sub"], db)
         if current_user.role not in required_roles:
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         return current_user
@@ -0,0 +1,107 @@
+"""Compare the SQL GROUP BY analytics path with the old Python loop.
+
+Usage (from the backend directory):
+    python benchmarks/bench_analytics.py [--sizes 10000,100000,1000000]
+
+Each size is seeded into a throwaway SQLite file with Core bulk inserts.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from database import Base, User, Complaint
+from analytics import compute_analytics
+from taxonomy import CATEGORIES, STATUSES, PRIORITIES
+
+USER_COUNT = 1000
+BATCH_SIZE = 50000
+
+def legacy_update_analytics(db: Session):
+    # The loop update_analytics ran on every complaint registration
+    complaints = db.query(Complaint).all()
+    users = db.query(User).all()
+
+    complaints_by_status = {}
+    complaints_by_category = {}
+    complaints_by_priority = {}
+    for complaint in complaints:
+        complaints_by_status[complaint.status] = complaints_by_status.get(complaint.status, 0) + 1
+        complaints_by_category[complaint.complaint_type] = complaints_by_category.get(complaint.complaint_type, 0) + 1
+        complaints_by_priority[complaint.priority] = complaints_by_priority.get(complaint.priority, 0) + 1
+
+    return {
+        "total_complaints": len(complaints),
+        "complaints_by_status": complaints_by_status,
+        "complaints_by_category": complaints_by_category,
+        "complaints_by_priority": complaints_by_priority,
+        "totalUsers": len(users),
+        "activeUsers": len([u for u in users if u.is_active])
+    }
+
+def seed(engine, size: int):
+    rng = random.Random(size)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password": "x", "full_name": f"User {i}",
+             "phone": "", "address": "", "role": "user", "is_active": i % 10 != 0,
+             "created_at": now - timedelta(days=rng.randint(0, 720))}
+            for i in range(USER_COUNT)
+        ])
+        for start in range(0, size, BATCH_SIZE):
+            rows = []
+            for i in range(start, min(start + BATCH_SIZE, size)):
+                created_at = now - timedelta(minutes=rng.randint(0, 720 * 24 * 60))
+                rows.append({
+                    "title": f"Complaint {i}", "description": "Benchmark complaint",
+                    "incident_date": created_at, "incident_location": "Benchmark",
+                    "complaint_type": rng.choice(CATEGORIES), "status": rng.choice(STATUSES),
+                    "priority": rng.choice(PRIORITIES), "user_id": rng.randint(1, USER_COUNT),
+                    "created_at": created_at, "updated_at": created_at
+                })
+            conn.execute(insert(Complaint), rows)
+
+def timed(fn, engine, repeat: int):
+    best = None
+    for _ in range(repeat):
+        with Session(engine) as db:
+            started = time.perf_counter()
+            result = fn(db)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(size: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        seed(engine, size)
+
+        legacy_seconds, legacy = timed(legacy_update_analytics, engine, repeat)
+        sql_seconds, current = timed(compute_analytics, engine, repeat)
+        engine.dispose()
+
+    assert legacy["complaints_by_status"] == current["complaints_by_status"]
+    assert legacy["complaints_by_category"] == current["complaints_by_category"]
+    assert legacy["totalUsers"] == current["user_stats"]["totalUsers"]
+
+    print(f"{size:>10,} complaints | python loop {legacy_seconds * 1000:10.1f} ms | "
+          f"group by {sql_seconds * 1000:8.1f} ms | speedup {legacy_seconds / sql_seconds:6.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        run(size, args.repeat)
@@ -0,0 +1,311 @@
+"""End-to-end API latency and throughput, per endpoint.
+
+Seeds a throwaway database with bulk_import's synthetic generator, then
+drives the real app either in process (through httpx's ASGI transport, with
+the startup hooks running) or under uvicorn, keeping ``--concurrency``
+requests in flight against one endpoint at a time. Reports p50/p95/p99
+latency and requests per second per endpoint, optionally as JSON, and
+compares them against a stored baseline: any endpoint whose p95 or
+throughput is more than ``--tolerance`` worse fails the run.
+
+Usage (from the backend directory, needs httpx):
+    python benchmarks/bench_api.py --complaints 100000 --output results.json
+    python benchmarks/bench_api.py --mode uvicorn --workers 4 --baseline results.json
+    python benchmarks/bench_api.py --database /tmp/bench-1m.db --complaints 1000000   # seeds once, then reuses
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from load_test import latency_stats
+
+PASSWORD = "password123"
+OFFICER = "officer@police.gov"
+# Benchmarks log in far more often than the per-IP throttle allows
+BENCH_ENV = {
+    "LOGIN_ATTEMPTS_PER_IP": "1000000000",
+    "GAZETTEER_PATH": os.path.join(BACKEND_DIR, "data", "gazetteer.csv"),
+}
+
+def complaint_form(rng: random.Random):
+    return {"data": {
+        "title": f"Bicycle stolen near Central Park #{rng.randint(1, 10 ** 9)}",
+        "description": "Lock was cut overnight. There is a camera on the corner that may have recorded it.",
+        "incident_date": datetime.utcnow().isoformat(),
+        "incident_location": f"{rng.randint(1, 400)} Central Park",
+        "complaint_type": "Theft/Burglary",
+        "priority": "medium",
+    }}
+
+def png_bytes(rng: random.Random, size: int = 32):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def complaint_form_with_image(rng: random.Random):
+    # Random pixels, so every upload is a new blob with derivatives to render
+    request = complaint_form(rng)
+    request["files"] = [("images", ("evidence.png", png_bytes(rng), "image/png"))]
+    return request
+
+# (name, role, method, path, request kwargs or a function of a Random returning them)
+SCENARIOS = [
+    ("login", None, "POST", "/auth/login", None),
+    ("register_complaint", "user", "POST", "/complaints/register", complaint_form),
+    ("register_complaint_image", "user", "POST", "/complaints/register", complaint_form_with_image),
+    ("list_complaints", "police", "GET", "/complaints/", {}),
+    ("list_complaints_pending", "police", "GET", "/complaints/", {"params": {"status": "pending"}}),
+    ("my_complaints", "user", "GET", "/complaints/my", {}),
+    ("search_complaints", "police", "GET", "/complaints/search", {"params": {"q": "stolen"}}),
+    ("analytics", "police", "GET", "/analytics/", {}),
+    ("notifications", "user", "GET", "/notifications/", {}),
+    ("unread_count", "user", "GET", "/notifications/unread-count", {}),
+]
+SCENARIO_NAMES = [name for name, _, _, _, _ in SCENARIOS]
+
+def seed(complaints: int, users: int, seed_value: int):
+    from sqlalchemy import func, select
+    from bulk_import import Generator, Loader, generate, next_ids
+    from database import SessionLocal, Complaint
+    from init_db import create_initial_data
+
+    db = SessionLocal()
+    try:
+        if db.execute(select(func.count(Complaint.id))).scalar():
+            print("Database already seeded, reusing it")
+            return
+        create_initial_data()
+        started = time.perf_counter()
+        end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        first_user_id, first_complaint_id = next_ids(db)
+        db.rollback()
+        generator = Generator(seed_value, end_date, 365, first_user_id, first_complaint_id, PASSWORD)
+        generate(Loader(db), generator, users, complaints, 10000)
+        print(f"Seeded {complaints:,} complaints in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+def busiest_citizen():
+    # The account with the most complaints stands in for a heavy user
+    from sqlalchemy import func, select
+    from database import SessionLocal, User, Complaint
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(User.email).join(Complaint, Complaint.user_id == User.id).filter(User.role == "user")
+            .group_by(User.id, User.email).order_by(func.count(Complaint.id).desc()).limit(1)
+        ).scalar()
+    finally:
+        db.close()
+
+async def login(client, email: str):
+    response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def run_scenario(client, scenario, headers, emails, concurrency: int, seconds: float, rng: random.Random):
+    name, role, method, path, request = scenario
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            if name == "login":
+                kwargs = {"json": {"email": emails["user"], "password": PASSWORD}}
+            else:
+                kwargs = request(rng) if callable(request) else request
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers.get(role), **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latency_stats(latencies, errors, time.perf_counter() - started)
+
+async def run_scenarios(client, args):
+    emails = {"user": busiest_citizen(), "police": OFFICER}
+    headers = {role: await login(client, email) for role, email in emails.items()}
+    rng = random.Random(args.seed)
+    results = {}
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        if name not in args.endpoints:
+            continue
+        if args.warmup:
+            await run_scenario(client, scenario, headers, emails, args.concurrency, args.warmup, rng)
+        results[name] = await run_scenario(client, scenario, headers, emails, args.concurrency, args.duration, rng)
+        print_stats(name, results[name])
+    return results
+
+async def run_in_process(args):
+    import main
+
+    # Startup hooks start the password pool, outbox dispatcher and other
+    # background loops, as a worker would; the loops end with the event loop
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await run_scenarios(client, args)
+    finally:
+        await main.app.router.shutdown()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_until_up(client, server, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if (await client.get("/complaint-categories/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+async def run_uvicorn(args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL, start_new_session=True,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_until_up(client, server)
+            return await run_scenarios(client, args)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            pass
+        # Workers or their process pools can outlive a slow shutdown; the
+        # server runs in its own session so the whole group goes together
+        try:
+            os.killpg(server.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+def print_stats(name: str, stats: dict):
+    print(f"{name:<26} {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  "
+          f"p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}")
+
+def compare(report: dict, baseline: dict, tolerance: float):
+    """Print the change per endpoint against ``baseline``; returns the regressions."""
+    for key in ("mode", "complaints", "concurrency", "workers"):
+        if baseline.get(key) != report.get(key):
+            print(f"warning: baseline {key} is {baseline.get(key)!r}, this run {report.get(key)!r}")
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('started_at', 'unknown date')}), tolerance {tolerance:.0%}:")
+    for name, stats in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base["requests"] or not stats["requests"]:
+            print(f"{name:<26} no baseline")
+            continue
+        changes = {key: stats[key] / base[key] - 1 for key in ("p50_ms", "p95_ms", "p99_ms", "rps") if base[key]}
+        problems = []
+        if changes.get("p95_ms", 0) > tolerance:
+            problems.append(f"p95 {base['p95_ms']} -> {stats['p95_ms']} ms")
+        if changes.get("rps", 0) < -tolerance:
+            problems.append(f"throughput {base['rps']} -> {stats['rps']} req/s")
+        if stats["errors"] and not base["errors"]:
+            problems.append(f"{stats['errors']} errors")
+        line = "  ".join(f"{key.replace('_ms', '')} {change:+.0%}" for key, change in changes.items())
+        print(f"{name:<26} {line}{'  REGRESSION: ' + '; '.join(problems) if problems else ''}")
+        regressions.extend(f"{name}: {problem}" for problem in problems)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--complaints", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLite file to seed, or reuse if already seeded (default: a temp file)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5, help="seconds measured per endpoint")
+    parser.add_argument("--warmup", type=float, default=1, help="seconds run and discarded before each endpoint")
+    parser.add_argument("--endpoints", nargs="+", choices=SCENARIO_NAMES, default=SCENARIO_NAMES)
+    parser.add_argument("--output", help="write the JSON report here (e.g. to use as the next baseline)")
+    parser.add_argument("--baseline", help="JSON report to compare against; regressions exit non-zero")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional p95/throughput change")
+    parser.add_argument("--json", action="store_true", help="print the JSON report")
+    args = parser.parse_args()
+
+    # Uploads, archives and the database all land in a scratch directory
+    for name in ("database", "output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    database = args.database or os.path.join(workdir, "bench.db")
+    os.environ.update(BENCH_ENV, DATABASE_URL=f"sqlite:///{database}")
+    os.chdir(workdir)
+    try:
+        seed(args.complaints, args.users, args.seed)
+        report = {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+            "complaints": args.complaints,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        }
+        print(f"Running {len(args.endpoints)} endpoints {args.mode}, {args.concurrency} concurrent, {args.duration}s each")
+        runner = run_uvicorn if args.mode == "uvicorn" else run_in_process
+        report["endpoints"] = asyncio.run(runner(args))
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Full-text complaint search latency.
+
+Seeds a throwaway SQLite database through the migrations (so the FTS5 index
+is maintained by its triggers while rows go in), then times the first and
+a later page of /complaints/search queries with different selectivity.
+
+Usage (from the backend directory):
+    python benchmarks/bench_search.py [--size 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+
+from database import User, Complaint
+from migrate import upgrade
+from queries import ComplaintFilters
+from search import SearchIndex, search_complaints
+from taxonomy import STATUSES
+
+USER_COUNT = 1000
+BATCH_SIZE = 50000
+# A few recognisable words with fixed frequencies, padded with a long tail
+COMMON_WORDS = ["stolen", "car", "phone", "window", "night", "street", "police", "damage"]
+RARE_WORDS = ["catalytic", "skateboard", "accordion"]
+TAIL_SIZE = 20000
+
+QUERIES = [
+    ("rare term", "accordion", {}),
+    ("common term", "stolen", {}),
+    ("two terms", "stolen phone", {}),
+    ("prefix", "skate*", {}),
+    ("phrase", '"broken window"', {}),
+    ("common + status", "night", {"status": "pending"}),
+]
+
+def text(rng, tail, length):
+    words = []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < 0.2:
+            words.append(rng.choice(COMMON_WORDS))
+        elif roll < 0.2002:
+            words.append(rng.choice(RARE_WORDS))
+        elif roll < 0.21:
+            words.append("broken window")
+        else:
+            words.append(tail[min(int(rng.paretovariate(1.1)), len(tail)) - 1])
+    return " ".join(words)
+
+def seed(engine, size: int):
+    rng = random.Random(size)
+    tail = [f"w{i}" for i in range(TAIL_SIZE)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password": "x", "full_name": f"User {i}",
+             "role": "user", "is_active": True, "created_at": now}
+            for i in range(USER_COUNT)
+        ])
+        for start in range(0, size, BATCH_SIZE):
+            rows = []
+            for i in range(start, min(start + BATCH_SIZE, size)):
+                created_at = now - timedelta(minutes=rng.randint(0, 720 * 24 * 60))
+                rows.append({
+                    "title": text(rng, tail, 5), "description": text(rng, tail, 30),
+                    "incident_date": created_at, "incident_location": text(rng, tail, 3),
+                    "complaint_type": "Other", "status": rng.choice(STATUSES), "priority": "medium",
+                    "user_id": rng.randint(1, USER_COUNT), "created_at": created_at, "updated_at": created_at
+                })
+            conn.execute(insert(Complaint), rows)
+
+async def timed_search(db, query, filters, sort, limit, repeat, cursor=None):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows, next_cursor = await search_complaints(db, query, filters, sort, cursor, limit)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows, next_cursor
+
+async def run_queries(path: str, repeat: int, limit: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with AsyncSession(engine) as db:
+        for label, query, filters in QUERIES:
+            matches = (await db.execute(
+                select(func.count()).select_from(SearchIndex(query, "sqlite").matches().subquery())
+            )).scalar()
+            print(f"  {label:<16} {query!r:<18} {matches:>9,} matches")
+            for sort in ("relevance", "newest"):
+                first, rows, cursor = await timed_search(db, query, ComplaintFilters(**filters), sort, limit, repeat)
+                line = f"    {sort:<10} first {len(rows)} in {first * 1000:7.1f} ms"
+                if cursor:
+                    later, rows, _ = await timed_search(db, query, ComplaintFilters(**filters), sort, limit, repeat, cursor)
+                    line += f" | next page in {later * 1000:7.1f} ms"
+                print(line)
+    await engine.dispose()
+
+def run(size: int, repeat: int, limit: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        upgrade(engine)
+        started = time.perf_counter()
+        seed(engine, size)
+        engine.dispose()
+        print(f"Seeded and indexed {size:,} complaints in {time.perf_counter() - started:.1f}s")
+        asyncio.run(run_queries(path, repeat, limit))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    run(args.size, args.repeat, args.limit)
@@ -0,0 +1,52 @@
+"""Bearer token verifications per second.
+
+Compares python-jose, PyJWT (when installed) and the verified-token cache
+in front of them, on a pool of distinct access tokens.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tokens.py [--tokens 1000] [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tokens
+
+def rate(fn, pool, seconds: float):
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for token in pool:
+            fn(token)
+        done += len(pool)
+    return done / seconds
+
+def run(count: int, seconds: float):
+    pool = [tokens.create_access_token({"sub": f"user{i}@example.com"}) for i in range(count)]
+    key = tokens.SIGNING_KEYS[tokens.ACTIVE_KID]
+
+    backends = [tokens.JoseBackend()]
+    if tokens.pyjwt is not None:
+        backends.append(tokens.PyJWTBackend())
+    else:
+        print("PyJWT not installed, skipping it")
+
+    print(f"{count} distinct tokens, {seconds}s per case")
+    for backend in backends:
+        print(f"  {backend.name:<24} {rate(lambda t: backend.decode(t, key), pool, seconds):>12,.0f} verifications/s")
+
+    tokens.token_cache.clear()
+    for token in pool:
+        tokens.decode_token(token, "access")
+    cached = rate(lambda t: tokens.decode_token(t, "access"), pool, seconds)
+    print(f"  {'cache (' + tokens.backend.name + ')':<24} {cached:>12,.0f} verifications/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=2)
+    args = parser.parse_args()
+    run(args.tokens, args.seconds)
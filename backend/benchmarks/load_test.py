@@ -0,0 +1,97 @@
+"""Concurrent HTTP load test against a running API server.
+
+Logs in once, then keeps ``--concurrency`` requests in flight for
+``--duration`` seconds, cycling through the endpoints, and reports requests
+per second and latency percentiles. Run it against two servers (for example
+the previous release and this one, each under uvicorn) to compare them.
+
+Usage (needs httpx):
+    uvicorn main:app --port 8000 &
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+DEFAULT_ENDPOINTS = ["/complaints/", "/analytics/", "/notifications/", "/users/profile"]
+
+def percentile(samples: list, q: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def latency_stats(latencies: list, errors: int, elapsed: float):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None,
+    }
+
+async def worker(client, endpoints, deadline, results, offset):
+    index = offset
+    while time.perf_counter() < deadline:
+        endpoint = endpoints[index % len(endpoints)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(endpoint)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        results.setdefault(endpoint, {"latencies": [], "errors": 0})
+        results[endpoint]["latencies"].append(elapsed)
+        if not ok:
+            results[endpoint]["errors"] += 1
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        login = await client.post("/auth/login", json={"email": args.email, "password": args.password})
+        login.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        results = {}
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            worker(client, args.endpoints, deadline, results, i) for i in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    report = {"url": args.url, "concurrency": args.concurrency, "duration": round(elapsed, 2), "endpoints": {}}
+    total = 0
+    for endpoint, data in results.items():
+        total += len(data["latencies"])
+        report["endpoints"][endpoint] = latency_stats(data["latencies"], data["errors"], elapsed)
+    report["total_rps"] = round(total / elapsed, 1)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="officer@police.gov")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--json", action="store_true", help="print the machine-readable report")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for endpoint, stats in report["endpoints"].items():
+            print(f"{endpoint:<24} {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>7} ms  "
+                  f"p95 {stats['p95_ms']:>7} ms  p99 {stats['p99_ms']:>7} ms  errors {stats['errors']}")
+        print(f"{'total':<24} {report['total_rps']:>8} req/s")
@@ -0,0 +1,312 @@
+"""Content-addressed evidence store.
+
+Every uploaded image is stored once under the SHA-256 of the upload as
+received, however many complaints reference it, with its EXIF, XMP and
+other location-bearing metadata stripped (see uploads.strip_metadata). Complaint.images holds immutable ``/evidence/...``
+URLs and ``evidence_blobs.ref_count`` tracks how many references exist.
+
+Thumbnail and web-sized derivatives live under ``uploads/derived`` and are
+served from ``/evidence/<sha256>/<variant>.webp``.
+
+Usage (from the backend directory):
+    python blobstore.py gc [--grace-hours 24] [--dry-run]
+    python blobstore.py derivatives   # render any missing derivatives
+    python blobstore.py strip         # strip metadata from older originals
+"""
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import update, delete
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime, timedelta
+import glob
+import mimetypes
+import os
+import re
+import shutil
+import time
+
+from database import SessionLocal, Complaint, EvidenceBlob
+from evidence_urls import BLOB_NAME, blob_url, parse_blob_url
+from uploads import UPLOAD_DIR, CHUNK_SIZE, StoredUpload, stream_to_temp, strip_metadata
+import derivatives
+
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+DERIVED_DIR = os.path.join(UPLOAD_DIR, "derived")
+# Names never change meaning, so clients and proxies may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def blob_path(sha256: str, extension: str):
+    return os.path.join(BLOB_DIR, sha256[:2], f"{sha256}{extension}")
+
+def derivative_dir(sha256: str):
+    return os.path.join(DERIVED_DIR, sha256[:2], sha256)
+
+def schedule_derivatives(stored_uploads: list):
+    for stored in stored_uploads:
+        source = blob_path(stored.sha256, os.path.splitext(stored.path)[1])
+        derivatives.schedule(source, derivative_dir(stored.sha256))
+
+async def store_upload(upload: UploadFile):
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    temp_path, stored, extension = await stream_to_temp(upload, BLOB_DIR)
+
+    path = blob_path(stored.sha256, extension)
+    if os.path.exists(path):
+        # Same content already stored: keep the existing copy. Touching it
+        # tells a concurrent GC it is in use before the reference commits
+        os.unlink(temp_path)
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    return stored._replace(path=blob_url(stored.sha256, extension))
+
+def add_references(db: Session, stored_uploads: list):
+    # Upsert so concurrent uploads of the same content never conflict
+    if not stored_uploads:
+        return
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    now = datetime.utcnow()
+    for stored in stored_uploads:
+        statement = insert(EvidenceBlob).values(
+            sha256=stored.sha256,
+            size=stored.size,
+            content_type=stored.content_type,
+            extension=os.path.splitext(stored.path)[1],
+            ref_count=1,
+            created_at=now,
+            last_referenced_at=now
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[EvidenceBlob.sha256],
+            set_={"ref_count": EvidenceBlob.ref_count + 1, "last_referenced_at": now}
+        ))
+
+def _parse_range(header: str, size: int):
+    # Single byte ranges only; anything else is answered with the full body
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        start, end = max(size - length, 0), size - 1
+    else:
+        start, end = int(start), int(end) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def _read_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def blob_response(request: Request, name: str):
+    match = BLOB_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    sha256, extension = match.group(1), match.group(2) or ""
+    path = blob_path(sha256, extension)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    return _file_response(request, path, f'"{sha256}"', IMMUTABLE_CACHE_CONTROL)
+
+def derivative_response(request: Request, sha256: str, name: str):
+    variant, _, extension = name.partition(".")
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256) or variant not in derivatives.DERIVATIVES \
+            or f".{extension}" != derivatives.DERIVATIVE_EXTENSION:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+
+    path = os.path.join(derivative_dir(sha256), name)
+    if os.path.isfile(path):
+        return _file_response(request, path, f'"{sha256}-{variant}"', IMMUTABLE_CACHE_CONTROL)
+
+    # Not rendered yet: serve the original, but let clients come back for the
+    # derivative instead of caching this answer
+    originals = glob.glob(blob_path(sha256, ".*")) + glob.glob(blob_path(sha256, ""))
+    if not originals:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    return _file_response(request, originals[0], f'"{sha256}"', "no-cache")
+
+def _file_response(request: Request, path: str, etag: str, cache_control: str):
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_read_file(path, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_read_file(path, 0, size), media_type=media_type, headers=headers)
+
+def collect_garbage(db: Session, grace: timedelta = timedelta(hours=24), dry_run: bool = False):
+    """Recount references from Complaint.images and delete unreferenced blobs.
+
+    Blobs referenced within ``grace`` are kept, since their complaint may
+    still be committing. Rows are deleted only if still unreferenced when the
+    DELETE runs, and files are removed after it commits, unless an upload
+    reused them meanwhile. Files without a row and abandoned temp files are
+    removed too.
+    """
+    references = Counter()
+    for (images,) in db.query(Complaint.images).filter(Complaint.images.isnot(None)).yield_per(5000):
+        for url in images or []:
+            sha256 = parse_blob_url(url)
+            if sha256:
+                references[sha256] += 1
+
+    cutoff = datetime.utcnow() - grace
+    report = {"recounted": 0, "deleted_blobs": 0, "deleted_files": 0, "freed_bytes": 0}
+    known = set()
+    expired = []
+    for blob in db.query(EvidenceBlob).yield_per(5000):
+        known.add(blob.sha256)
+        count = references.get(blob.sha256, 0)
+        if count != blob.ref_count:
+            report["recounted"] += 1
+            if not dry_run:
+                db.execute(update(EvidenceBlob).where(EvidenceBlob.sha256 == blob.sha256).values(ref_count=count))
+        if count == 0 and (blob.last_referenced_at or blob.created_at) < cutoff:
+            expired.append((blob.sha256, blob.extension, blob.size))
+
+    deleted = expired
+    if not dry_run:
+        deleted = []
+        for start in range(0, len(expired), 500):
+            # Re-checked in the DELETE itself: a complaint may have referenced
+            # the blob since the recount
+            deleted += db.execute(
+                delete(EvidenceBlob).where(
+                    EvidenceBlob.sha256.in_([sha256 for sha256, _, _ in expired[start:start + 500]]),
+                    EvidenceBlob.ref_count == 0,
+                    EvidenceBlob.last_referenced_at < cutoff
+                ).returning(EvidenceBlob.sha256, EvidenceBlob.extension, EvidenceBlob.size)
+            ).all()
+        db.commit()
+
+    cutoff_ts = time.time() - grace.total_seconds()
+    for sha256, extension, size in deleted:
+        report["deleted_blobs"] += 1
+        path = blob_path(sha256, extension or "")
+        # A recent mtime means an upload reused the file and its reference
+        # has not committed yet; it recreates the row when it does
+        if os.path.exists(path) and os.path.getmtime(path) >= cutoff_ts:
+            continue
+        report["freed_bytes"] += size or 0
+        if dry_run:
+            continue
+        if os.path.exists(path):
+            os.unlink(path)
+        shutil.rmtree(derivative_dir(sha256), ignore_errors=True)
+
+    for root, _, files in os.walk(BLOB_DIR):
+        for filename in files:
+            path = os.path.join(root, filename)
+            match = BLOB_NAME.match(filename)
+            orphan = match is None or match.group(1) not in known
+            if orphan and os.path.getmtime(path) < cutoff_ts:
+                report["deleted_files"] += 1
+                report["freed_bytes"] += os.path.getsize(path)
+                if not dry_run:
+                    os.unlink(path)
+
+    # Derivatives whose original is gone
+    for path in glob.glob(os.path.join(DERIVED_DIR, "*", "*")):
+        sha256 = os.path.basename(path)
+        if sha256 not in known and os.path.getmtime(path) < cutoff_ts:
+            report["deleted_files"] += 1
+            if not dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+
+    if not dry_run:
+        db.commit()
+    return report
+
+def backfill_derivatives(db: Session):
+    """Render derivatives for every stored image that is missing some."""
+    jobs = []
+    for blob in db.query(EvidenceBlob).yield_per(5000):
+        source = blob_path(blob.sha256, blob.extension or "")
+        output_dir = derivative_dir(blob.sha256)
+        missing = any(
+            not os.path.exists(os.path.join(output_dir, derivatives.derivative_filename(v)))
+            for v in derivatives.DERIVATIVES
+        )
+        if missing and os.path.exists(source):
+            jobs.append((source, output_dir))
+
+    pool = derivatives.get_pool()
+    rendered = failed = 0
+    futures = [pool.submit(derivatives.render_derivatives, source, output_dir) for source, output_dir in jobs]
+    for (source, _), future in zip(jobs, futures):
+        try:
+            future.result()
+            rendered += 1
+        except Exception as e:
+            failed += 1
+            print(f"Derivative rendering failed for {source}: {e}")
+    derivatives.shutdown_pool()
+    return {"rendered": rendered, "failed": failed}
+
+def strip_stored_metadata(db: Session):
+    """Strip metadata from originals stored before uploads were stripped on ingest."""
+    stripped = 0
+    for blob in db.query(EvidenceBlob).yield_per(5000):
+        path = blob_path(blob.sha256, blob.extension or "")
+        if not os.path.exists(path):
+            continue
+        size = strip_metadata(path, blob.content_type)
+        if size is not None:
+            db.execute(update(EvidenceBlob).where(EvidenceBlob.sha256 == blob.sha256).values(size=size))
+            stripped += 1
+    db.commit()
+    return {"stripped": stripped}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evidence store maintenance")
+    parser.add_argument("command", choices=["gc", "derivatives", "strip"])
+    parser.add_argument("--grace-hours", type=float, default=24)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "derivatives":
+            report = backfill_derivatives(db)
+        elif args.command == "strip":
+            report = strip_stored_metadata(db)
+        else:
+            report = collect_garbage(db, timedelta(hours=args.grace_hours), args.dry_run)
+    finally:
+        db.close()
+
+    if args.command == "derivatives":
+        print(f"Rendered derivatives for {report['rendered']} images, {report['failed']} failed.")
+        raise SystemExit(1 if report["failed"] else 0)
+    if args.command == "strip":
+        print(f"Stripped metadata from {report['stripped']} images.")
+        raise SystemExit(0)
+    prefix = "Would delete" if args.dry_run else "Deleted"
+    print(f"Recounted {report['recounted']} blobs. {prefix} {report['deleted_blobs']} blobs and "
+          f"{report['deleted_files']} stray files ({report['freed_bytes']} bytes).")
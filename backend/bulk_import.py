@@ -0,0 +1,463 @@
+"""Bulk loading and synthetic data for capacity testing.
+
+Usage (from the backend directory):
+    python bulk_import.py load complaints complaints.ndjson [--batch-size 10000] [--commit-every 100000]
+    python bulk_import.py generate --users 10000 --complaints 1000000 [--seed 1] [--end-date 2026-01-01]
+    python bulk_import.py generate --complaints 100000 --output data/synthetic --format csv
+
+``load`` reads CSV or NDJSON (optionally gzipped) rows for users,
+complaints, notifications or audit and inserts them with executemany, many
+thousand rows per statement and per transaction. ``generate`` makes a
+deterministic data set (the same --seed and --end-date give the same rows)
+of users, complaints across the complaint taxonomy, and the notifications
+and audit entries those complaints would have produced. It loads them
+straight into DATABASE_URL or writes files that ``load`` accepts. Both
+report rows per second, and reconcile the analytics counters afterwards.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import math
+import os
+import random
+import time
+import orjson
+
+from analytics import reconcile_analytics
+from database import SessionLocal, User, Complaint, Notification
+from exports import csv_chunk, ndjson_chunk
+from geo import geocode, geohash_encode, get_gazetteer, location_columns
+from notifications import expiry
+from passwords import pwd_context
+from taxonomy import CATEGORIES, CRIME_TYPES, STATUSES, PRIORITIES
+import audit
+
+BATCH_SIZE = 10000
+COMMIT_EVERY = 100000
+PROGRESS_SECONDS = 5
+
+# Columns accepted per table and how to parse them from text
+FIELDS = {
+    "users": {
+        "id": int, "email": str, "password": str, "full_name": str, "phone": str,
+        "address": str, "role": str, "created_at": datetime, "is_active": bool,
+    },
+    "complaints": {
+        "id": int, "title": str, "description": str, "incident_date": datetime,
+        "incident_location": str, "complaint_type": str, "status": str, "crime_type": str,
+        "priority": str, "images": list, "witnesses": str, "assigned_officer": str,
+        "review_notes": str, "user_id": int, "approved_by": int, "created_at": datetime,
+        "updated_at": datetime, "latitude": float, "longitude": float,
+    },
+    "notifications": {
+        "id": int, "user_id": int, "title": str, "message": str, "type": str, "category": str,
+        "read": bool, "action_url": str, "meta_data": dict, "created_at": datetime, "expires_at": datetime,
+    },
+    "audit": {
+        "user_id": int, "user_name": str, "action": str, "resource": str, "resource_id": str,
+        "details": dict, "ip_address": str, "user_agent": str, "timestamp": datetime,
+    },
+}
+MODELS = {"users": User, "complaints": Complaint, "notifications": Notification}
+
+def parse(value, kind):
+    if value is None or value == "":
+        return None
+    if kind is datetime:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if kind is bool:
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "t", "yes")
+    if kind in (list, dict):
+        # JSON columns arrive as text in CSV
+        return json.loads(value) if isinstance(value, str) else value
+    return kind(value)
+
+def prepare(table: str, row: dict, now: datetime):
+    """A complete, typed row for ``table`` with the defaults the API would set."""
+    data = {name: parse(row.get(name), kind) for name, kind in FIELDS[table].items()}
+    if table == "users":
+        if not data["email"] or not data["password"]:
+            raise ValueError("users need an email and a password hash")
+        data["role"] = data["role"] or "user"
+        data["is_active"] = data["is_active"] is not False
+        data["created_at"] = data["created_at"] or now
+    elif table == "complaints":
+        data["status"] = data["status"] or "pending"
+        data["priority"] = data["priority"] or "medium"
+        data["created_at"] = data["created_at"] or now
+        data["updated_at"] = data["updated_at"] or data["created_at"]
+        if data["latitude"] is None or data["longitude"] is None:
+            data.update(location_columns(geocode(data["incident_location"])))
+        else:
+            data["geohash"] = geohash_encode(data["latitude"], data["longitude"])
+    elif table == "notifications":
+        data["read"] = bool(data["read"])
+        data["type"] = data["type"] or "info"
+        data["category"] = data["category"] or "general"
+        data["created_at"] = data["created_at"] or now
+        data["expires_at"] = data["expires_at"] or expiry(data["created_at"])
+    else:
+        data["timestamp"] = data["timestamp"] or now
+    return data
+
+def insert_batch(db: Session, table: str, rows: list):
+    if table == "audit":
+        audit.write(db, rows)
+        return
+    with_ids = sum(1 for row in rows if row["id"] is not None)
+    if with_ids == 0:
+        rows = [{key: value for key, value in row.items() if key != "id"} for row in rows]
+    elif with_ids != len(rows):
+        raise ValueError(f"{table}: either every row or none must have an id")
+    # Core insert: one executemany per batch, no ORM bookkeeping
+    db.execute(MODELS[table].__table__.insert(), rows)
+
+def sync_sequences(db: Session, tables):
+    # Explicit ids leave PostgreSQL sequences behind; SQLite needs nothing
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in tables:
+        if table in MODELS:
+            name = MODELS[table].__tablename__
+            db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE((SELECT max(id) FROM {name}), 1))"
+            ))
+    db.commit()
+
+class Meter:
+    # Rows and seconds spent per table, and overall wall-clock throughput
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._reported = self.start
+        self.rows = {}
+        self.seconds = {}
+
+    def add(self, table: str, rows: int, seconds: float):
+        self.rows[table] = self.rows.get(table, 0) + rows
+        self.seconds[table] = self.seconds.get(table, 0.0) + seconds
+        now = time.perf_counter()
+        if now - self._reported >= PROGRESS_SECONDS:
+            self._reported = now
+            total = sum(self.rows.values())
+            print(f"  {total:,} rows ({total / (now - self.start):,.0f} rows/s)")
+
+    def report(self):
+        for table, rows in self.rows.items():
+            seconds = self.seconds[table]
+            print(f"{table}: {rows:,} rows in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+        total = sum(self.rows.values())
+        elapsed = time.perf_counter() - self.start
+        print(f"total: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+def batched(rows, size: int):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class Loader:
+    """Inserts prepared batches, committing every ``commit_every`` rows."""
+    def __init__(self, db: Session, commit_every: int = COMMIT_EVERY):
+        self.db = db
+        self.commit_every = commit_every
+        self.meter = Meter()
+        self._uncommitted = 0
+        self.now = datetime.utcnow()
+
+    def load(self, table: str, rows: list):
+        start = time.perf_counter()
+        insert_batch(self.db, table, [prepare(table, row, self.now) for row in rows])
+        self._uncommitted += len(rows)
+        if self._uncommitted >= self.commit_every:
+            self.db.commit()
+            self._uncommitted = 0
+        self.meter.add(table, len(rows), time.perf_counter() - start)
+
+    def finish(self):
+        self.db.commit()
+        sync_sequences(self.db, self.meter.rows)
+        self.meter.report()
+        result = reconcile_analytics(self.db)
+        if result["drift"]:
+            print(f"Analytics counters updated: {', '.join(sorted(result['drift']))}")
+
+def read_rows(path: str):
+    """Dicts from a CSV or NDJSON file, either optionally gzipped."""
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        with opener(path, "rt", newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif name.endswith((".ndjson", ".jsonl")):
+        with opener(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+    else:
+        raise ValueError(f"{path}: expected a .csv or .ndjson file")
+
+# Synthetic data. Everything is drawn from one seeded Random in a fixed
+# order, so a seed and end date always produce the same rows
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Carlos", "Karen",
+    "Wei", "Aisha", "Mohammed", "Priya", "Hiroshi", "Olga", "Fatima", "Diego", "Amara", "Lars",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Chen", "Khan", "Patel", "Nguyen", "Kim", "Ivanova", "Okafor", "Silva", "Larsen",
+]
+STREETS = ["Oak St", "Elm Ave", "Maple Rd", "Cedar Ln", "Park Ave", "2nd St", "Lake Dr", "Hill Rd", "Pine St", "River Rd"]
+ITEMS = ["bicycle", "phone", "laptop", "wallet", "car", "handbag", "package", "power tools", "catalytic converter", "e-scooter"]
+TITLES = {
+    "Theft/Burglary": ["{item} stolen near {place}", "Break-in at apartment near {place}", "Shoplifting at store on {place}"],
+    "Assault/Violence": ["Assault outside bar near {place}", "Fight with injuries at {place}", "Man attacked walking home near {place}"],
+    "Vandalism/Property Damage": ["Graffiti on walls at {place}", "Car windows smashed near {place}", "Bus shelter destroyed at {place}"],
+    "Fraud/Scam": ["Phone scam pretending to be my bank", "Paid online seller, {item} never arrived", "Card skimmer found at ATM near {place}"],
+    "Drug-related": ["Suspected drug dealing at {place}", "Needles found in park near {place}", "People using drugs in stairwell at {place}"],
+    "Traffic Violation": ["Hit and run at {place}", "Cars racing on {place} every night", "Drunk driver swerving near {place}"],
+    "Cybercrime": ["Email account hacked and used for spam", "Harassment through social media", "Phishing texts about a parcel delivery"],
+    "Domestic Violence": ["Shouting and screaming from neighbouring flat", "Ongoing harassment by former partner", "Neighbour seen with injuries again"],
+    "Public Disturbance": ["Loud party past midnight near {place}", "Drunk and disorderly group at {place}", "Fireworks set off late at night near {place}"],
+    "Other": ["Suspicious person checking car doors near {place}", "Abandoned vehicle at {place}", "Found property handed in at {place}"],
+}
+SENTENCES = [
+    "It happened at around {hour}:00.", "There were {count} people who saw it.",
+    "The person was wearing a dark hoodie and ran off towards {street}.",
+    "There is a camera on the corner that may have recorded it.", "This is not the first time this has happened here.",
+    "I have photos I can share if needed.", "The estimated loss is about ${amount}.",
+    "A neighbour called me to tell me about it.", "Nobody was hurt but people are scared.",
+    "I reported it to the building manager as well.", "It was a {vehicle} with part of the plate ending in {digits}.",
+]
+VEHICLES = ["white van", "black sedan", "red hatchback", "grey SUV", "motorbike"]
+CATEGORY_WEIGHTS = [24, 10, 12, 12, 7, 11, 8, 5, 8, 3]
+STATUS_WEIGHTS = [35, 35, 15, 15]
+PRIORITY_WEIGHTS = [30, 45, 20, 5]
+# Incidents by hour of day, peaking in the evening
+HOUR_WEIGHTS = [3, 2, 2, 1, 1, 1, 2, 3, 4, 4, 4, 5, 5, 5, 5, 6, 6, 7, 8, 8, 8, 7, 6, 4]
+SALT_ALPHABET = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+FALLBACK_PLACES = [("Main Street", 40.7128, -74.0060), ("Central Park", 40.7829, -73.9654)]
+
+class Generator:
+    def __init__(self, seed: int, end_date: datetime, days: int, first_user_id: int, first_complaint_id: int,
+                 password: str):
+        self.rng = random.Random(seed)
+        self.end = end_date
+        self.days = days
+        self.first_user_id = first_user_id
+        self.next_complaint_id = first_complaint_id
+        # One bcrypt hash shared by every user, salted from the seed too
+        salt = "".join(self.rng.choice(SALT_ALPHABET) for _ in range(21)) + self.rng.choice(".Oeu")
+        self.password_hash = pwd_context.handler("bcrypt").using(salt=salt).hash(password)
+        places = sorted(get_gazetteer().places.values(), key=lambda place: place.name)
+        self.places = [(place.name, place.latitude, place.longitude) for place in places] or FALLBACK_PLACES
+        self.citizens = []
+        self.officers = []  # (id, full name)
+
+    def users(self, count: int):
+        rng = self.rng
+        officers = max(1, count // 100)
+        for index in range(count):
+            user_id = self.first_user_id + index
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            if index < officers:
+                role, email, name = "police", f"{first}.{last}.{user_id}@police.gov", f"Officer {first} {last}"
+                self.officers.append((user_id, name))
+            elif index == officers:
+                role, email, name = "admin", f"admin.{user_id}@crimewatch.com", f"{first} {last}"
+            else:
+                role, email, name = "user", f"{first}.{last}.{user_id}@example.com", f"{first} {last}"
+                self.citizens.append((user_id, name))
+            yield {
+                "id": user_id, "email": email.lower(), "password": self.password_hash, "full_name": name,
+                "phone": f"+1-555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+                "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}", "role": role,
+                "created_at": self.end - timedelta(days=self.days + rng.randint(0, 365)),
+                "is_active": rng.random() > 0.02,
+            }
+
+    def _description(self):
+        rng = self.rng
+        sentences = rng.sample(SENTENCES, rng.randint(2, 4))
+        return " ".join(sentence.format(
+            hour=rng.randint(0, 23), count=rng.randint(1, 6), street=rng.choice(STREETS),
+            amount=rng.choice([50, 120, 300, 800, 1500, 4000]), vehicle=rng.choice(VEHICLES),
+            digits=rng.randint(10, 99),
+        ) for sentence in sentences)
+
+    def complaint(self):
+        """One complaint plus the notifications and audit entries it produced."""
+        rng = self.rng
+        complaint_id = self.next_complaint_id
+        self.next_complaint_id += 1
+        category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+        place, latitude, longitude = rng.choice(self.places)
+        # Scatter incidents within a few hundred metres of the landmark
+        latitude += rng.gauss(0, 0.004)
+        longitude += rng.gauss(0, 0.004 / math.cos(math.radians(latitude)))
+        day = self.end - timedelta(days=rng.random() * self.days)
+        incident_date = day.replace(hour=rng.choices(range(24), HOUR_WEIGHTS)[0], minute=rng.randint(0, 59))
+        created_at = min(incident_date + timedelta(hours=rng.expovariate(1 / 6)), self.end)
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        reporter_id, reporter_name = rng.choice(self.citizens)
+        title = rng.choice(TITLES[category]).format(item=rng.choice(ITEMS), place=place)
+
+        complaint = {
+            "id": complaint_id, "title": title[0].upper() + title[1:], "description": self._description(),
+            "incident_date": incident_date, "incident_location": f"{rng.randint(1, 400)} {place}",
+            "complaint_type": category, "status": status, "priority": rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+            "crime_type": None, "images": None, "witnesses": None, "assigned_officer": None,
+            "review_notes": None, "user_id": reporter_id, "approved_by": None,
+            "created_at": created_at, "updated_at": created_at,
+            "latitude": round(latitude, 6), "longitude": round(longitude, 6),
+        }
+        if rng.random() < 0.3:
+            complaint["witnesses"] = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if rng.random() < 0.2:
+            complaint["images"] = [f"/uploads/synthetic/{complaint_id}-{n}.jpg" for n in range(rng.randint(1, 3))]
+
+        notifications = [self._notification(
+            reporter_id, complaint_id, created_at, "Complaint Submitted",
+            f"Your complaint '{complaint['title']}' has been submitted successfully.", "success"
+        )]
+        audits = [{
+            "user_id": reporter_id, "user_name": reporter_name, "action": "CREATE_COMPLAINT",
+            "resource": "complaint", "resource_id": str(complaint_id),
+            "details": {"category": category, "priority": complaint["priority"]}, "timestamp": created_at,
+        }]
+        if status != "pending":
+            officer_id, officer_name = rng.choice(self.officers)
+            complaint["assigned_officer"] = officer_name
+            if status in ("approved", "rejected"):
+                decided_at = min(created_at + timedelta(hours=rng.expovariate(1 / 36)), self.end)
+                complaint.update(approved_by=officer_id, updated_at=decided_at)
+                if status == "approved":
+                    complaint["crime_type"] = rng.choice(CRIME_TYPES[category])
+                verb = status.capitalize()
+                notifications.append(self._notification(
+                    reporter_id, complaint_id, decided_at, f"Complaint {verb}",
+                    f"Your complaint '{complaint['title']}' has been {status}.",
+                    "success" if status == "approved" else "warning"
+                ))
+                audits.append({
+                    "user_id": officer_id, "user_name": officer_name,
+                    "action": "APPROVE_COMPLAINT" if status == "approved" else "REJECT_COMPLAINT",
+                    "resource": "complaint", "resource_id": str(complaint_id),
+                    "details": {"status": status, "crime_type": complaint["crime_type"], "previous_status": "pending"},
+                    "timestamp": decided_at,
+                })
+        return complaint, notifications, audits
+
+    def _notification(self, user_id: int, complaint_id: int, created_at: datetime, title: str, message: str, kind: str):
+        # Older notifications have mostly been read
+        age_days = (self.end - created_at).days
+        return {
+            "id": None, "user_id": user_id, "title": title, "message": message, "type": kind,
+            "category": "complaint", "read": self.rng.random() < min(0.95, age_days / 14),
+            "action_url": "/track-complaints", "meta_data": {"complaint_id": complaint_id},
+            "created_at": created_at, "expires_at": None,
+        }
+
+class FileSink:
+    # Writes generated rows to one file per table instead of the database
+    def __init__(self, directory: str, file_format: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = file_format
+        self.files = {}
+        self.meter = Meter()
+
+    def load(self, table: str, rows: list):
+        start = time.perf_counter()
+        columns = list(FIELDS[table])
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+        f = self.files.get(table)
+        if f is None:
+            f = self.files[table] = open(os.path.join(self.directory, f"{table}.{self.format}"), "wb")
+            if self.format == "csv":
+                f.write(csv_chunk([], columns, header=True))
+        # Written for `load`, which must get the values back unchanged
+        f.write(csv_chunk(rows, columns, escape_formulas=False) if self.format == "csv" else ndjson_chunk(rows, columns))
+        self.meter.add(table, len(rows), time.perf_counter() - start)
+
+    def finish(self):
+        for f in self.files.values():
+            f.close()
+        self.meter.report()
+        print(f"Load them with: python bulk_import.py load <table> {self.directory}/<table>.{self.format}")
+
+def generate(sink, generator: Generator, users: int, complaints: int, batch_size: int):
+    for batch in batched(generator.users(users), batch_size):
+        sink.load("users", batch)
+    if complaints and not (generator.citizens and generator.officers):
+        raise ValueError("complaints need at least 3 generated users (an officer, an admin and a citizen)")
+    remaining = complaints
+    while remaining > 0:
+        batch_complaints, batch_notifications, batch_audits = [], [], []
+        for _ in range(min(batch_size, remaining)):
+            complaint, notifications, audits = generator.complaint()
+            batch_complaints.append(complaint)
+            batch_notifications.extend(notifications)
+            batch_audits.extend(audits)
+        sink.load("complaints", batch_complaints)
+        sink.load("notifications", batch_notifications)
+        sink.load("audit", batch_audits)
+        remaining -= len(batch_complaints)
+    sink.finish()
+
+def next_ids(db: Session):
+    users = db.execute(select(func.max(User.id))).scalar() or 0
+    complaints = db.execute(select(func.max(Complaint.id))).scalar() or 0
+    return users + 1, complaints + 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load or generate complaint data")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="load rows from a CSV or NDJSON file")
+    load.add_argument("table", choices=list(FIELDS))
+    load.add_argument("path")
+    load.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    load.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+    synthetic = commands.add_parser("generate", help="generate a synthetic data set")
+    synthetic.add_argument("--users", type=int, default=1000)
+    synthetic.add_argument("--complaints", type=int, default=100000)
+    synthetic.add_argument("--days", type=int, default=365, help="spread complaints over this many days")
+    synthetic.add_argument("--seed", type=int, default=1)
+    synthetic.add_argument("--end-date", type=datetime.fromisoformat,
+                           help="latest timestamp generated (default: start of today, UTC)")
+    synthetic.add_argument("--password", default="password123", help="password of every generated user")
+    synthetic.add_argument("--output", help="write files to this directory instead of the database")
+    synthetic.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    synthetic.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    synthetic.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "load":
+            loader = Loader(db, args.commit_every)
+            for batch in batched(read_rows(args.path), args.batch_size):
+                loader.load(args.table, batch)
+            loader.finish()
+            return
+
+        end_date = args.end_date or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Ids continue after the target database's, so generated files load cleanly too
+        first_user_id, first_complaint_id = next_ids(db)
+        db.rollback()
+        generator = Generator(args.seed, end_date, args.days, first_user_id, first_complaint_id, args.password)
+        sink = FileSink(args.output, args.format) if args.output else Loader(db, args.commit_every)
+        generate(sink, generator, args.users, args.complaints, args.batch_size)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Flag endpoint queries that the database answers with a full table scan.
+
+Seeds a throwaway SQLite database with init_db, calls each endpoint in
+process through FastAPI's TestClient (needs httpx), records every statement
+it sends and runs EXPLAIN QUERY PLAN on it. Plans that scan a table without
+an index, or sort through a temporary b-tree, are reported and make the
+script exit non-zero, as do endpoints that exceed their statement budget.
+Budgeted endpoints are then called twice more, before and after a few
+hundred synthetic complaints (with their notifications and audit entries)
+are loaded, and must send the same number of statements both times, so an
+N+1 lazy load while serializing a listing fails even when the seed data is
+too small to show it.
+
+Usage (from the backend directory):
+    python check_query_plans.py [--verbose]
+"""
+from datetime import datetime
+import os
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'plans.db')}"
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+
+from bulk_import import Generator, Loader, next_ids
+from auth import invalidate_principal
+from database import SessionLocal, User, engine, async_engine
+from init_db import create_initial_data
+from pagination import encode_cursor
+import main
+
+PASSWORD = "password123"
+USERS = {
+    "admin": "admin@crimewatch.com",
+    "police": "officer@police.gov",
+    "user": "citizen@email.com",
+}
+
+# Single-row bookkeeping tables that are fine to scan
+SMALL_TABLES = {"analytics"}
+# Complaints added before budgeted endpoints are called the last time
+GROWTH = 200
+
+# (role, method, path, request kwargs, whole-table aggregate allowed, statement budget)
+# Budgets include the authenticated user lookup and must not depend on row counts
+ENDPOINTS = [
+    (None, "POST", "/auth/login", {"json": {"email": USERS["user"], "password": PASSWORD}}, False, 1),
+    ("user", "GET", "/users/profile", {}, False, 1),
+    ("user", "POST", "/complaints/register", {"data": {
+        "title": "Plan check", "description": "Plan check", "incident_date": "2024-01-01T00:00:00",
+        "incident_location": "Main St", "complaint_type": "Other", "priority": "low"
+    }}, False, None),
+    ("police", "GET", "/complaints/", {}, False, 2),
+    ("police", "GET", "/complaints/", {"params": {"limit": 1}}, False, 2),
+    ("police", "GET", "/complaints/", {"params": {"status": "pending"}}, False, 2),
+    ("police", "GET", "/complaints/", {"params": {"sort": "incident_date"}}, False, 2),
+    ("police", "GET", "/complaints/", {"params": {"sort": "-updated_at"}}, False, 2),
+    # Past the last dated complaint the page is topped up from undated ones
+    ("police", "GET", "/complaints/", {"params": {
+        "sort": "incident_date", "cursor": encode_cursor("incident_date", "2999-01-01T00:00:00", 0)
+    }}, False, 3),
+    ("police", "GET", "/complaints/", {"params": {
+        "sort": "-incident_date", "cursor": encode_cursor("-incident_date", None, 10 ** 9)
+    }}, False, 2),
+    ("user", "GET", "/complaints/my", {}, False, 2),
+    ("user", "GET", "/complaints/1", {}, False, 2),
+    ("police", "GET", "/complaints/search", {"params": {"q": "stolen bike"}}, False, 3),
+    ("police", "GET", "/complaints/search", {"params": {"q": "stolen", "status": "pending"}}, False, 3),
+    ("police", "GET", "/complaints/search", {"params": {"q": "stolen", "sort": "newest"}}, False, 2),
+    ("police", "GET", "/complaints/export", {"params": {"status": "pending"}}, False, None),
+    ("police", "GET", "/complaints/duplicates", {}, False, 3),
+    ("police", "GET", "/complaints/duplicates", {"params": {"status": "pending"}}, False, 3),
+    ("police", "GET", "/complaints/nearby", {"params": {"lat": 40.7128, "lon": -74.006, "radius_km": 2}}, False, 3),
+    ("police", "GET", "/complaints/within", {"params": {
+        "min_lat": 40.70, "min_lon": -74.02, "max_lat": 40.72, "max_lon": -74.00
+    }}, False, 2),
+    ("police", "GET", "/analytics/hotspots", {}, True, 2),
+    ("police", "GET", "/analytics/hotspots", {"params": {
+        "precision": 7, "min_lat": 40.70, "min_lon": -74.02, "max_lat": 40.72, "max_lon": -74.00
+    }}, False, 2),
+    ("police", "POST", "/complaints/2/approve", {"json": {"crime_type": "Graffiti"}}, False, None),
+    ("police", "POST", "/complaints/3/reject", {}, False, None),
+    ("police", "POST", "/complaints/bulk", {"json": {
+        "ids": [1, 2, 3], "action": "priority", "priority": "high"
+    }}, False, 5),
+    ("police", "PUT", "/complaints/3/duplicate", {"json": {"duplicate_of": 1}}, False, None),
+    ("admin", "GET", "/users/", {}, False, 2),
+    ("admin", "GET", "/users/", {"params": {"role": "police"}}, False, 2),
+    ("admin", "GET", "/users/", {"params": {"sort": "email"}}, False, 2),
+    ("admin", "GET", "/users/", {"params": {"sort": "-full_name"}}, False, 2),
+    ("admin", "GET", "/users/", {"params": {"sort": "full_name", "role": "user"}}, False, 2),
+    ("admin", "GET", "/users/", {"params": {"sort": "-email", "role": "police"}}, False, 2),
+    ("admin", "GET", "/users/", {"params": {
+        "sort": "full_name", "role": "user", "cursor": encode_cursor("full_name", "\uffff", 0)
+    }}, False, 3),
+    ("police", "GET", "/analytics/", {}, False, None),
+    ("police", "GET", "/analytics/live", {}, True, None),
+    ("user", "GET", "/notifications/", {}, False, 2),
+    ("user", "GET", "/notifications/", {"params": {"unread": True}}, False, 2),
+    ("user", "GET", "/notifications/unread-count", {}, False, 2),
+    ("user", "POST", "/notifications/1/read", {}, False, None),
+    ("user", "POST", "/notifications/read", {"json": {"ids": [1, 2]}}, False, None),
+    ("user", "POST", "/notifications/read", {"json": {}}, False, None),
+    ("admin", "GET", "/audit-logs/", {}, False, 3),
+    ("admin", "GET", "/audit-logs/", {"params": {"user_id": 2, "action": "LOGIN"}}, False, 3),
+    ("admin", "GET", "/audit-logs/", {"params": {"since": "2024-01-01T00:00:00", "resource": "complaint"}}, False, 3),
+    ("admin", "GET", "/audit-logs/export", {"params": {"format": "csv", "user_id": 2}}, False, None),
+]
+
+captured = []
+
+def capture(conn, cursor, statement, parameters, context, executemany):
+    captured.append((statement, parameters))
+
+def problems(plan, allow_scan: bool):
+    # Full-text and R-tree matches are index lookups; ordering what they
+    # return needs a sort
+    virtual_index = any(" VIRTUAL TABLE INDEX " in detail for detail in plan)
+    found = []
+    for detail in plan:
+        if detail.startswith("SCAN ") and " USING " not in detail and " VIRTUAL TABLE INDEX " not in detail:
+            table = detail.split()[1]
+            if table not in SMALL_TABLES and not allow_scan:
+                found.append(detail)
+        elif detail.startswith("USE TEMP B-TREE FOR ORDER BY") and not allow_scan and not virtual_index:
+            found.append(detail)
+    return found
+
+def explain(statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+def grow(complaints: int):
+    # Synthetic rows for the seeded citizen, so their own listings grow too.
+    # They stay within this month: a new audit partition is read separately
+    db = SessionLocal()
+    try:
+        first_user_id, first_complaint_id = next_ids(db)
+        citizen = db.query(User).filter(User.email == USERS["user"]).one()
+        now = datetime.utcnow()
+        generator = Generator(1, now, now.day - 1, first_user_id, first_complaint_id, PASSWORD)
+        loader = Loader(db)
+        loader.load("users", list(generator.users(3)))
+        generator.citizens = [(citizen.id, citizen.full_name)]
+        rows = {"complaints": [], "notifications": [], "audit": []}
+        for _ in range(complaints):
+            complaint, notifications, audits = generator.complaint()
+            rows["complaints"].append(complaint)
+            rows["notifications"].extend(notifications)
+            rows["audit"].extend(audits)
+        for table, batch in rows.items():
+            loader.load(table, batch)
+        loader.finish()
+    finally:
+        db.close()
+
+def run(client, headers, verbose: bool = False, only=None, expected=None):
+    """Calls each endpoint, or those whose position in ENDPOINTS is in
+    ``only``, and returns failures and the statement counts of budgeted ones.
+    ``expected`` maps positions to the counts they must match."""
+    failures = 0
+    counts = {}
+    for index, (role, method, path, kwargs, allow_scan, budget) in enumerate(ENDPOINTS):
+        if only is not None and index not in only:
+            continue
+        captured.clear()
+        # Every call pays for the user lookup, whatever was called before it
+        invalidate_principal()
+        response = client.request(method, path, headers=headers.get(role, {}), **kwargs)
+        statements = [(s, p) for s, p in captured if s.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))]
+
+        plans = [(statement, explain(statement, parameters)) for statement, parameters in statements]
+        flagged = [(statement, problems(plan, allow_scan)) for statement, plan in plans]
+        flagged = [(statement, issues) for statement, issues in flagged if issues]
+
+        over_budget = budget is not None and len(statements) > budget
+        grew = expected is not None and len(statements) != expected[index]
+        if budget is not None:
+            counts[index] = len(statements)
+        label = f"{method} {path} {kwargs.get('params', '')}".strip()
+        status = "FULL SCAN" if flagged else "TOO MANY" if over_budget else "GREW" if grew else "ok"
+        print(f"[{status:>9}] {label} -> HTTP {response.status_code}, {len(statements)} queries")
+        if verbose:
+            for statement, plan in plans:
+                print(f"    {' | '.join(plan)}")
+        for statement, issues in flagged:
+            print(f"    {' '.join(statement.split())[:160]}")
+            for issue in issues:
+                print(f"      {issue}")
+        if over_budget:
+            print(f"    expected at most {budget} statements")
+        if grew:
+            print(f"    expected {expected[index]} statements, as in the previous round")
+        failures += len(flagged) + over_budget + grew
+    return failures, counts
+
+def main_check(verbose: bool = False):
+    create_initial_data()
+    client = TestClient(main.app)
+
+    headers = {}
+    for role, email in USERS.items():
+        token = client.post("/auth/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+        headers[role] = {"Authorization": f"Bearer {token}"}
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        failures, counts = run(client, headers, verbose)
+        # Called again so writes made by the first round do not count as growth
+        print("Budgeted endpoints again:")
+        more, counts = run(client, headers, verbose, only=counts)
+        failures += more
+        grow(GROWTH)
+        print(f"Budgeted endpoints with {GROWTH} more complaints:")
+        more, _ = run(client, headers, verbose, only=counts, expected=counts)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    return failures + more
+
+if __name__ == "__main__":
+    failures = main_check(verbose="--verbose" in sys.argv)
+    sys.exit(1 if failures else 0)
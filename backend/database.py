@@ -1,13 +1,49 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, Index, JSON, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from datetime import datetime
-import json
+from decouple import config
+import orjson
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./crime_reports.db"
+SQLALCHEMY_DATABASE_URL = config("DATABASE_URL", default="sqlite:///./crime_reports.db")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+def async_database_url(url: str):
+    # Same database through an asyncio driver: aiosqlite, or asyncpg for PostgreSQL
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith(("postgresql:", "postgresql+psycopg2:", "postgres:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = config("ASYNC_DATABASE_URL", default=async_database_url(SQLALCHEMY_DATABASE_URL))
+# Apply pending migrations on import; the migration CLI turns this off
+AUTO_MIGRATE = config("AUTO_MIGRATE", default=True, cast=bool)
+
+# JSON columns are encoded and decoded once, in the type layer, with orjson
+def json_serializer(value):
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def json_deserializer(value):
+    return orjson.loads(value)
+
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=connect_args,
+    json_serializer=json_serializer,
+    json_deserializer=json_deserializer
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Request handlers use the async engine; scripts, migrations and background
+# jobs keep using the blocking engine above
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    json_serializer=json_serializer,
+    json_deserializer=json_deserializer
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class User(Base):
@@ -24,6 +60,15 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     
     complaints = relationship("Complaint", back_populates="user", foreign_keys="Complaint.user_id")
+    
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at", "id"),
+        Index("ix_users_role_created_at", "role", "created_at", "id"),
+        Index("ix_users_email_id", "email", "id"),
+        Index("ix_users_full_name_id", "full_name", "id"),
+        Index("ix_users_role_email", "role", "email", "id"),
+        Index("ix_users_role_full_name", "role", "full_name", "id"),
+    )
 
 class Complaint(Base):
     __tablename__ = "complaints"
@@ -37,7 +82,7 @@ class Complaint(Base):
     status = Column(String, default="pending")  # pending, approved, rejected, under_review
     crime_type = Column(String, nullable=True)
     priority = Column(String, default="medium")  # low, medium, high, urgent
-    images = Column(Text, nullable=True)  # JSON string of image paths
+    images = Column(JSON(none_as_null=True), nullable=True)  # list of image paths
     witnesses = Column(Text, nullable=True)
     assigned_officer = Column(String, nullable=True)
     review_notes = Column(Text, nullable=True)
@@ -45,24 +90,79 @@ class Complaint(Base):
     approved_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # Geocoded from incident_location by geo.py; NULL when it is not in the gazetteer
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True)
+    # First complaint of the near-duplicate cluster this one belongs to (dedup.py)
+    duplicate_of = Column(Integer, ForeignKey("complaints.id"), nullable=True)
+    duplicate_score = Column(Float, nullable=True)
+    # MinHash signature of title and description (minhash.py); b"" when they have no words
+    minhash = Column(LargeBinary, nullable=True)
     
     user = relationship("User", back_populates="complaints", foreign_keys=[user_id])
     approver = relationship("User", foreign_keys=[approved_by], overlaps="user")
+    
+    # Composite indexes follow the listing shapes: equality filter, then the
+    # keyset (created_at, id) so filtered pages are a single range scan
+    __table_args__ = (
+        Index("ix_complaints_created_at", "created_at", "id"),
+        Index("ix_complaints_updated_at", "updated_at", "id"),
+        Index("ix_complaints_incident_date", "incident_date", "id"),
+        Index("ix_complaints_status_created_at", "status", "created_at", "id"),
+        Index("ix_complaints_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_complaints_geohash", "geohash"),
+        Index("ix_complaints_duplicate_of", "duplicate_of", "id"),
+    )
+
+class EvidenceBlob(Base):
+    __tablename__ = "evidence_blobs"
+    
+    sha256 = Column(String, primary_key=True)
+    size = Column(Integer)
+    content_type = Column(String)
+    extension = Column(String)
+    ref_count = Column(Integer, default=0)  # references from Complaint.images
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_referenced_at = Column(DateTime, default=datetime.utcnow)  # start of the GC grace period
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)  # refresh token id
+    expires_at = Column(DateTime, index=True)  # row can be pruned after this
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String)  # e.g. complaint.created, see outbox.py
+    payload = Column(JSON)
+    attempts = Column(Integer, default=0)  # failed dispatches
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class Analytics(Base):
     __tablename__ = "analytics"
     
     id = Column(Integer, primary_key=True, index=True)
     total_complaints = Column(Integer, default=0)
-    complaints_by_status = Column(Text)  # JSON
-    complaints_by_category = Column(Text)  # JSON
-    complaints_by_priority = Column(Text)  # JSON
-    monthly_trends = Column(Text)  # JSON
-    user_stats = Column(Text)  # JSON
-    response_time_stats = Column(Text)  # JSON
+    complaints_by_status = Column(JSON(none_as_null=True))
+    complaints_by_category = Column(JSON(none_as_null=True))
+    complaints_by_priority = Column(JSON(none_as_null=True))
+    monthly_trends = Column(JSON(none_as_null=True))
+    user_stats = Column(JSON(none_as_null=True))
+    response_time_stats = Column(JSON(none_as_null=True))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
+class AnalyticsSketch(Base):
+    __tablename__ = "analytics_sketches"
+    
+    name = Column(String, primary_key=True)
+    state = Column(JSON(none_as_null=True))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -74,34 +174,38 @@ class Notification(Base):
     category = Column(String)  # complaint, system, security, general
     read = Column(Boolean, default=False)
     action_url = Column(String, nullable=True)
-    meta_data = Column(Text, nullable=True)  # JSON
+    meta_data = Column(JSON(none_as_null=True), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
     
     user = relationship("User", foreign_keys=[user_id])
-
-class AuditLog(Base):
-    __tablename__ = "audit_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    user_name = Column(String)
-    action = Column(String)
-    resource = Column(String)
-    resource_id = Column(String, nullable=True)
-    details = Column(Text)  # JSON
-    ip_address = Column(String, nullable=True)
-    user_agent = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+        # Partial indexes, see migrations/0011_notification_lifecycle.py
+        Index("ix_notifications_user_id_unread", "user_id", "id",
+              sqlite_where=read == False, postgresql_where=read == False),
+        Index("ix_notifications_expires_at", "expires_at",
+              sqlite_where=expires_at.isnot(None), postgresql_where=expires_at.isnot(None)),
+        Index("ix_notifications_read_created_at", "created_at",
+              sqlite_where=read == True, postgresql_where=read == True),
+    )
+
+class AuditPartition(Base):
+    # Audit entries live in one append-only table per month (see audit.py);
+    # this lists the months and whether their table is still in the database
+    __tablename__ = "audit_partitions"
     
-    user = relationship("User", foreign_keys=[user_id])
+    month = Column(String, primary_key=True)  # YYYYMM
+    live = Column(Boolean, default=True)  # False once archived and dropped
+    created_at = Column(DateTime, default=datetime.utcnow)
+    archived_at = Column(DateTime, nullable=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Bring the schema up to date (see migrations/)
+if AUTO_MIGRATE:
+    from migrate import upgrade
+    upgrade(engine)
\ No newline at end of file
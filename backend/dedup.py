@@ -0,0 +1,266 @@
+"""Near-duplicate complaint detection at intake.
+
+Each complaint's title and description are reduced to a MinHash signature
+over their words (stop words dropped, see minhash.py), computed on a small
+process pool at intake and stored with the complaint (migration 0014).
+The signature is split into LSH
+bands: complaints sharing any band are candidates, so checking a new
+complaint only looks at similar ones, not the whole corpus. A candidate is
+a duplicate when its estimated word overlap (Jaccard similarity) reaches
+DEDUP_THRESHOLD, the incidents happened within DEDUP_TIME_WINDOW_HOURS of
+each other and, when both are geocoded, within DEDUP_DISTANCE_KM. Without
+coordinates on both sides the text must agree more closely
+(DEDUP_TEXT_ONLY_THRESHOLD).
+
+The index lives in memory per worker and only holds complaints filed in
+the last DEDUP_INDEX_DAYS. It is loaded at startup from the stored
+signatures and topped up with complaints other workers stored since the
+last refresh (see refresh()); this worker's own intake is added as it
+commits.
+
+A flagged complaint points at the first complaint of its cluster through
+``duplicate_of`` (migration 0008), with the similarity in
+``duplicate_score``. Clusters are not kept in the index: officers and other
+workers move complaints between them, so the cluster of a match is read
+from the database at intake.
+"""
+from array import array
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+import threading
+
+from database import SessionLocal, Complaint
+from geo import haversine_km
+from minhash import bands, similarity
+import minhash
+from pagination import encode_cursor, decode_cursor
+from queries import complaint_projection, complaint_to_dict
+
+DEDUP_THRESHOLD = config("DEDUP_THRESHOLD", default=0.4, cast=float)
+DEDUP_TEXT_ONLY_THRESHOLD = config("DEDUP_TEXT_ONLY_THRESHOLD", default=0.7, cast=float)
+DEDUP_TIME_WINDOW_HOURS = config("DEDUP_TIME_WINDOW_HOURS", default=72, cast=float)
+DEDUP_DISTANCE_KM = config("DEDUP_DISTANCE_KM", default=1.0, cast=float)
+DEDUP_INDEX_DAYS = config("DEDUP_INDEX_DAYS", default=30, cast=float)
+
+class Entry(NamedTuple):
+    id: int
+    signature: array
+    incident_date: Optional[datetime]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    created_at: datetime
+
+class Match(NamedTuple):
+    complaint_id: int
+    score: float
+
+def naive_utc(value: Optional[datetime]):
+    # Intake may parse offset-aware dates; stored ones come back naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class DuplicateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._buckets = {}
+        self._order = deque()  # ids in created_at order, for eviction
+        # Highest id loaded from the database; only refresh() moves it, so
+        # this worker's own intake does not skip over other workers' rows
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, complaint_id):
+        return complaint_id in self._entries
+
+    def find(self, sig: array, incident_date, latitude, longitude, exclude: int = None):
+        """Best matching indexed complaint, or None."""
+        if sig is None:
+            return None
+        incident_date = naive_utc(incident_date)
+        with self._lock:
+            candidates = set()
+            for key in bands(sig):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(exclude)
+            best = None
+            for candidate_id in candidates:
+                entry = self._entries[candidate_id]
+                if incident_date and entry.incident_date and \
+                        abs(incident_date - entry.incident_date) > timedelta(hours=DEDUP_TIME_WINDOW_HOURS):
+                    continue
+                located = None not in (latitude, longitude, entry.latitude, entry.longitude)
+                if located and haversine_km(latitude, longitude, entry.latitude, entry.longitude) > DEDUP_DISTANCE_KM:
+                    continue
+                score = similarity(sig, entry.signature)
+                if score < (DEDUP_THRESHOLD if located else DEDUP_TEXT_ONLY_THRESHOLD):
+                    continue
+                if best is None or (score, -entry.id) > (best.score, -best.complaint_id):
+                    best = Match(entry.id, score)
+            return best
+
+    def add(self, complaint_id: int, sig: array, incident_date, latitude, longitude, created_at: datetime = None):
+        if sig is None:
+            return
+        entry = Entry(complaint_id, sig, naive_utc(incident_date), latitude, longitude, created_at or datetime.utcnow())
+        with self._lock:
+            if complaint_id in self._entries:
+                return
+            self._entries[complaint_id] = entry
+            for key in bands(sig):
+                self._buckets.setdefault(key, set()).add(complaint_id)
+            self._order.append(complaint_id)
+            self._evict()
+
+    def _evict(self):
+        cutoff = datetime.utcnow() - timedelta(days=DEDUP_INDEX_DAYS)
+        while self._order:
+            entry = self._entries.get(self._order[0])
+            if entry is not None and entry.created_at >= cutoff:
+                break
+            self._order.popleft()
+            if entry is None:
+                continue
+            del self._entries[entry.id]
+            for key in bands(entry.signature):
+                bucket = self._buckets[key]
+                bucket.discard(entry.id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._order.clear()
+            self.max_id = 0
+
+duplicate_index = DuplicateIndex()
+
+DEDUP_COLUMNS = [
+    Complaint.id, Complaint.title, Complaint.description, Complaint.incident_date,
+    Complaint.latitude, Complaint.longitude, Complaint.created_at, Complaint.minhash,
+]
+
+async def check_complaint(db: AsyncSession, complaint):
+    """Flag ``complaint`` if it duplicates an indexed one and store its
+    signature; returns the signature."""
+    sig = await minhash.compute(complaint.title, complaint.description)
+    complaint.minhash = minhash.to_bytes(sig)
+    match = duplicate_index.find(sig, complaint.incident_date, complaint.latitude, complaint.longitude,
+                                 exclude=complaint.id)
+    if match is not None:
+        target = (await db.execute(
+            select(Complaint.id, Complaint.duplicate_of).filter(Complaint.id == match.complaint_id)
+        )).first()
+        if target is not None:
+            complaint.duplicate_of = target.duplicate_of or target.id
+            complaint.duplicate_score = round(match.score, 3)
+    return sig
+
+def index_complaint(complaint, sig):
+    # After commit, so a rolled back complaint never becomes a match
+    duplicate_index.add(complaint.id, sig, complaint.incident_date, complaint.latitude, complaint.longitude,
+                        complaint.created_at)
+
+def stored_signatures(db, rows):
+    """Signatures of ``rows``; those without a stored one (filed before
+    migration 0014, or bulk imported) are computed on the pool and saved."""
+    missing = [row for row in rows if row.minhash is None]
+    computed = {}
+    if missing:
+        sigs = minhash.compute_many([(row.title, row.description) for row in missing])
+        computed = {row.id: sig for row, sig in zip(missing, sigs)}
+        db.execute(update(Complaint), [{"id": row_id, "minhash": minhash.to_bytes(sig)} for row_id, sig in computed.items()])
+        db.commit()
+    return [computed[row.id] if row.id in computed else minhash.from_bytes(row.minhash) for row in rows]
+
+def load_into_index(db, batch_size: int = 1000):
+    """Index recent complaints newer than any already indexed; returns how many."""
+    if duplicate_index.max_id == 0:
+        cutoff = datetime.utcnow() - timedelta(days=DEDUP_INDEX_DAYS)
+        first = db.execute(select(func.min(Complaint.id)).filter(Complaint.created_at >= cutoff)).scalar()
+        if first is None:
+            return 0
+        duplicate_index.max_id = first - 1
+    added = 0
+    while True:
+        rows = db.execute(
+            select(*DEDUP_COLUMNS).filter(Complaint.id > duplicate_index.max_id)
+            .order_by(Complaint.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return added
+        fresh = [row for row in rows if row.id not in duplicate_index]
+        for row, sig in zip(fresh, stored_signatures(db, fresh)):
+            duplicate_index.add(row.id, sig, row.incident_date, row.latitude, row.longitude, row.created_at)
+        duplicate_index.max_id = rows[-1].id
+        added += len(fresh)
+
+def refresh():
+    db = SessionLocal()
+    try:
+        return load_into_index(db)
+    finally:
+        db.close()
+
+async def duplicate_clusters(db: AsyncSession, filters, cursor: str = None, limit: int = 50):
+    """One page of clusters, newest first, and the next cursor.
+
+    A cluster is listed when any of its flagged complaints passes ``filters``
+    and then shown whole: its first complaint followed by every duplicate.
+    """
+    statement = filters.apply(select(Complaint.duplicate_of).filter(Complaint.duplicate_of.is_not(None)))
+    if cursor:
+        _, cluster_id = decode_cursor(cursor, "cluster", Complaint.duplicate_of)
+        statement = statement.filter(Complaint.duplicate_of < cluster_id)
+    statement = statement.group_by(Complaint.duplicate_of).order_by(Complaint.duplicate_of.desc())
+    cluster_ids = (await db.execute(statement.limit(limit + 1))).scalars().all()
+    next_cursor = None
+    if len(cluster_ids) > limit:
+        cluster_ids = cluster_ids[:limit]
+        next_cursor = encode_cursor("cluster", None, cluster_ids[-1])
+    if not cluster_ids:
+        return [], None
+
+    members = {cluster_id: [] for cluster_id in cluster_ids}
+    # Sorted here: the OR of two index lookups would otherwise need a temporary b-tree
+    rows = (await db.execute(
+        complaint_projection()
+        .filter(or_(Complaint.id.in_(cluster_ids), Complaint.duplicate_of.in_(cluster_ids)))
+    )).all()
+    for row in sorted(rows, key=lambda row: row.id):
+        # A leader since flagged into another cluster is still shown first in its own
+        if row.id in members:
+            members[row.id].insert(0, complaint_to_dict(row))
+        else:
+            members[row.duplicate_of].append(complaint_to_dict(row))
+    return [{"cluster_id": cluster_id, "complaints": members[cluster_id]} for cluster_id in cluster_ids], next_cursor
+
+async def link_duplicate(db: AsyncSession, complaint, duplicate_of: Optional[int]):
+    """Put ``complaint`` in another complaint's cluster, or take it out (None),
+    and commit. When ``complaint`` led a cluster of its own, its members move
+    along."""
+    cluster = None
+    if duplicate_of is not None:
+        target = await db.get(Complaint, duplicate_of)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Duplicate target not found")
+        cluster = target.duplicate_of or target.id
+        if cluster == complaint.id:
+            raise HTTPException(status_code=400, detail="Complaint already leads that cluster")
+        await db.execute(
+            update(Complaint).filter(Complaint.duplicate_of == complaint.id).values(duplicate_of=cluster)
+        )
+    complaint.duplicate_of = cluster
+    complaint.duplicate_score = None  # set by an officer, not scored
+    await db.commit()
+    return cluster
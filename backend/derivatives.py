@@ -0,0 +1,102 @@
+"""Thumbnail and web-sized derivatives of evidence images.
+
+Rendering runs in a small process pool so decoding and resizing never compete
+with the API workers for the GIL. This module is imported by the pool's
+worker processes, so it must stay free of database and app imports.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decouple import config
+from PIL import Image, ImageOps
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+# Variant name -> longest edge in pixels
+DERIVATIVES = {
+    "thumb": 320,
+    "web": 1600,
+}
+DERIVATIVE_FORMAT = "WEBP"
+DERIVATIVE_EXTENSION = ".webp"
+DERIVATIVE_QUALITY = config("DERIVATIVE_QUALITY", default=80, cast=int)
+DERIVATIVE_WORKERS = config("DERIVATIVE_WORKERS", default=2, cast=int)
+
+_pool = None
+_pending = set()
+
+def derivative_filename(variant: str):
+    return f"{variant}{DERIVATIVE_EXTENSION}"
+
+def _prepare(image):
+    # Animations keep their first frame; transparency survives, palettes do not
+    if image.mode in ("P", "PA", "LA"):
+        return image.convert("RGBA")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGB")
+    return image
+
+def render_derivatives(source_path: str, output_dir: str):
+    """Write every missing variant of ``source_path`` into ``output_dir``.
+
+    Orientation is applied from EXIF and the derivatives are re-encoded
+    without any metadata, so GPS and camera details never leave the
+    original. Runs inside a pool worker.
+    """
+    missing = [v for v in DERIVATIVES if not os.path.exists(os.path.join(output_dir, derivative_filename(v)))]
+    if not missing:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+
+    with Image.open(source_path) as image:
+        # JPEG can decode at a reduced scale, far cheaper than full size
+        largest = max(DERIVATIVES[v] for v in missing)
+        image.draft("RGB", (largest, largest))
+        image = _prepare(ImageOps.exif_transpose(image))
+
+        written = []
+        # Largest first, so each smaller variant is resized from the previous one
+        for variant in sorted(missing, key=DERIVATIVES.get, reverse=True):
+            size = DERIVATIVES[variant]
+            image.thumbnail((size, size), Image.LANCZOS)
+            fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".render-", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    image.save(out, DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY, method=4)
+                os.replace(temp_path, os.path.join(output_dir, derivative_filename(variant)))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            written.append(variant)
+    return written
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the event loop or open DB connections
+        _pool = ProcessPoolExecutor(
+            max_workers=DERIVATIVE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def _render(source_path: str, output_dir: str):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_pool(), render_derivatives, source_path, output_dir)
+    except Exception as e:
+        # Clients fall back to the original until a backfill succeeds
+        print(f"Derivative rendering failed for {source_path}: {e}")
+
+def schedule(source_path: str, output_dir: str):
+    # Fire and forget; keep a reference so the task is not garbage collected
+    task = asyncio.create_task(_render(source_path, output_dir))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+    return task
@@ -0,0 +1,28 @@
+"""URLs of stored evidence and its derivatives.
+
+Kept free of database imports so response schemas can build image URLs
+without pulling in the store itself.
+"""
+import re
+
+import derivatives
+
+URL_PREFIX = "/evidence/"
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)?$")
+
+def blob_url(sha256: str, extension: str):
+    return f"{URL_PREFIX}{sha256}{extension}"
+
+def parse_blob_url(url: str):
+    if not url or not url.startswith(URL_PREFIX):
+        return None
+    match = BLOB_NAME.match(url[len(URL_PREFIX):])
+    return match.group(1) if match else None
+
+def image_variants(url: str):
+    # Legacy /uploads paths have no derivatives and use the original throughout
+    sha256 = parse_blob_url(url)
+    variants = {"original": url}
+    for variant in derivatives.DERIVATIVES:
+        variants[variant] = f"{URL_PREFIX}{sha256}/{derivatives.derivative_filename(variant)}" if sha256 else url
+    return variants
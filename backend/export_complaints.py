@@ -0,0 +1,69 @@
+"""Write complaints to a CSV, NDJSON or Parquet file.
+
+Same rows, columns and filters as GET /complaints/export, streamed to disk
+in batches so memory stays flat for any number of complaints.
+
+Usage (from the backend directory):
+    python export_complaints.py complaints.parquet
+    python export_complaints.py pending.csv --status pending --created-from 2026-01-01
+"""
+from datetime import datetime
+import argparse
+import os
+import sys
+import time
+
+from exports import EXPORT_FORMATS, export_complaints, pyarrow
+from queries import ComplaintFilters
+
+def main():
+    parser = argparse.ArgumentParser(description="Export complaints to a file")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="defaults to the output file extension")
+    parser.add_argument("--status")
+    parser.add_argument("--complaint-type")
+    parser.add_argument("--priority")
+    parser.add_argument("--crime-type")
+    parser.add_argument("--assigned-officer")
+    parser.add_argument("--created-from", type=datetime.fromisoformat)
+    parser.add_argument("--created-to", type=datetime.fromisoformat)
+    parser.add_argument("--incident-from", type=datetime.fromisoformat)
+    parser.add_argument("--incident-to", type=datetime.fromisoformat)
+    parser.add_argument("--is-duplicate", choices=["true", "false"])
+    args = parser.parse_args()
+
+    export_format = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if export_format not in EXPORT_FORMATS:
+        parser.error(f"cannot tell the format from {args.output!r}; pass --format")
+    if export_format == "parquet" and pyarrow is None:
+        sys.exit("Parquet export needs pyarrow: pip install pyarrow")
+
+    filters = ComplaintFilters(
+        status=args.status,
+        complaint_type=args.complaint_type,
+        priority=args.priority,
+        crime_type=args.crime_type,
+        assigned_officer=args.assigned_officer,
+        created_from=args.created_from,
+        created_to=args.created_to,
+        incident_from=args.incident_from,
+        incident_to=args.incident_to,
+        is_duplicate=None if args.is_duplicate is None else args.is_duplicate == "true",
+    )
+
+    start = time.perf_counter()
+    size = 0
+    # Written beside the target and renamed, so a failed export leaves no partial file
+    try:
+        with open(args.output + ".tmp", "wb") as f:
+            for chunk in export_complaints(filters, export_format):
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(args.output + ".tmp")
+        raise
+    os.replace(args.output + ".tmp", args.output)
+    print(f"Wrote {size / 1e6:.1f} MB to {args.output} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
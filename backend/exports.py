@@ -0,0 +1,186 @@
+"""Streaming exports: complaints as CSV, NDJSON or Parquet.
+
+Rows are read with ``yield_per`` (a server-side cursor on PostgreSQL) and
+encoded a batch at a time, so memory stays flat however many complaints
+match. Generators here are blocking: StreamingResponse runs them in a
+thread, and export_complaints.py writes them to a file.
+
+Parquet needs pyarrow, which is optional; CSV and NDJSON always work.
+"""
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+import csv
+import io
+import json
+import orjson
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+from database import SessionLocal, User, Complaint
+from queries import ComplaintFilters, Reporter
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+Approver = aliased(User, name="approver")
+
+# (name, column, pyarrow type name); reporter and approver are flattened in
+COMPLAINT_EXPORT_FIELDS = [
+    ("id", Complaint.id, "int64"),
+    ("title", Complaint.title, "string"),
+    ("description", Complaint.description, "string"),
+    ("incident_date", Complaint.incident_date, "timestamp"),
+    ("incident_location", Complaint.incident_location, "string"),
+    ("latitude", Complaint.latitude, "float64"),
+    ("longitude", Complaint.longitude, "float64"),
+    ("complaint_type", Complaint.complaint_type, "string"),
+    ("status", Complaint.status, "string"),
+    ("priority", Complaint.priority, "string"),
+    ("crime_type", Complaint.crime_type, "string"),
+    ("witnesses", Complaint.witnesses, "string"),
+    ("assigned_officer", Complaint.assigned_officer, "string"),
+    ("review_notes", Complaint.review_notes, "string"),
+    ("images", Complaint.images, "json"),
+    ("duplicate_of", Complaint.duplicate_of, "int64"),
+    ("duplicate_score", Complaint.duplicate_score, "float64"),
+    ("created_at", Complaint.created_at, "timestamp"),
+    ("updated_at", Complaint.updated_at, "timestamp"),
+    ("reporter_id", Reporter.id, "int64"),
+    ("reporter_email", Reporter.email, "string"),
+    ("reporter_full_name", Reporter.full_name, "string"),
+    ("reporter_phone", Reporter.phone, "string"),
+    ("approver_id", Approver.id, "int64"),
+    ("approver_email", Approver.email, "string"),
+    ("approver_full_name", Approver.full_name, "string"),
+]
+COMPLAINT_EXPORT_COLUMNS = [name for name, _, _ in COMPLAINT_EXPORT_FIELDS]
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_value(value, escape_formulas: bool = True):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    if escape_formulas and isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Titles, descriptions and names come from the public
+        return "'" + value
+    return value
+
+def csv_chunk(rows, columns, header: bool = False, escape_formulas: bool = True):
+    """CSV lines for ``rows``. Text that a spreadsheet would evaluate is
+    prefixed with a quote, unless the file is meant to be loaded back
+    (``escape_formulas=False``)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(row[column], escape_formulas) for column in columns] for row in rows)
+    return buffer.getvalue().encode()
+
+def ndjson_chunk(rows, columns):
+    return b"".join(orjson.dumps({column: row[column] for column in columns}) + b"\n" for row in rows)
+
+class _Chunks:
+    # Write-only file for ParquetWriter that hands back the bytes written
+    # since the last take(), so row groups can be streamed as they are made
+    closed = False
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+
+    def write(self, data):
+        self._position += len(data)
+        return self._buffer.write(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+def parquet_schema(fields):
+    types = {
+        "int64": pyarrow.int64(), "float64": pyarrow.float64(), "string": pyarrow.string(),
+        "json": pyarrow.string(), "timestamp": pyarrow.timestamp("us"),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, _, kind in fields])
+
+def encode_batches(batches, fields, export_format: str):
+    """Encoded chunks for batches of row mappings, one chunk per batch."""
+    columns = [name for name, _, _ in fields]
+    if export_format == "parquet":
+        if pyarrow is None:
+            raise RuntimeError("Parquet export needs pyarrow installed")
+        json_columns = [name for name, _, kind in fields if kind == "json"]
+        sink = _Chunks()
+        writer = parquet.ParquetWriter(sink, parquet_schema(fields), compression="zstd")
+        for rows in batches:
+            records = [dict(row) for row in rows]
+            for record in records:
+                for name in json_columns:
+                    if record[name] is not None:
+                        record[name] = json.dumps(record[name])
+            writer.write_table(pyarrow.Table.from_pylist(records, schema=writer.schema))
+            yield sink.take()
+        writer.close()
+        yield sink.take()
+        return
+
+    if export_format == "csv":
+        yield csv_chunk([], columns, header=True)
+    for rows in batches:
+        yield csv_chunk(rows, columns) if export_format == "csv" else ndjson_chunk(rows, columns)
+
+def complaint_export_statement(filters: ComplaintFilters):
+    statement = (
+        select(*[column.label(name) for name, column, _ in COMPLAINT_EXPORT_FIELDS])
+        .select_from(Complaint)
+        .join(Reporter, Complaint.user_id == Reporter.id)
+        .outerjoin(Approver, Complaint.approved_by == Approver.id)
+    )
+    return filters.apply(statement).order_by(Complaint.id)
+
+def complaint_batches(db: Session, filters: ComplaintFilters):
+    statement = complaint_export_statement(filters).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    return db.execute(statement).mappings().partitions()
+
+def export_complaints(filters: ComplaintFilters, export_format: str = "csv"):
+    """Encoded chunks of every complaint matching ``filters``, by id."""
+    db = SessionLocal()
+    try:
+        yield from encode_batches(complaint_batches(db, filters), COMPLAINT_EXPORT_FIELDS, export_format)
+    finally:
+        db.close()
@@ -0,0 +1,300 @@
+"""Offline geocoding and spatial queries for complaint locations.
+
+Incident locations are free text. They are resolved against a local
+gazetteer (a CSV of ``name,latitude,longitude``, see data/gazetteer.csv),
+never a network service: the longest run of words in the location that
+names a gazetteer entry wins, after lower-casing and expanding common
+street abbreviations ("Main St" matches "main street"). A location that
+contains explicit coordinates ("40.7128, -74.0060") uses them as is.
+
+Coordinates are stored on the complaint together with a geohash. Bounding
+box and radius queries go through an R-tree on SQLite (migration 0007) and
+a (latitude, longitude) index on PostgreSQL; hotspot grids group by a
+geohash prefix. Boxes do not wrap across the antimeridian.
+
+Complaints stored before geocoding existed, or after the gazetteer
+changed, are filled in with:
+    python geo.py geocode [--all]
+"""
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import Float, Integer, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import table, column
+from typing import NamedTuple
+import csv
+import heapq
+import math
+import os
+import re
+
+from database import Complaint
+from queries import complaint_projection, complaint_to_dict
+
+GAZETTEER_PATH = config(
+    "GAZETTEER_PATH",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv")
+)
+GEOHASH_PRECISION = 9  # ~5m cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEOCODE_BATCH_SIZE = 1000
+# Bounds the candidate set a radius query ranks in the spatial index
+MAX_NEARBY_RADIUS_KM = config("MAX_NEARBY_RADIUS_KM", default=50, cast=float)
+# Radius queries fetch this many candidates per result, nearest first
+NEARBY_OVERSAMPLE = 4
+MAX_HOTSPOT_CELLS = 10000
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+ABBREVIATIONS = {
+    "st": "street", "ave": "avenue", "av": "avenue", "rd": "road", "blvd": "boulevard",
+    "dr": "drive", "ln": "lane", "sq": "square", "pl": "place", "ct": "court",
+    "hwy": "highway", "pkwy": "parkway", "n": "north", "s": "south", "e": "east", "w": "west",
+}
+COORDINATES = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+
+complaints_rtree = table(
+    "complaints_rtree",
+    column("id", Integer), column("min_lat", Float), column("max_lat", Float),
+    column("min_lon", Float), column("max_lon", Float),
+)
+
+class Location(NamedTuple):
+    latitude: float
+    longitude: float
+    name: str  # gazetteer entry, or "coordinates"
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        bounds, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits, bounds[0] = bits * 2 + 1, middle
+        else:
+            bits, bounds[1] = bits * 2, middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def geohash_bounds(geohash: str):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if bits >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bbox_around(latitude: float, longitude: float, radius_km: float):
+    """Smallest (min_lat, min_lon, max_lat, max_lon) box holding the circle."""
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, latitude - delta_lat), min(90.0, latitude + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-9 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    delta_lon = radius_km / (KM_PER_DEGREE * cos_lat)
+    return min_lat, max(-180.0, longitude - delta_lon), max_lat, min(180.0, longitude + delta_lon)
+
+def normalize(text: str):
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return tuple(ABBREVIATIONS.get(word, word) for word in words)
+
+class Gazetteer:
+    def __init__(self, entries):
+        # Normalized name -> Location; the first entry wins on duplicates
+        self.places = {}
+        for name, latitude, longitude in entries:
+            key = normalize(name)
+            if key and key not in self.places:
+                self.places[key] = Location(float(latitude), float(longitude), name)
+        self.longest = max((len(key) for key in self.places), default=0)
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH):
+        if not os.path.exists(path):
+            print(f"Gazetteer {path} not found, only explicit coordinates will be geocoded")
+            return cls([])
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls((row["name"], row["latitude"], row["longitude"]) for row in csv.DictReader(f))
+
+    def lookup(self, text: str):
+        match = COORDINATES.search(text)
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return Location(latitude, longitude, "coordinates")
+        words = normalize(text)
+        for size in range(min(self.longest, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                place = self.places.get(words[start:start + size])
+                if place is not None:
+                    return place
+        return None
+
+_gazetteer = None
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+def geocode(text: str):
+    """Location for a free-text incident location, or None."""
+    if not text:
+        return None
+    return get_gazetteer().lookup(text)
+
+def location_columns(location):
+    if location is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    return {
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+        "geohash": geohash_encode(location.latitude, location.longitude),
+    }
+
+def apply_geocode(complaint):
+    for key, value in location_columns(geocode(complaint.incident_location)).items():
+        setattr(complaint, key, value)
+    return complaint.latitude is not None
+
+def within_bbox(statement, dialect: str, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """Restrict a statement over complaints to those inside a box."""
+    if dialect != "postgresql":
+        # The R-tree finds the candidates; it stores float32 bounds rounded
+        # outwards, so the exact columns are checked as well
+        statement = statement.join(complaints_rtree, complaints_rtree.c.id == Complaint.id).filter(
+            complaints_rtree.c.max_lat >= min_lat, complaints_rtree.c.min_lat <= max_lat,
+            complaints_rtree.c.max_lon >= min_lon, complaints_rtree.c.min_lon <= max_lon,
+        )
+    return statement.filter(
+        Complaint.latitude.between(min_lat, max_lat),
+        Complaint.longitude.between(min_lon, max_lon),
+    )
+
+def check_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Bounding box minimum exceeds its maximum")
+    return min_lat, min_lon, max_lat, max_lon
+
+def flat_distance_km2(latitude: float, longitude: float, box):
+    """Squared flat distance from a point to a complaint, as a SQL expression.
+
+    Longitude is scaled by the cosine of the box's latitude furthest from the
+    equator, and both axes shrunk a little, so it never exceeds the squared
+    great-circle distance to anything inside the box.
+    """
+    scale = KM_PER_DEGREE * 0.999
+    cos_lat = math.cos(math.radians(max(abs(box[0]), abs(box[2]))))
+    lat_km = (Complaint.latitude - latitude) * scale
+    lon_km = (Complaint.longitude - longitude) * (scale * cos_lat)
+    return lat_km * lat_km + lon_km * lon_km
+
+async def nearby_complaints(db: AsyncSession, latitude: float, longitude: float, radius_km: float, filters, limit: int):
+    """Complaints within radius_km (as response dicts), nearest first."""
+    # The database ranks the candidates by flat distance and returns the
+    # nearest few, with coordinates only; they are refined with haversine
+    # and full rows fetched for the nearest `limit`
+    box = bbox_around(latitude, longitude, radius_km)
+    flat = flat_distance_km2(latitude, longitude, box)
+    candidates = select(Complaint.id, Complaint.latitude, Complaint.longitude, flat.label("flat"))
+    candidates = filters.apply(within_bbox(candidates, db.bind.dialect.name, *box))
+    candidates = candidates.filter(flat <= radius_km * radius_km).order_by(flat)
+    fetch = limit * NEARBY_OVERSAMPLE
+    while True:
+        rows = (await db.execute(candidates.limit(fetch))).all()
+        distances = {}
+        for row in rows:
+            distance = haversine_km(latitude, longitude, row.latitude, row.longitude)
+            if distance <= radius_km:
+                distances[row.id] = distance
+        nearest = heapq.nsmallest(limit, distances, key=distances.get)
+        # Rows not fetched are at least as far as the last one's flat distance
+        if len(rows) < fetch or (len(nearest) == limit and distances[nearest[-1]] <= math.sqrt(rows[-1].flat)):
+            break
+        fetch *= NEARBY_OVERSAMPLE
+    if not nearest:
+        return []
+    rows = await db.execute(complaint_projection().filter(Complaint.id.in_(nearest)))
+    results = []
+    for row in rows:
+        data = complaint_to_dict(row)
+        data["distance_km"] = round(distances[row.id], 3)
+        results.append(data)
+    return sorted(results, key=lambda data: data["distance_km"])
+
+async def hotspots(db: AsyncSession, precision: int, filters, bbox=None, limit: int = MAX_HOTSPOT_CELLS):
+    """Complaint counts per geohash cell of ``precision`` characters, busiest first."""
+    cell = func.substr(Complaint.geohash, 1, precision).label("cell")
+    statement = select(cell, func.count().label("count")).filter(Complaint.geohash.is_not(None))
+    if bbox is not None:
+        statement = within_bbox(statement, db.bind.dialect.name, *bbox)
+    statement = filters.apply(statement).group_by(cell).order_by(func.count().desc(), cell).limit(limit)
+    return [hotspot_to_dict(row) for row in await db.execute(statement)]
+
+def hotspot_to_dict(row):
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(row.cell)
+    return {
+        "geohash": row.cell,
+        "count": row.count,
+        "latitude": (min_lat + max_lat) / 2,
+        "longitude": (min_lon + max_lon) / 2,
+        "bounds": [min_lat, min_lon, max_lat, max_lon],
+    }
+
+def geocode_complaints(db, everything: bool = False):
+    """Geocode complaints without coordinates (or all of them), in id order."""
+    report = {"geocoded": 0, "unmatched": 0}
+    last_id = 0
+    while True:
+        statement = select(Complaint.id, Complaint.incident_location).filter(Complaint.id > last_id)
+        if not everything:
+            statement = statement.filter(Complaint.latitude.is_(None))
+        rows = db.execute(statement.order_by(Complaint.id).limit(GEOCODE_BATCH_SIZE)).all()
+        if not rows:
+            return report
+        changes = []
+        for row in rows:
+            location = geocode(row.incident_location)
+            report["geocoded" if location else "unmatched"] += 1
+            if location or everything:
+                changes.append({"id": row.id, **location_columns(location)})
+        if changes:
+            db.execute(update(Complaint), changes)
+        db.commit()
+        last_id = rows[-1].id
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Offline geocoding of complaint locations")
+    parser.add_argument("command", choices=["geocode"])
+    parser.add_argument("--all", action="store_true", help="re-geocode complaints that already have coordinates")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = geocode_complaints(db, args.all)
+    finally:
+        db.close()
+    print(f"Geocoded {report['geocoded']} complaints, {report['unmatched']} locations not found in the gazetteer.")
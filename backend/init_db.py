@@ -1,7 +1,9 @@
-from database import SessionLocal, User, Complaint, Analytics, Notification, AuditLog
+from database import SessionLocal, User, Complaint, Analytics, Notification
 from auth import get_password_hash
+from analytics import reconcile_analytics
+from geo import apply_geocode
+from audit import write as write_audit
 from datetime import datetime, timedelta
-import json
 import random
 
 def create_initial_data():
@@ -105,8 +107,9 @@ def create_initial_data():
             "status": "approved",
             "crime_type": "Petty Theft",
             "witnesses": "No witnesses observed",
-            "images": json.dumps(["/bicycle-theft-evidence.jpg"]),
-            "user_id": 4  # Jane Doe
+            "images": ["/bicycle-theft-evidence.jpg"],
+            "user_id": 4,  # Jane Doe
+            "approved_by": 2  # Officer John Smith
         },
         {
             "title": "Graffiti Vandalism on Building Wall",
@@ -116,7 +119,7 @@ def create_initial_data():
             "priority": "low",
             "status": "pending",
             "witnesses": "Security cameras may have footage",
-            "images": json.dumps(["/graffiti-vandalism-evidence.jpg"]),
+            "images": ["/graffiti-vandalism-evidence.jpg"],
             "user_id": 5  # Mike Wilson
         },
         {
@@ -137,12 +140,17 @@ def create_initial_data():
         days_ago = random.randint(1, 30)
         incident_date = datetime.now() - timedelta(days=days_ago)
         
+        updated_at = incident_date
+        if complaint_data.get("approved_by"):
+            updated_at = incident_date + timedelta(hours=random.randint(4, 48))
+        
         complaint = Complaint(
             **complaint_data,
             incident_date=incident_date,
             created_at=incident_date,
-            updated_at=incident_date
+            updated_at=updated_at
         )
+        apply_geocode(complaint)
         db.add(complaint)
         db.flush()
         created_complaints.append(complaint)
@@ -185,7 +193,7 @@ def create_initial_data():
             "user_name": "System Administrator",
             "action": "LOGIN",
             "resource": "auth",
-            "details": json.dumps({"email": "admin@crimewatch.com", "timestamp": datetime.now().isoformat()})
+            "details": {"email": "admin@crimewatch.com", "timestamp": datetime.now().isoformat()}
         },
         {
             "user_id": 4,
@@ -193,7 +201,7 @@ def create_initial_data():
             "action": "CREATE_COMPLAINT",
             "resource": "complaint",
             "resource_id": "1",
-            "details": json.dumps({"category": "Theft/Burglary", "priority": "medium"})
+            "details": {"category": "Theft/Burglary", "priority": "medium"}
         },
         {
             "user_id": 2,
@@ -201,54 +209,20 @@ def create_initial_data():
             "action": "UPDATE_COMPLAINT_STATUS",
             "resource": "complaint",
             "resource_id": "1",
-            "details": json.dumps({"status": "approved", "crime_type": "Petty Theft"})
+            "details": {"status": "approved", "crime_type": "Petty Theft"}
         }
     ]
     
-    for log_data in audit_logs_data:
-        audit_log = AuditLog(**log_data)
-        db.add(audit_log)
-    
-    # Create analytics data
-    analytics_data = {
-        "total_complaints": len(created_complaints),
-        "complaints_by_status": json.dumps({
-            "pending": 1,
-            "approved": 1,
-            "under_review": 1,
-            "rejected": 0
-        }),
-        "complaints_by_category": json.dumps({
-            "Theft/Burglary": 1,
-            "Vandalism/Property Damage": 1,
-            "Cybercrime": 1
-        }),
-        "complaints_by_priority": json.dumps({
-            "low": 1,
-            "medium": 1,
-            "high": 1,
-            "urgent": 0
-        }),
-        "monthly_trends": json.dumps([
-            {"month": "2024-12", "count": 3, "approved": 1, "rejected": 0}
-        ]),
-        "user_stats": json.dumps({
-            "totalUsers": len(created_users),
-            "activeUsers": 3,
-            "newUsersThisMonth": 6
-        }),
-        "response_time_stats": json.dumps({
-            "average": 24.5,
-            "median": 24.0,
-            "fastest": 12.0,
-            "slowest": 48.0
-        })
-    }
+    write_audit(db, audit_logs_data)
     
-    analytics = Analytics(**analytics_data)
+    # Create analytics data from the rows above
+    db.flush()
+    analytics = Analytics()
     db.add(analytics)
+    db.flush()
     
     # Commit all changes
+    reconcile_analytics(db)
     db.commit()
     
     print("Initial data created successfully!")
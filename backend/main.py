@@ -1,24 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-import json
+import asyncio
 import os
-import shutil
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from database import get_db, User, Complaint, Analytics, Notification, AuditLog
+from database import get_db, AsyncSessionLocal, User, Complaint, Analytics, Notification
+from analytics import record_user_created, reconcile_analytics, run_reconciliation, aggregate_analytics
 from auth import (
-    verify_password, get_password_hash, create_access_token, 
-    create_refresh_token, get_current_user, require_role, verify_token
+    create_access_token, 
+    create_refresh_token, get_current_user, require_role,
+    get_user_by_email, token_claims, principal_cache, stream_user
 )
 from schemas import (
     UserCreate, UserLogin, UserResponse, UserUpdate, ComplaintCreate, 
-    ComplaintResponse, ComplaintApprove, TokenResponse, RefreshToken
+    ComplaintResponse, ComplaintSearchResult, ComplaintNearbyResult, ComplaintApprove, TokenResponse,
+    RefreshToken, AnalyticsResponse, HotspotCell, DuplicateCluster, DuplicateLink,
+    BulkModeration, BulkModerationResult, NotificationReadMany
+)
+from uploads import MAX_IMAGES_PER_COMPLAINT, MAX_REQUEST_BYTES
+from tokens import decode_token, InvalidToken, is_revoked, load_revocations, revoke as revoke_token
+from passwords import (
+    password_pool, hash_password, check_password, check_throttle,
+    record_login_failure, record_login_success
+)
+import passwords
+from blobstore import store_upload, add_references, blob_response, derivative_response, schedule_derivatives
+import derivatives
+from search import search_complaints as run_search
+from geo import (
+    apply_geocode, check_bbox, within_bbox, nearby_complaints, hotspots,
+    MAX_NEARBY_RADIUS_KM, MAX_HOTSPOT_CELLS
+)
+import dedup
+import minhash
+from dedup import check_complaint, index_complaint, duplicate_clusters, link_duplicate
+from moderation import bulk_moderate
+import outbox
+from outbox import emit
+import exports
+from taxonomy import CATEGORIES, CRIME_TYPES
+import realtime
+from audit import AuditFilters, list_entries as list_audit_entries, export_entries as export_audit_entries
+from realtime import notification_events, sse_stream, websocket_message, unread_count, notifications_read
+import notifications
+from notifications import mark_read, not_expired
+from pagination import paginate, set_page_headers, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from queries import (
+    ComplaintFilters, UserFilters, COMPLAINT_SORTS, USER_SORTS,
+    complaint_projection, complaint_to_dict
 )
 
-app = FastAPI(title="Crime Report Management API", version="1.0.0")
+app = FastAPI(
+    title="Crime Report Management API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,17 +68,161 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
 os.makedirs("uploads", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+@app.get("/evidence/{name}")
+async def get_evidence(name: str, request: Request):
+    return blob_response(request, name)
+
+@app.get("/evidence/{sha256}/{name}")
+async def get_evidence_derivative(sha256: str, name: str, request: Request):
+    return derivative_response(request, sha256, name)
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Refuse oversized uploads before the multipart body is parsed and spooled
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        return ORJSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+# Safety net for the incremental analytics counters: periodically compare them
+# against a full recompute and repair any drift
+ANALYTICS_RECONCILE_INTERVAL_SECONDS = 15 * 60
+
+async def reconcile_analytics_periodically():
+    while True:
+        await asyncio.sleep(ANALYTICS_RECONCILE_INTERVAL_SECONDS)
+        try:
+            result = await run_in_threadpool(run_reconciliation)
+            if result["drift"]:
+                print(f"Analytics drift repaired: {sorted(result['drift'])}")
+        except Exception as e:
+            print(f"Analytics reconciliation failed: {e}")
+
+@app.on_event("startup")
+async def start_analytics_reconciliation():
+    asyncio.create_task(reconcile_analytics_periodically())
+
+# Revoked refresh tokens are mirrored in memory; reloading also prunes expired
+# rows and picks up revocations made by other workers
+TOKEN_REVOCATION_RELOAD_SECONDS = 5 * 60
+
+async def reload_token_revocations_periodically():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await load_revocations(db)
+        except Exception as e:
+            print(f"Loading token revocations failed: {e}")
+        await asyncio.sleep(TOKEN_REVOCATION_RELOAD_SECONDS)
+
+@app.on_event("startup")
+async def start_token_revocation_reload():
+    asyncio.create_task(reload_token_revocations_periodically())
+
+# Fans out the side effects recorded in the outbox; runs in every worker,
+# claims never overlap
+async def dispatch_outbox_continuously():
+    while True:
+        try:
+            dispatched = await run_in_threadpool(outbox.run_dispatch)
+        except Exception as e:
+            print(f"Outbox dispatch failed: {e}")
+            dispatched = 0
+        if dispatched:
+            # New notifications are likely; push them without waiting for the next poll
+            realtime.notification_feed.wakeup.set()
+        # Keep going while there is a backlog, otherwise poll
+        if dispatched < outbox.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(outbox.OUTBOX_POLL_SECONDS)
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    asyncio.create_task(dispatch_outbox_continuously())
+
+# Publishes new notifications to this worker's stream subscribers
+async def publish_notifications_continuously():
+    feed = realtime.notification_feed
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                published = await feed.poll(db)
+        except Exception as e:
+            print(f"Notification feed failed: {e}")
+            published = 0
+        if published < realtime.FEED_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(feed.wakeup.wait(), realtime.REALTIME_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            feed.wakeup.clear()
+
+@app.on_event("startup")
+async def start_notification_feed():
+    if realtime.REALTIME_FEED:
+        asyncio.create_task(publish_notifications_continuously())
+
+# Deletes expired and old read notifications in small batches
+NOTIFICATION_PURGE_INTERVAL_SECONDS = 60 * 60
+
+async def purge_notifications_periodically():
+    while True:
+        await asyncio.sleep(NOTIFICATION_PURGE_INTERVAL_SECONDS)
+        try:
+            counts = await run_in_threadpool(notifications.run_purge)
+            if counts["unread"]:
+                # Cached unread counts may include purged rows
+                realtime.unread_counts.clear()
+        except Exception as e:
+            print(f"Notification purge failed: {e}")
+
+@app.on_event("startup")
+async def start_notification_purge():
+    asyncio.create_task(purge_notifications_periodically())
+
+# The near-duplicate index is per worker: loaded at startup, then topped up
+# with complaints other workers stored
+DEDUP_REFRESH_SECONDS = 60
+
+async def refresh_duplicate_index_periodically():
+    while True:
+        try:
+            await run_in_threadpool(dedup.refresh)
+        except Exception as e:
+            print(f"Refreshing the duplicate index failed: {e}")
+        await asyncio.sleep(DEDUP_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_duplicate_index_refresh():
+    asyncio.create_task(refresh_duplicate_index_periodically())
+
+@app.on_event("startup")
+def start_worker_pools():
+    # Spawn the bcrypt and signature workers now rather than on first use
+    password_pool.start()
+    minhash.get_pool()
+
+@app.on_event("shutdown")
+def stop_worker_pools():
+    derivatives.shutdown_pool()
+    minhash.shutdown_pool()
+    password_pool.shutdown()
+
+def client_ip(request: Request):
+    return request.client.host if request.client else "unknown"
+
 @app.post("/auth/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user.email).first():
+async def register(user: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
+    check_throttle(client_ip(request))
+    if await get_user_by_email(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = User(
         email=user.email,
         password=hashed_password,
@@ -45,17 +231,21 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         address=user.address
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    await db.run_sync(record_user_created, db_user)
+    await db.commit()
     return db_user
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password):
+async def login(user: UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    check_throttle(client_ip(request), user.email)
+    db_user = await get_user_by_email(db, user.email)
+    if not db_user or not await check_password(user.password, db_user.password):
+        record_login_failure(user.email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    record_login_success(user.email)
     
-    access_token = create_access_token(data={"sub": db_user.email})
+    access_token = create_access_token(data=token_claims(db_user))
     refresh_token = create_refresh_token(data={"sub": db_user.email})
     
     return {
@@ -65,28 +255,40 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.post("/auth/refresh", response_model=TokenResponse)
-def refresh_token(token_data: RefreshToken, db: Session = Depends(get_db)):
-    from jose import jwt, JWTError
+async def refresh_token(token_data: RefreshToken, db: AsyncSession = Depends(get_db)):
     try:
-        payload = jwt.decode(token_data.refresh_token, "your-secret-key-change-in-production", algorithms=["HS256"])
-        email = payload.get("sub")
-        if payload.get("type") != "refresh":
-            raise HTTPException(status_code=401, detail="Invalid token type")
-        
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        access_token = create_access_token(data={"sub": email})
-        refresh_token = create_refresh_token(data={"sub": email})
-        
-        return {
-            "access_token": access_token,
-            "refresh_token": refresh_token,
-            "token_type": "bearer"
-        }
-    except JWTError:
+        payload = decode_token(token_data.refresh_token, "refresh")
+    except InvalidToken:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+    
+    email = payload["sub"]
+    user = await get_user_by_email(db, email)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Refresh tokens are single use: each refresh retires the presented one
+    if not await revoke_token(db, payload):
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+    
+    access_token = create_access_token(data=token_claims(user))
+    refresh_token = create_refresh_token(data={"sub": email})
+    
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+@app.post("/auth/logout")
+async def logout(token_data: RefreshToken, db: AsyncSession = Depends(get_db)):
+    try:
+        payload = decode_token(token_data.refresh_token, "refresh")
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    await revoke_token(db, payload)
+    return {"message": "Logged out"}
 
 @app.post("/complaints/register")
 async def register_complaint(
@@ -99,17 +301,18 @@ async def register_complaint(
     witnesses: str = Form(""),
     images: List[UploadFile] = File([]),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     print(f"Received complaint data: title={title}, description={description}, incident_date={incident_date}, location={incident_location}, type={complaint_type}, priority={priority}")
     
-    image_paths = []
-    for image in images:
-        if image.filename:
-            file_path = f"uploads/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{image.filename}"
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
-            image_paths.append(file_path)
+    images = [image for image in images if image.filename]
+    if len(images) > MAX_IMAGES_PER_COMPLAINT:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_COMPLAINT} images per complaint")
+    
+    # Blobs written here but never referenced (e.g. the request fails below)
+    # are removed later by `python blobstore.py gc`
+    stored_images = [await store_upload(image) for image in images]
+    image_paths = [stored.path for stored in stored_images]
     
     # Parse incident date
     try:
@@ -127,165 +330,277 @@ async def register_complaint(
         complaint_type=complaint_type,
         priority=priority,
         witnesses=witnesses if witnesses else None,
-        images=json.dumps(image_paths) if image_paths else None,
+        images=image_paths or None,
         user_id=current_user.id
     )
+    # Gazetteer lookup and duplicate search both run in memory
+    apply_geocode(complaint)
+    signature = await check_complaint(db, complaint)
     
     db.add(complaint)
-    db.commit()
-    db.refresh(complaint)
-    
-    # Create notification
-    notification = Notification(
-        user_id=current_user.id,
-        title="Complaint Submitted",
-        message=f"Your complaint '{title}' has been submitted successfully.",
-        type="success",
-        category="complaint",
-        action_url="/track-complaints"
-    )
-    db.add(notification)
-    
-    # Create audit log
-    audit_log = AuditLog(
-        user_id=current_user.id,
-        user_name=current_user.full_name,
-        action="CREATE_COMPLAINT",
-        resource="complaint",
-        resource_id=str(complaint.id),
-        details=json.dumps({"category": complaint_type, "priority": priority})
-    )
-    db.add(audit_log)
-    
-    db.commit()
-    
-    # Update analytics
-    update_analytics(db)
+    await db.flush()
+    await db.run_sync(add_references, stored_images)
+    # Notification, audit entry and analytics follow from the outbox event,
+    # committed together with the complaint
+    emit(db, "complaint.created", {
+        "complaint_id": complaint.id,
+        "user_id": current_user.id,
+        "user_name": current_user.full_name,
+        "title": title,
+        "status": complaint.status,
+        "complaint_type": complaint_type,
+        "priority": complaint.priority,
+        "created_at": complaint.created_at,
+    })
+    await db.commit()
+    index_complaint(complaint, signature)
+    schedule_derivatives(stored_images)
     
-    return {"message": "Complaint registered successfully", "complaint_id": complaint.id}
+    return {
+        "message": "Complaint registered successfully",
+        "complaint_id": complaint.id,
+        "duplicate_of": complaint.duplicate_of
+    }
 
 @app.get("/complaints/", response_model=List[ComplaintResponse])
-def get_complaints(
-    status: Optional[str] = None,
+async def get_complaints(
+    request: Request,
+    response: Response,
+    filters: ComplaintFilters = Depends(),
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(require_role(["police", "admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Complaint)
-    if status:
-        query = query.filter(Complaint.status == status)
-    
-    complaints = query.all()
-    for complaint in complaints:
-        if complaint.images:
-            complaint.images = json.loads(complaint.images)
-    
-    return complaints
+    statement = filters.apply(complaint_projection())
+    rows, next_cursor = await paginate(db, statement, sort, COMPLAINT_SORTS, Complaint.id, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return [complaint_to_dict(row) for row in rows]
 
 @app.get("/complaints/my", response_model=List[ComplaintResponse])
-def get_my_complaints(
+async def get_my_complaints(
+    request: Request,
+    response: Response,
+    filters: ComplaintFilters = Depends(),
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    complaints = db.query(Complaint).filter(Complaint.user_id == current_user.id).all()
-    for complaint in complaints:
-        if complaint.images:
-            complaint.images = json.loads(complaint.images)
-    
-    return complaints
+    statement = filters.apply(complaint_projection().filter(Complaint.user_id == current_user.id))
+    rows, next_cursor = await paginate(db, statement, sort, COMPLAINT_SORTS, Complaint.id, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return [complaint_to_dict(row) for row in rows]
+
+# Every matching complaint with reporter and approver, streamed in batches
+@app.get("/complaints/export")
+async def export_complaints(
+    filters: ComplaintFilters = Depends(),
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    if format == "parquet" and exports.pyarrow is None:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    # The export reads through its own session
+    await db.close()
+    return StreamingResponse(
+        exports.export_complaints(filters, format),
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="complaints.{format}"'},
+    )
+
+@app.get("/complaints/search", response_model=List[ComplaintSearchResult])
+async def search_complaints(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    filters: ComplaintFilters = Depends(),
+    sort: str = "relevance",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # sort=relevance (default) or newest; a cursor is only valid for the same q and filters.
+    # Relevance ranks the newest SEARCH_RANK_WINDOW matches, then pages on into older ones
+    results, next_cursor = await run_search(db, q, filters, sort, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return results
+
+@app.get("/complaints/nearby", response_model=List[ComplaintNearbyResult])
+async def get_nearby_complaints(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(2, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    filters: ComplaintFilters = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # Nearest first, only geocoded complaints
+    return await nearby_complaints(db, lat, lon, radius_km, filters, limit)
+
+@app.get("/complaints/within", response_model=List[ComplaintResponse])
+async def get_complaints_within(
+    request: Request,
+    response: Response,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    filters: ComplaintFilters = Depends(),
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    bbox = check_bbox(min_lat, min_lon, max_lat, max_lon)
+    statement = filters.apply(within_bbox(complaint_projection(), db.bind.dialect.name, *bbox))
+    rows, next_cursor = await paginate(db, statement, sort, COMPLAINT_SORTS, Complaint.id, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return [complaint_to_dict(row) for row in rows]
+
+@app.get("/complaints/duplicates", response_model=List[DuplicateCluster])
+async def get_duplicate_clusters(
+    request: Request,
+    response: Response,
+    filters: ComplaintFilters = Depends(),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # Newest clusters first; e.g. status=pending for those still in the queue
+    clusters, next_cursor = await duplicate_clusters(db, filters, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return clusters
 
 @app.get("/complaints/{complaint_id}", response_model=ComplaintResponse)
-def get_complaint(
+async def get_complaint(
     complaint_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not complaint:
+    result = await db.execute(complaint_projection().filter(Complaint.id == complaint_id))
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
-    if current_user.role == "user" and complaint.user_id != current_user.id:
+    if current_user.role == "user" and row.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    if complaint.images:
-        complaint.images = json.loads(complaint.images)
-    
-    return complaint
+    return complaint_to_dict(row)
+
+def check_moderated(result: dict):
+    if result["results"][0]["result"] == "not_found":
+        raise HTTPException(status_code=404, detail="Complaint not found")
+    if result["results"][0]["result"] == "conflict":
+        raise HTTPException(status_code=409, detail="Complaint was changed by someone else, try again")
 
 @app.post("/complaints/{complaint_id}/approve")
-def approve_complaint(
+async def approve_complaint(
     complaint_id: int,
     approval_data: ComplaintApprove,
     current_user: User = Depends(require_role(["police", "admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not complaint:
-        raise HTTPException(status_code=404, detail="Complaint not found")
-    
-    complaint.status = "approved"
-    complaint.crime_type = approval_data.crime_type
-    complaint.approved_by = current_user.id
-    complaint.updated_at = datetime.utcnow()
-    
-    db.commit()
+    request = BulkModeration(ids=[complaint_id], action="approve", crime_type=approval_data.crime_type)
+    result = await bulk_moderate(db, request, current_user)
+    check_moderated(result)
+    if result["results"][0]["result"] == "unchanged":
+        return {"message": "Complaint was already approved"}
     return {"message": "Complaint approved successfully"}
 
 @app.post("/complaints/{complaint_id}/reject")
-def reject_complaint(
+async def reject_complaint(
     complaint_id: int,
     current_user: User = Depends(require_role(["police", "admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
+    result = await bulk_moderate(db, BulkModeration(ids=[complaint_id], action="reject"), current_user)
+    check_moderated(result)
+    if result["results"][0]["result"] == "unchanged":
+        return {"message": "Complaint was already rejected"}
+    return {"message": "Complaint rejected successfully"}
+
+@app.post("/complaints/bulk", response_model=BulkModerationResult)
+async def moderate_complaints(
+    request: BulkModeration,
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # approve (with crime_type), reject, assign (assigned_officer) or priority
+    # for up to 500 ids in one transaction, with a result per id
+    return await bulk_moderate(db, request, current_user)
+
+@app.put("/complaints/{complaint_id}/duplicate")
+async def set_duplicate(
+    complaint_id: int,
+    link: DuplicateLink,
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # Confirm a match by hand, move it to another cluster or dismiss it (null)
+    complaint = await db.get(Complaint, complaint_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
-    
-    complaint.status = "rejected"
-    complaint.approved_by = current_user.id
-    complaint.updated_at = datetime.utcnow()
-    
-    db.commit()
-    return {"message": "Complaint rejected successfully"}
+    cluster = await link_duplicate(db, complaint, link.duplicate_of)
+    return {"message": "Duplicate flag updated", "duplicate_of": cluster}
 
 @app.get("/users/profile", response_model=UserResponse)
-def get_profile(current_user: User = Depends(get_current_user)):
+async def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.put("/users/profile", response_model=UserResponse)
-def update_profile(
+async def update_profile(
     profile_data: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    # current_user is a cached snapshot; the update goes through the session,
+    # which also invalidates the cache entry
+    user = await db.get(User, current_user.id)
     if profile_data.full_name:
-        current_user.full_name = profile_data.full_name
+        user.full_name = profile_data.full_name
     if profile_data.phone:
-        current_user.phone = profile_data.phone
+        user.phone = profile_data.phone
     if profile_data.address:
-        current_user.address = profile_data.address
+        user.address = profile_data.address
     
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await db.commit()
+    return user
 
 @app.get("/users/", response_model=List[UserResponse])
-def get_users(
+async def get_users(
+    request: Request,
+    response: Response,
+    filters: UserFilters = Depends(),
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    return db.query(User).all()
+    statement = filters.apply(select(User))
+    users, next_cursor = await paginate(db, statement, sort, USER_SORTS, User.id, cursor, limit, scalars=True)
+    set_page_headers(request, response, next_cursor)
+    return users
 
 @app.post("/users/create")
-def create_user(
+async def create_user(
     user_data: UserCreate,
     role: str = Form(...),
     current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await get_user_by_email(db, user_data.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         email=user_data.email,
         password=hashed_password,
@@ -295,138 +610,220 @@ def create_user(
         role=role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    await db.run_sync(record_user_created, db_user)
+    await db.commit()
     
     return {"message": f"{role.title()} created successfully", "user_id": db_user.id}
 
 # Analytics endpoints
 @app.get("/analytics/")
-def get_analytics(
+async def get_analytics(
     current_user: User = Depends(require_role(["police", "admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    analytics = db.query(Analytics).first()
+    result = await db.execute(select(Analytics).limit(1))
+    analytics = result.scalars().first()
     if not analytics:
         return {"message": "No analytics data available"}
     
     return {
         "totalComplaints": analytics.total_complaints,
-        "complaintsByStatus": json.loads(analytics.complaints_by_status or "{}"),
-        "complaintsByCategory": json.loads(analytics.complaints_by_category or "{}"),
-        "complaintsByPriority": json.loads(analytics.complaints_by_priority or "{}"),
-        "monthlyTrends": json.loads(analytics.monthly_trends or "[]"),
-        "userStats": json.loads(analytics.user_stats or "{}"),
-        "responseTimeStats": json.loads(analytics.response_time_stats or "{}")
+        "complaintsByStatus": analytics.complaints_by_status or {},
+        "complaintsByCategory": analytics.complaints_by_category or {},
+        "complaintsByPriority": analytics.complaints_by_priority or {},
+        "monthlyTrends": analytics.monthly_trends or [],
+        "userStats": analytics.user_stats or {},
+        "responseTimeStats": analytics.response_time_stats or {}
+    }
+
+@app.get("/analytics/live", response_model=AnalyticsResponse)
+async def get_live_analytics(
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    return await db.run_sync(aggregate_analytics)
+
+@app.get("/analytics/hotspots", response_model=List[HotspotCell])
+async def get_hotspots(
+    precision: int = Query(6, ge=1, le=9),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    filters: ComplaintFilters = Depends(),
+    limit: int = Query(1000, ge=1, le=MAX_HOTSPOT_CELLS),
+    current_user: User = Depends(require_role(["police", "admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    # Complaint counts per geohash cell for the map; precision 5 is ~5km
+    # cells, 6 ~1.2km, 7 ~150m. The box is optional but all-or-nothing
+    corners = [min_lat, min_lon, max_lat, max_lon]
+    if any(corner is None for corner in corners) and any(corner is not None for corner in corners):
+        raise HTTPException(status_code=400, detail="Give all of min_lat, min_lon, max_lat and max_lon, or none")
+    bbox = check_bbox(*corners) if min_lat is not None else None
+    return await hotspots(db, precision, filters, bbox, limit)
+
+@app.post("/analytics/reconcile")
+async def reconcile_analytics_now(
+    repair: bool = True,
+    current_user: User = Depends(require_role(["admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    return await db.run_sync(reconcile_analytics, repair)
+
+@app.get("/admin/metrics")
+async def get_metrics(
+    current_user: User = Depends(require_role(["admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    return {
+        "passwords": passwords.metrics(),
+        "principal_cache": principal_cache.stats(),
+        "outbox": await db.run_sync(outbox.stats),
+        "realtime": realtime.stats(),
     }
 
 # Notifications endpoints
 @app.get("/notifications/")
-def get_notifications(
+async def get_notifications(
+    unread: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    notifications = db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    ).order_by(Notification.created_at.desc()).limit(50).all()
-    
-    return notifications
+    query = select(Notification).filter(Notification.user_id == current_user.id, not_expired())
+    if unread:
+        # Served by the partial index on unread rows; ids follow creation order
+        query = query.filter(Notification.read == False).order_by(Notification.id.desc())
+    else:
+        query = query.order_by(Notification.created_at.desc())
+    result = await db.execute(query.limit(50))
+    
+    return result.scalars().all()
+
+@app.get("/notifications/unread-count")
+async def get_unread_count(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return {"unread": await unread_count(db, current_user.id)}
+
+def bearer_token(request, access_token: Optional[str]):
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return access_token
+
+# Server-Sent Events; EventSource sends Last-Event-ID itself when it reconnects
+@app.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    access_token: Optional[str] = None,
+    last_event_id: Optional[int] = None
+):
+    user = await stream_user(bearer_token(request, access_token))
+    header = request.headers.get("last-event-id")
+    if header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    return StreamingResponse(
+        sse_stream(notification_events(user.id, last_event_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/notifications/ws")
+async def notifications_websocket(
+    websocket: WebSocket,
+    access_token: Optional[str] = None,
+    last_event_id: Optional[int] = None
+):
+    try:
+        user = await stream_user(bearer_token(websocket, access_token))
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    events = notification_events(user.id, last_event_id)
+    try:
+        async for event, event_id, data in events:
+            await websocket.send_text(websocket_message(event, event_id, data))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await events.aclose()
+
+@app.post("/notifications/read")
+async def mark_notifications_read(
+    request: NotificationReadMany,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    changed = await mark_read(db, current_user.id, request.ids)
+    notifications_read(current_user.id, changed)
+    return {"updated": len(changed)}
 
 @app.post("/notifications/{notification_id}/read")
-def mark_notification_read(
+async def mark_notification_read(
     notification_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user.id
-    ).first()
-    
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    notification.read = True
-    db.commit()
+    changed = await mark_read(db, current_user.id, [notification_id])
+    if changed:
+        notifications_read(current_user.id, changed)
+    else:
+        # Already read, or not this user's
+        result = await db.execute(
+            select(Notification.id).filter(
+                Notification.id == notification_id,
+                Notification.user_id == current_user.id
+            )
+        )
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail="Notification not found")
     
     return {"message": "Notification marked as read"}
 
-# Audit logs endpoint
+# Audit logs endpoints
 @app.get("/audit-logs/")
-def get_audit_logs(
-    limit: int = 100,
+async def get_audit_logs(
+    request: Request,
+    response: Response,
+    filters: AuditFilters = Depends(),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_role(["admin"])),
+    db: AsyncSession = Depends(get_db)
+):
+    entries, next_cursor = await list_audit_entries(db, filters, cursor, limit)
+    set_page_headers(request, response, next_cursor)
+    return entries
+
+# Every matching entry, including archived months, streamed as it is read
+@app.get("/audit-logs/export")
+async def export_audit_logs(
+    filters: AuditFilters = Depends(),
+    format: Literal["ndjson", "csv"] = "ndjson",
     current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).limit(limit).all()
-    return logs
+    # The export reads through its own session; don't hold this one's
+    # connection for the length of the download
+    await db.close()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_audit_entries(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="audit-logs.{format}"'},
+    )
 
 # Categories and types endpoints
 @app.get("/complaint-categories/")
-def get_complaint_categories():
-    return {
-        "categories": [
-            "Theft/Burglary", "Assault/Violence", "Vandalism/Property Damage",
-            "Fraud/Scam", "Drug-related", "Traffic Violation", "Cybercrime",
-            "Domestic Violence", "Public Disturbance", "Other"
-        ],
-        "crimeTypes": {
-            "Theft/Burglary": ["Petty Theft", "Grand Theft", "Burglary", "Robbery", "Shoplifting"],
-            "Assault/Violence": ["Simple Assault", "Aggravated Assault", "Battery", "Domestic Violence"],
-            "Vandalism/Property Damage": ["Graffiti", "Property Destruction", "Trespassing"],
-            "Fraud/Scam": ["Identity Theft", "Credit Card Fraud", "Online Scam", "Check Fraud"],
-            "Drug-related": ["Possession", "Distribution", "Manufacturing", "Public Intoxication"],
-            "Traffic Violation": ["Reckless Driving", "DUI", "Hit and Run", "Speeding"],
-            "Cybercrime": ["Hacking", "Online Harassment", "Data Breach", "Phishing"],
-            "Domestic Violence": ["Physical Abuse", "Emotional Abuse", "Stalking", "Harassment"],
-            "Public Disturbance": ["Noise Complaint", "Public Intoxication", "Disorderly Conduct"],
-            "Other": ["Other Crime"]
-        }
-    }
-
-# Helper function to update analytics
-def update_analytics(db: Session):
-    complaints = db.query(Complaint).all()
-    users = db.query(User).all()
-    
-    # Calculate statistics
-    total_complaints = len(complaints)
-    
-    complaints_by_status = {}
-    complaints_by_category = {}
-    complaints_by_priority = {}
-    
-    for complaint in complaints:
-        # Status
-        status = complaint.status
-        complaints_by_status[status] = complaints_by_status.get(status, 0) + 1
-        
-        # Category
-        category = complaint.complaint_type
-        complaints_by_category[category] = complaints_by_category.get(category, 0) + 1
-        
-        # Priority
-        priority = complaint.priority
-        complaints_by_priority[priority] = complaints_by_priority.get(priority, 0) + 1
-    
-    # Update or create analytics record
-    analytics = db.query(Analytics).first()
-    if not analytics:
-        analytics = Analytics()
-        db.add(analytics)
-    
-    analytics.total_complaints = total_complaints
-    analytics.complaints_by_status = json.dumps(complaints_by_status)
-    analytics.complaints_by_category = json.dumps(complaints_by_category)
-    analytics.complaints_by_priority = json.dumps(complaints_by_priority)
-    analytics.user_stats = json.dumps({
-        "totalUsers": len(users),
-        "activeUsers": len([u for u in users if u.is_active]),
-        "newUsersThisMonth": len(users)  # Simplified for demo
-    })
-    analytics.updated_at = datetime.utcnow()
-    
-    db.commit()
+async def get_complaint_categories():
+    return {"categories": CATEGORIES, "crimeTypes": CRIME_TYPES}
 
 if __name__ == "__main__":
     import uvicorn
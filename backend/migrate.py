@@ -0,0 +1,168 @@
+"""Versioned schema migrations.
+
+Each file in migrations/ defines ``revision``, ``down_revision``,
+``description`` and ``upgrade(conn)`` / ``downgrade(conn)`` functions, in the
+style of Alembic. Applied revisions are recorded in ``schema_migrations``.
+
+Every process that imports database.py applies pending migrations, so
+several workers starting together may try at once. Each migration runs
+under a database-wide lock (BEGIN IMMEDIATE on SQLite, a transaction-level
+advisory lock on PostgreSQL) and is skipped if another process applied it
+while this one waited.
+
+Usage (from the backend directory):
+    python migrate.py upgrade [revision]
+    python migrate.py downgrade <revision|base>
+    python migrate.py current
+    python migrate.py history
+"""
+import importlib.util
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from decouple import config
+
+from sqlalchemy import Table, Column, String, DateTime, MetaData, inspect, select, insert, delete, text
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Arbitrary, but the same in every process that migrates this database
+ADVISORY_LOCK_KEY = 7_316_243
+# Seconds a process waits for another one's migration to finish
+MIGRATION_LOCK_TIMEOUT = config("MIGRATION_LOCK_TIMEOUT", default=600, cast=float)
+
+version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", version_metadata,
+    Column("revision", String, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+def load_migrations():
+    modules = {}
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith(".py") or filename.startswith("_"):
+            continue
+        path = os.path.join(MIGRATIONS_DIR, filename)
+        spec = importlib.util.spec_from_file_location(f"migrations.{filename[:-3]}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules[module.revision] = module
+
+    # Order by following the down_revision chain from the base
+    ordered = []
+    parents = {module.down_revision: module for module in modules.values()}
+    if len(parents) != len(modules):
+        raise RuntimeError("Migration history has more than one head")
+    current = None
+    while current in parents:
+        module = parents[current]
+        ordered.append(module)
+        current = module.revision
+    if len(ordered) != len(modules):
+        raise RuntimeError("Migration history is not a single chain")
+    return ordered
+
+def applied_revisions(conn, create: bool = True):
+    if create:
+        version_metadata.create_all(conn)
+    elif not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return {row.revision for row in conn.execute(select(schema_migrations.c.revision))}
+
+@contextmanager
+def locked(engine):
+    """A transaction holding the migration lock, committed on success."""
+    with engine.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            yield conn
+            conn.commit()
+            return
+        # Wait out another process's migration rather than the usual 5 s
+        previous = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(MIGRATION_LOCK_TIMEOUT * 1000)}")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {previous}")
+
+def _revision_index(migrations, revision):
+    if revision in (None, "base"):
+        return -1
+    if revision == "head":
+        return len(migrations) - 1
+    for index, module in enumerate(migrations):
+        if module.revision == revision:
+            return index
+    raise ValueError(f"Unknown revision {revision}")
+
+def upgrade(engine, target: str = "head"):
+    migrations = load_migrations()
+    stop = _revision_index(migrations, target)
+    # Unlocked first look, so an up to date database costs no lock
+    with engine.begin() as conn:
+        applied = applied_revisions(conn, create=False)
+
+    for module in migrations[:stop + 1]:
+        if module.revision in applied:
+            continue
+        with locked(engine) as conn:
+            if module.revision in applied_revisions(conn):
+                continue
+            module.upgrade(conn)
+            conn.execute(insert(schema_migrations).values(
+                revision=module.revision,
+                description=module.description,
+                applied_at=datetime.utcnow()
+            ))
+
+def downgrade(engine, target: str):
+    migrations = load_migrations()
+    stop = _revision_index(migrations, target)
+    with engine.begin() as conn:
+        applied = applied_revisions(conn)
+
+    for module in reversed(migrations[stop + 1:]):
+        if module.revision not in applied:
+            continue
+        with locked(engine) as conn:
+            if module.revision not in applied_revisions(conn):
+                continue
+            module.downgrade(conn)
+            conn.execute(delete(schema_migrations).where(schema_migrations.c.revision == module.revision))
+
+def current(engine):
+    migrations = load_migrations()
+    with engine.begin() as conn:
+        applied = applied_revisions(conn)
+    heads = [module.revision for module in migrations if module.revision in applied]
+    return heads[-1] if heads else None
+
+if __name__ == "__main__":
+    os.environ["AUTO_MIGRATE"] = "False"
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        upgrade(engine, sys.argv[2] if len(sys.argv) > 2 else "head")
+        print(f"Upgraded to {current(engine)}")
+    elif command == "downgrade" and len(sys.argv) > 2:
+        downgrade(engine, sys.argv[2])
+        print(f"Downgraded to {current(engine) or 'base'}")
+    elif command == "current":
+        print(current(engine) or "base")
+    elif command == "history":
+        with engine.begin() as conn:
+            applied = applied_revisions(conn)
+        for module in load_migrations():
+            marker = "*" if module.revision in applied else " "
+            print(f"{marker} {module.revision} {module.description}")
+    else:
+        print(__doc__)
+        sys.exit(1)
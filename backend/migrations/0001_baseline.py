@@ -0,0 +1,102 @@
+"""Baseline schema, as previously created by Base.metadata.create_all.
+
+Tables are created with checkfirst, so databases created before migrations
+existed are adopted without changes.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+
+revision = "0001"
+down_revision = None
+description = "baseline schema"
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("password", String),
+    Column("full_name", String),
+    Column("phone", String),
+    Column("address", Text),
+    Column("role", String),
+    Column("created_at", DateTime),
+    Column("is_active", Boolean),
+)
+
+Table(
+    "complaints", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String),
+    Column("description", Text),
+    Column("incident_date", DateTime),
+    Column("incident_location", String),
+    Column("complaint_type", String),
+    Column("status", String),
+    Column("crime_type", String, nullable=True),
+    Column("priority", String),
+    Column("images", Text, nullable=True),
+    Column("witnesses", Text, nullable=True),
+    Column("assigned_officer", String, nullable=True),
+    Column("review_notes", Text, nullable=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("approved_by", Integer, ForeignKey("users.id"), nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "analytics", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("total_complaints", Integer),
+    Column("complaints_by_status", Text),
+    Column("complaints_by_category", Text),
+    Column("complaints_by_priority", Text),
+    Column("monthly_trends", Text),
+    Column("user_stats", Text),
+    Column("response_time_stats", Text),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "analytics_sketches", metadata,
+    Column("name", String, primary_key=True),
+    Column("state", Text),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "notifications", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("title", String),
+    Column("message", Text),
+    Column("type", String),
+    Column("category", String),
+    Column("read", Boolean),
+    Column("action_url", String, nullable=True),
+    Column("meta_data", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("expires_at", DateTime, nullable=True),
+)
+
+Table(
+    "audit_logs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("user_name", String),
+    Column("action", String),
+    Column("resource", String),
+    Column("resource_id", String, nullable=True),
+    Column("details", Text),
+    Column("ip_address", String, nullable=True),
+    Column("user_agent", String, nullable=True),
+    Column("timestamp", DateTime),
+)
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+
+def downgrade(conn):
+    metadata.drop_all(conn, checkfirst=True)
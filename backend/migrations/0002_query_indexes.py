@@ -0,0 +1,33 @@
+"""Composite indexes for the hot endpoint queries.
+
+- complaint listings: optional status / user_id equality, keyset on
+  (created_at, id); the other sort keys get their own (column, id) index
+- user listing: optional role equality, keyset on (created_at, id)
+- notifications: latest per user
+- audit logs: newest first
+"""
+from sqlalchemy import text
+
+revision = "0002"
+down_revision = "0001"
+description = "composite indexes for listing, notification and audit queries"
+
+INDEXES = {
+    "ix_complaints_created_at": "complaints (created_at, id)",
+    "ix_complaints_updated_at": "complaints (updated_at, id)",
+    "ix_complaints_incident_date": "complaints (incident_date, id)",
+    "ix_complaints_status_created_at": "complaints (status, created_at, id)",
+    "ix_complaints_user_id_created_at": "complaints (user_id, created_at, id)",
+    "ix_users_created_at": "users (created_at, id)",
+    "ix_users_role_created_at": "users (role, created_at, id)",
+    "ix_notifications_user_id_created_at": "notifications (user_id, created_at)",
+    "ix_audit_logs_timestamp": "audit_logs (timestamp)",
+}
+
+def upgrade(conn):
+    for name, definition in INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+def downgrade(conn):
+    for name in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
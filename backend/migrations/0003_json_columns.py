@@ -0,0 +1,50 @@
+"""Store JSON blobs as native JSON columns.
+
+Complaint.images, Notification.meta_data, AuditLog.details and the
+analytics blobs used to be TEXT holding json.dumps output that every reader
+parsed by hand. The models now declare them as JSON, decoded once by the
+type layer. Existing rows are cleaned so they all hold valid JSON: empty
+strings become NULL and stray non-JSON text is kept as a JSON string (a
+single image path becomes a one-element list). On PostgreSQL the columns
+are converted to jsonb.
+"""
+from sqlalchemy import text
+
+revision = "0003"
+down_revision = "0002"
+description = "native JSON columns for images, metadata, details and analytics"
+
+JSON_COLUMNS = [
+    ("complaints", "images"),
+    ("notifications", "meta_data"),
+    ("audit_logs", "details"),
+    ("analytics", "complaints_by_status"),
+    ("analytics", "complaints_by_category"),
+    ("analytics", "complaints_by_priority"),
+    ("analytics", "monthly_trends"),
+    ("analytics", "user_stats"),
+    ("analytics", "response_time_stats"),
+    ("analytics_sketches", "state"),
+]
+
+def upgrade(conn):
+    postgres = conn.dialect.name == "postgresql"
+    for table, column in JSON_COLUMNS:
+        conn.execute(text(f"UPDATE {table} SET {column} = NULL WHERE {column} = '' OR {column} = 'null'"))
+        if postgres:
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"
+            ))
+            continue
+        wrap = "json_array" if column == "images" else "json_quote"
+        conn.execute(text(
+            f"UPDATE {table} SET {column} = {wrap}({column}) "
+            f"WHERE {column} IS NOT NULL AND json_valid({column}) = 0"
+        ))
+
+def downgrade(conn):
+    # SQLite stores JSON as text already; only PostgreSQL changed column types
+    if conn.dialect.name != "postgresql":
+        return
+    for table, column in JSON_COLUMNS:
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE text USING {column}::text"))
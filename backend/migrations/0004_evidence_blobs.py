@@ -0,0 +1,24 @@
+"""Content-addressed evidence store: one row per unique blob, keyed by SHA-256."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime
+
+revision = "0004"
+down_revision = "0003"
+description = "evidence_blobs table for the content-addressed evidence store"
+
+metadata = MetaData()
+
+evidence_blobs = Table(
+    "evidence_blobs", metadata,
+    Column("sha256", String, primary_key=True),
+    Column("size", Integer),
+    Column("content_type", String),
+    Column("extension", String),
+    Column("ref_count", Integer),
+    Column("created_at", DateTime),
+)
+
+def upgrade(conn):
+    evidence_blobs.create(conn, checkfirst=True)
+
+def downgrade(conn):
+    evidence_blobs.drop(conn, checkfirst=True)
@@ -0,0 +1,21 @@
+"""Refresh-token revocation list, loaded into memory by tokens.py."""
+from sqlalchemy import MetaData, Table, Column, String, DateTime, Index
+
+revision = "0005"
+down_revision = "0004"
+description = "revoked_tokens table for refresh-token rotation and logout"
+
+metadata = MetaData()
+
+revoked_tokens = Table(
+    "revoked_tokens", metadata,
+    Column("jti", String, primary_key=True),
+    Column("expires_at", DateTime),
+    Index("ix_revoked_tokens_expires_at", "expires_at"),
+)
+
+def upgrade(conn):
+    revoked_tokens.create(conn, checkfirst=True)
+
+def downgrade(conn):
+    revoked_tokens.drop(conn, checkfirst=True)
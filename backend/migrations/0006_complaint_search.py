@@ -0,0 +1,66 @@
+"""Full-text index over complaint title, description, location and witnesses.
+
+SQLite gets an external-content FTS5 table kept in step with complaints by
+triggers, so only changed rows are re-indexed. PostgreSQL gets a stored,
+generated tsvector column with a GIN index. Ranking weights favour the
+title, then the description, location and witnesses.
+"""
+from sqlalchemy import text
+
+revision = "0006"
+down_revision = "0005"
+description = "full-text search index over complaints"
+
+SEARCH_COLUMNS = ["title", "description", "incident_location", "witnesses"]
+BM25_WEIGHTS = "10.0, 4.0, 2.0, 1.0"
+
+def _sqlite_upgrade(conn):
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5("
+        f"{columns}, content='complaints', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS complaints_fts_insert AFTER INSERT ON complaints BEGIN "
+        f"INSERT INTO complaints_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS complaints_fts_delete AFTER DELETE ON complaints BEGIN "
+        f"INSERT INTO complaints_fts(complaints_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    # Status changes and other edits leave the index alone
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS complaints_fts_update AFTER UPDATE OF {columns} ON complaints BEGIN "
+        f"INSERT INTO complaints_fts(complaints_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO complaints_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    conn.execute(text("INSERT INTO complaints_fts(complaints_fts) VALUES ('rebuild')"))
+    conn.execute(text(f"INSERT INTO complaints_fts(complaints_fts, rank) VALUES ('rank', 'bm25({BM25_WEIGHTS})')"))
+
+def _postgres_upgrade(conn):
+    conn.execute(text(
+        "ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(incident_location, '')), 'C') || "
+        "setweight(to_tsvector('english', coalesce(witnesses, '')), 'D')) STORED"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaints_search_vector ON complaints USING gin (search_vector)"))
+
+def upgrade(conn):
+    if conn.dialect.name == "postgresql":
+        _postgres_upgrade(conn)
+    else:
+        _sqlite_upgrade(conn)
+
+def downgrade(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("DROP INDEX IF EXISTS ix_complaints_search_vector"))
+        conn.execute(text("ALTER TABLE complaints DROP COLUMN IF EXISTS search_vector"))
+        return
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS complaints_fts_{trigger}"))
+    conn.execute(text("DROP TABLE IF EXISTS complaints_fts"))
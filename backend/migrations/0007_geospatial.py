@@ -0,0 +1,61 @@
+"""Coordinates, geohash and a spatial index for complaints.
+
+Adds latitude, longitude and geohash columns (filled by geo.py's offline
+geocoder) and an index on geohash for hotspot grids. SQLite gets an R-tree
+virtual table kept in step with the coordinates by triggers; PostgreSQL a
+(latitude, longitude) b-tree for bounding-box range scans.
+"""
+from sqlalchemy import inspect, text
+
+revision = "0007"
+down_revision = "0006"
+description = "complaint coordinates with geohash and spatial indexes"
+
+COLUMNS = {"latitude": "FLOAT", "longitude": "FLOAT", "geohash": "VARCHAR"}
+
+NEW_ROW = "SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude"
+HAS_COORDINATES = "new.latitude IS NOT NULL AND new.longitude IS NOT NULL"
+
+def _sqlite_upgrade(conn):
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS complaints_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS complaints_rtree_insert AFTER INSERT ON complaints "
+        f"WHEN {HAS_COORDINATES} BEGIN INSERT INTO complaints_rtree {NEW_ROW}; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS complaints_rtree_delete AFTER DELETE ON complaints BEGIN "
+        "DELETE FROM complaints_rtree WHERE id = old.id; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS complaints_rtree_update AFTER UPDATE OF latitude, longitude ON complaints BEGIN "
+        "DELETE FROM complaints_rtree WHERE id = old.id; "
+        f"INSERT INTO complaints_rtree {NEW_ROW} WHERE {HAS_COORDINATES}; END"
+    ))
+    conn.execute(text(
+        "INSERT OR REPLACE INTO complaints_rtree SELECT id, latitude, latitude, longitude, longitude "
+        "FROM complaints WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    ))
+
+def upgrade(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("complaints")}
+    for name, type_ in COLUMNS.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE complaints ADD COLUMN {name} {type_}"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaints_geohash ON complaints (geohash)"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaints_lat_lon ON complaints (latitude, longitude)"))
+    else:
+        _sqlite_upgrade(conn)
+
+def downgrade(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("DROP INDEX IF EXISTS ix_complaints_lat_lon"))
+    else:
+        for trigger in ("insert", "delete", "update"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS complaints_rtree_{trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS complaints_rtree"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_complaints_geohash"))
+    for name in COLUMNS:
+        conn.execute(text(f"ALTER TABLE complaints DROP COLUMN {name}"))
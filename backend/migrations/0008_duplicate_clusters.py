@@ -0,0 +1,28 @@
+"""Near-duplicate flags on complaints.
+
+``duplicate_of`` points at the first complaint of a duplicate cluster (set
+at intake by dedup.py or by an officer), ``duplicate_score`` holds the
+estimated text similarity of automatic matches.
+"""
+from sqlalchemy import inspect, text
+
+revision = "0008"
+down_revision = "0007"
+description = "duplicate_of and duplicate_score on complaints"
+
+COLUMNS = {
+    "duplicate_of": "INTEGER REFERENCES complaints (id)",
+    "duplicate_score": "FLOAT",
+}
+
+def upgrade(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("complaints")}
+    for name, definition in COLUMNS.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE complaints ADD COLUMN {name} {definition}"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaints_duplicate_of ON complaints (duplicate_of, id)"))
+
+def downgrade(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ix_complaints_duplicate_of"))
+    for name in COLUMNS:
+        conn.execute(text(f"ALTER TABLE complaints DROP COLUMN {name}"))
@@ -0,0 +1,24 @@
+"""Transactional outbox: side effects recorded with the change that causes them."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime, JSON
+
+revision = "0009"
+down_revision = "0008"
+description = "outbox_events table for notifications, audit and analytics fan-out"
+
+metadata = MetaData()
+
+outbox_events = Table(
+    "outbox_events", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("event_type", String),
+    Column("payload", JSON),
+    Column("attempts", Integer, default=0),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime),
+)
+
+def upgrade(conn):
+    outbox_events.create(conn, checkfirst=True)
+
+def downgrade(conn):
+    outbox_events.drop(conn, checkfirst=True)
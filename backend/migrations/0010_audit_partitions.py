@@ -0,0 +1,70 @@
+"""Monthly audit log partitions.
+
+Rows of audit_logs move into one table per month (audit_logs_YYYYMM),
+listed in audit_partitions, and the single table is dropped. Migrated rows
+keep their ids; new partitions number their rows from 1.
+"""
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, Boolean, JSON, Index, func, insert, select
+)
+
+revision = "0010"
+down_revision = "0009"
+description = "move audit_logs into monthly partitions"
+
+metadata = MetaData()
+
+audit_partitions = Table(
+    "audit_partitions", metadata,
+    Column("month", String, primary_key=True),
+    Column("live", Boolean),
+    Column("created_at", DateTime),
+    Column("archived_at", DateTime, nullable=True),
+)
+
+def audit_table(name, table_metadata):
+    return Table(
+        name, table_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer),
+        Column("user_name", String),
+        Column("action", String),
+        Column("resource", String),
+        Column("resource_id", String, nullable=True),
+        Column("details", JSON(none_as_null=True)),
+        Column("ip_address", String, nullable=True),
+        Column("user_agent", String, nullable=True),
+        Column("timestamp", DateTime),
+        Index(f"ix_{name}_timestamp", "timestamp"),
+        Index(f"ix_{name}_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+def month_expression(conn, column):
+    if conn.dialect.name == "postgresql":
+        return func.to_char(column, "YYYYMM")
+    return func.strftime("%Y%m", column)
+
+def upgrade(conn):
+    audit_partitions.create(conn, checkfirst=True)
+    legacy = Table("audit_logs", MetaData(), autoload_with=conn)
+    month = month_expression(conn, func.coalesce(legacy.c.timestamp, func.current_timestamp()))
+    for (key,) in conn.execute(select(month).distinct()).all():
+        partition = audit_table(f"audit_logs_{key}", MetaData())
+        partition.create(conn, checkfirst=True)
+        columns = [column.name for column in partition.columns]
+        conn.execute(insert(partition).from_select(
+            columns, select(*[legacy.c[name] for name in columns]).where(month == key)
+        ))
+        conn.execute(insert(audit_partitions).values(month=key, live=True, created_at=func.current_timestamp()))
+    legacy.drop(conn)
+
+def downgrade(conn):
+    legacy = audit_table("audit_logs", MetaData())
+    legacy.create(conn, checkfirst=True)
+    for (key,) in conn.execute(select(audit_partitions.c.month).where(audit_partitions.c.live == True)).all():
+        partition = audit_table(f"audit_logs_{key}", MetaData())
+        # Ids are only unique per month; archived months are not restored
+        columns = [column.name for column in partition.columns if column.name != "id"]
+        conn.execute(insert(legacy).from_select(columns, select(*[partition.c[name] for name in columns])))
+        partition.drop(conn)
+    audit_partitions.drop(conn)
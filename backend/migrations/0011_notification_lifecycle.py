@@ -0,0 +1,32 @@
+"""Partial indexes for notification read state and purging.
+
+- unread notifications per user, for unread listings and counts
+- expiring notifications, for the expiry purge
+- read notifications by age, for the retention purge
+
+Each covers only the rows its query can match, so it stays small however
+much read history accumulates.
+"""
+from sqlalchemy import text
+
+revision = "0011"
+down_revision = "0010"
+description = "partial indexes on notifications for unread rows and purging"
+
+def indexes(conn):
+    # Booleans are stored as 0/1 on SQLite; the predicates must match the
+    # SQL the ORM generates for the index to be used
+    unread, read = ("false", "true") if conn.dialect.name == "postgresql" else ("0", "1")
+    return {
+        "ix_notifications_user_id_unread": f"notifications (user_id, id) WHERE read = {unread}",
+        "ix_notifications_expires_at": "notifications (expires_at) WHERE expires_at IS NOT NULL",
+        "ix_notifications_read_created_at": f"notifications (created_at) WHERE read = {read}",
+    }
+
+def upgrade(conn):
+    for name, definition in indexes(conn).items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+def downgrade(conn):
+    for name in indexes(conn):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,20 @@
+"""evidence_blobs.last_referenced_at: when a complaint last referenced the blob.
+
+Garbage collection measures its grace period from here rather than from
+created_at, so content uploaded again just before a collection is kept.
+"""
+from sqlalchemy import inspect, text
+
+revision = "0012"
+down_revision = "0011"
+description = "last_referenced_at on evidence_blobs for the garbage collection grace period"
+
+def upgrade(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("evidence_blobs")}
+    if "last_referenced_at" not in existing:
+        type_ = "TIMESTAMP" if conn.dialect.name == "postgresql" else "DATETIME"
+        conn.execute(text(f"ALTER TABLE evidence_blobs ADD COLUMN last_referenced_at {type_}"))
+    conn.execute(text("UPDATE evidence_blobs SET last_referenced_at = created_at WHERE last_referenced_at IS NULL"))
+
+def downgrade(conn):
+    conn.execute(text("ALTER TABLE evidence_blobs DROP COLUMN last_referenced_at"))
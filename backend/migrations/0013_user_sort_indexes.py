@@ -0,0 +1,27 @@
+"""Indexes for the user listing's email and full_name sorts.
+
+Keyset pages order by the sort column and then id, with or without a role
+filter, as ix_users_created_at and ix_users_role_created_at do for the
+default sort; without them every matching user goes through a temporary
+b-tree.
+"""
+from sqlalchemy import text
+
+revision = "0013"
+down_revision = "0012"
+description = "composite indexes for the email and full_name user sorts"
+
+INDEXES = {
+    "ix_users_email_id": "users (email, id)",
+    "ix_users_full_name_id": "users (full_name, id)",
+    "ix_users_role_email": "users (role, email, id)",
+    "ix_users_role_full_name": "users (role, full_name, id)",
+}
+
+def upgrade(conn):
+    for name, definition in INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+def downgrade(conn):
+    for name in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,20 @@
+"""complaints.minhash: the stored MinHash signature of a complaint's text.
+
+Written at intake, so workers load the duplicate index by reading
+signatures instead of recomputing them. Older rows are filled in by the
+first worker that indexes them (see dedup.load_into_index).
+"""
+from sqlalchemy import inspect, text
+
+revision = "0014"
+down_revision = "0013"
+description = "minhash signature on complaints for the duplicate index"
+
+def upgrade(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("complaints")}
+    if "minhash" not in existing:
+        type_ = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+        conn.execute(text(f"ALTER TABLE complaints ADD COLUMN minhash {type_}"))
+
+def downgrade(conn):
+    conn.execute(text("ALTER TABLE complaints DROP COLUMN minhash"))
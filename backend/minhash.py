@@ -0,0 +1,118 @@
+"""MinHash signatures of complaint text for near-duplicate detection.
+
+A signature costs about a millisecond of pure Python, so intake and index
+loads compute them on a small process pool instead of the event loop (see
+dedup.py). This module is imported by the pool's worker processes, so it
+must stay free of database and app imports.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config
+import asyncio
+import multiprocessing
+import random
+import re
+import zlib
+
+DEDUP_WORKERS = config("DEDUP_WORKERS", default=1, cast=int)
+
+# 32 bands of 2 rows: pairs above ~0.2 similarity almost always share a band
+NUM_PERMUTATIONS = 64
+BAND_ROWS = 2
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(2417)
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+STOP_WORDS = frozenset("""
+a an and are as at be been by for from had has have he her his i in is it its my
+of on or our she that the their them then there they this to was we were when
+where which who with you your me near around about after before into over
+""".split())
+
+_pool = None
+
+def shingles(text: str):
+    return {word for word in re.findall(r"\w+", text.lower()) if len(word) > 1 and word not in STOP_WORDS}
+
+def signature(title: str, description: str):
+    hashes = [zlib.crc32(word.encode()) for word in shingles(f"{title or ''} {description or ''}")]
+    if not hashes:
+        return None
+    return array("Q", (min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS))
+
+def signatures(texts: list):
+    # One pool round trip for a batch of (title, description) pairs
+    return [signature(title, description) for title, description in texts]
+
+def similarity(first: array, second: array):
+    # Fraction of agreeing minima estimates the Jaccard similarity
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERMUTATIONS
+
+def bands(sig: array):
+    for start in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+        yield start, hash(tuple(sig[start:start + BAND_ROWS]))
+
+# Stored on the complaint; b"" marks text without any words to compare
+def to_bytes(sig):
+    return sig.tobytes() if sig is not None else b""
+
+def from_bytes(data: bytes):
+    if not data:
+        return None
+    sig = array("Q")
+    sig.frombytes(data)
+    return sig
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the event loop or open DB connections
+        _pool = ProcessPoolExecutor(
+            max_workers=DEDUP_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def restart_pool(broken):
+    # A worker died (crash, OOM kill) and the executor refuses all work from
+    # then on; replace it once, however many calls noticed
+    if _pool is broken:
+        print("Signature pool broken, starting a new one")
+        shutdown_pool()
+    return get_pool()
+
+def _run(fn, *args):
+    # Blocking; retried once on a fresh pool if a worker died
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        return restart_pool(pool).submit(fn, *args).result()
+
+async def compute(title: str, description: str):
+    pool = get_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, signature, title, description)
+    except BrokenProcessPool:
+        return await loop.run_in_executor(restart_pool(pool), signature, title, description)
+
+def compute_many(texts: list, batch_size: int = 500):
+    """Signatures for many (title, description) pairs; blocks, so call from a thread."""
+    pool = get_pool()
+    try:
+        futures = [pool.submit(signatures, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        return [sig for future in futures for sig in future.result()]
+    except BrokenProcessPool:
+        restart_pool(pool)
+        return [sig for start in range(0, len(texts), batch_size) for sig in _run(signatures, texts[start:start + batch_size])]
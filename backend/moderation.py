@@ -0,0 +1,151 @@
+"""Moderation: one action applied to many complaints in one transaction.
+
+The complaints are read once and changed by a single set-based UPDATE that
+only matches rows still in the state that was read (status, priority and
+updated_at), so a concurrent moderation of the same ids wins once and the
+other sees a conflict. A ``complaint.moderated`` outbox event per changed
+complaint is bulk-inserted in the same transaction; the dispatcher turns
+them into reporter notifications, audit log rows and analytics deltas (see
+outbox.py). Each requested id is reported back as updated, not_found or
+conflict (its status no longer matches ``expected_status``, or it changed
+under us) or unchanged (approving an approved or rejecting a rejected
+complaint, which emits no event). The single-complaint approve and reject
+endpoints go through here too.
+"""
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analytics import decision_time
+from database import Complaint, OutboxEvent, User
+from outbox import event_row
+from schemas import BulkModeration
+
+AUDIT_ACTIONS = {
+    "approve": "APPROVE_COMPLAINT",
+    "reject": "REJECT_COMPLAINT",
+    "assign": "ASSIGN_COMPLAINT",
+    "priority": "UPDATE_COMPLAINT_PRIORITY",
+}
+
+def action_values(request: BulkModeration, officer: User, now: datetime):
+    """Column values the action sets on every affected complaint."""
+    if request.action == "approve":
+        if not request.crime_type:
+            raise HTTPException(status_code=400, detail="crime_type is required to approve")
+        return {"status": "approved", "crime_type": request.crime_type, "approved_by": officer.id, "updated_at": now}
+    if request.action == "reject":
+        return {"status": "rejected", "approved_by": officer.id, "updated_at": now}
+    if request.action == "assign":
+        if not request.assigned_officer:
+            raise HTTPException(status_code=400, detail="assigned_officer is required to assign")
+        # updated_at is left alone: on decided complaints it is the decision
+        # time that response time statistics are measured to
+        return {"assigned_officer": request.assigned_officer}
+    if not request.priority:
+        raise HTTPException(status_code=400, detail="priority is required to change priority")
+    return {"priority": request.priority}
+
+def notification_for(action: str, values: dict, row):
+    if action == "approve":
+        return "Complaint Approved", f"Your complaint '{row.title}' has been approved.", "success"
+    if action == "reject":
+        return "Complaint Rejected", f"Your complaint '{row.title}' has been rejected.", "warning"
+    if action == "assign":
+        return "Officer Assigned", f"{values['assigned_officer']} has been assigned to your complaint '{row.title}'.", "info"
+    return None  # priority changes are internal
+
+def analytics_change(row, values: dict):
+    old_status = row.status or "pending"
+    old_priority = row.priority or "medium"
+    decided = "approved_by" in values
+    return {
+        "created_at": row.created_at,
+        "old_status": old_status,
+        "new_status": values.get("status", old_status),
+        "old_decided_at": decision_time(row),
+        "new_decided_at": values["updated_at"] if decided else decision_time(row),
+        "old_priority": old_priority,
+        "new_priority": values.get("priority", old_priority),
+    }
+
+def moderated_event(action: str, row, values: dict, officer: User, now: datetime):
+    details = {key: value for key, value in values.items() if key not in ("approved_by", "updated_at")}
+    return event_row("complaint.moderated", {
+        "complaint_id": row.id,
+        "reporter_id": row.user_id,
+        "officer_id": officer.id,
+        # With TOKEN_ROLE_CLAIMS the officer is a claims-only Principal (no name)
+        "officer_name": getattr(officer, "full_name", None) or officer.email,
+        "audit_action": AUDIT_ACTIONS[action],
+        "details": {**details, "previous_status": row.status},
+        "notification": notification_for(action, values, row),
+        "change": analytics_change(row, values),
+        "at": now,
+    })
+
+async def bulk_moderate(db: AsyncSession, request: BulkModeration, officer: User):
+    now = datetime.utcnow()
+    values = action_values(request, officer, now)
+    ids = list(dict.fromkeys(request.ids))
+
+    rows = (await db.execute(
+        select(
+            Complaint.id, Complaint.title, Complaint.status, Complaint.priority, Complaint.approved_by,
+            Complaint.user_id, Complaint.created_at, Complaint.updated_at
+        ).filter(Complaint.id.in_(ids)).with_for_update()
+    )).all()
+    current = {row.id: row for row in rows}
+
+    results, targets = {}, []
+    for complaint_id in ids:
+        row = current.get(complaint_id)
+        if row is None:
+            results[complaint_id] = {"id": complaint_id, "result": "not_found"}
+        elif request.expected_status and row.status != request.expected_status:
+            results[complaint_id] = {"id": complaint_id, "result": "conflict", "status": row.status}
+        elif "status" in values and row.status == values["status"]:
+            results[complaint_id] = {"id": complaint_id, "result": "unchanged", "status": row.status}
+        else:
+            targets.append(row)
+
+    changed = set()
+    if targets:
+        # The outbox deltas are computed from the rows as read; only update
+        # those that still look that way (SQLite ignores FOR UPDATE)
+        def as_read(column):
+            return column.is_not_distinct_from(case(
+                {row.id: getattr(row, column.key) for row in targets}, value=Complaint.id
+            ))
+        statement = update(Complaint).where(
+            Complaint.id.in_([row.id for row in targets]),
+            as_read(Complaint.status), as_read(Complaint.priority), as_read(Complaint.updated_at),
+        )
+        if "status" in values:
+            # A decision never re-applies to a complaint already decided that way
+            statement = statement.where(Complaint.status.is_distinct_from(values["status"]))
+        statement = statement.values(**values).returning(Complaint.id)
+        changed = set((await db.execute(statement.execution_options(synchronize_session=False))).scalars())
+        updated = [row for row in targets if row.id in changed]
+        if updated:
+            await db.execute(insert(OutboxEvent), [
+                moderated_event(request.action, row, values, officer, now) for row in updated
+            ])
+        lost = [row.id for row in targets if row.id not in changed]
+        if lost:
+            statuses = dict((await db.execute(
+                select(Complaint.id, Complaint.status).filter(Complaint.id.in_(lost))
+            )).all())
+            for complaint_id in lost:
+                if "status" in values and statuses.get(complaint_id) == values["status"]:
+                    results[complaint_id] = {"id": complaint_id, "result": "unchanged", "status": values["status"]}
+                elif complaint_id in statuses:
+                    results[complaint_id] = {"id": complaint_id, "result": "conflict", "status": statuses[complaint_id]}
+                else:
+                    results[complaint_id] = {"id": complaint_id, "result": "not_found"}
+        for complaint_id in changed:
+            results[complaint_id] = {"id": complaint_id, "result": "updated"}
+
+    await db.commit()
+    return {"updated": len(changed), "results": [results[complaint_id] for complaint_id in ids]}
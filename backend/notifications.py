@@ -0,0 +1,81 @@
+"""Notification lifecycle: expiry, read state and purging.
+
+Notifications get an ``expires_at`` NOTIFICATION_TTL_DAYS after creation;
+expired ones are hidden from listings and unread counts straight away and
+deleted by the purge, along with read notifications older than
+NOTIFICATION_READ_RETENTION_DAYS. The purge deletes in batches of
+NOTIFICATION_PURGE_BATCH_SIZE, each its own short transaction, through
+partial indexes that only cover the rows it can delete.
+
+Marking read is a single UPDATE for one, many or all of a user's
+notifications; the unread partial index keeps it and the unread listing
+proportional to what is unread rather than to the whole history.
+"""
+from datetime import datetime, timedelta
+from decouple import config
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Notification
+
+NOTIFICATION_TTL_DAYS = config("NOTIFICATION_TTL_DAYS", default=180, cast=int)
+NOTIFICATION_READ_RETENTION_DAYS = config("NOTIFICATION_READ_RETENTION_DAYS", default=30, cast=int)
+NOTIFICATION_PURGE_BATCH_SIZE = config("NOTIFICATION_PURGE_BATCH_SIZE", default=1000, cast=int)
+
+def expiry(created_at: datetime):
+    return created_at + timedelta(days=NOTIFICATION_TTL_DAYS) if NOTIFICATION_TTL_DAYS else None
+
+def not_expired(now: datetime = None):
+    now = now or datetime.utcnow()
+    return or_(Notification.expires_at.is_(None), Notification.expires_at > now)
+
+async def mark_read(db: AsyncSession, user_id: int, ids: list = None):
+    """Mark the user's unread notifications (all, or just ``ids``) read in
+    one statement; returns the ids that changed."""
+    statement = update(Notification).where(Notification.user_id == user_id, Notification.read == False)
+    if ids is not None:
+        statement = statement.where(Notification.id.in_(ids))
+    changed = (await db.execute(
+        statement.values(read=True).returning(Notification.id).execution_options(synchronize_session=False)
+    )).scalars().all()
+    await db.commit()
+    return changed
+
+def _purge_batch(db: Session, condition):
+    ids = select(Notification.id).filter(condition).limit(NOTIFICATION_PURGE_BATCH_SIZE).scalar_subquery()
+    rows = db.execute(delete(Notification).where(Notification.id.in_(ids)).returning(Notification.read)).all()
+    db.commit()
+    return len(rows), sum(1 for row in rows if not row.read)
+
+def purge(db: Session, now: datetime = None):
+    """Delete expired and old read notifications; returns counts per reason
+    and how many of them were unread."""
+    now = now or datetime.utcnow()
+    read_cutoff = now - timedelta(days=NOTIFICATION_READ_RETENTION_DAYS)
+    conditions = {
+        "expired": and_(Notification.expires_at.isnot(None), Notification.expires_at <= now),
+        "read": and_(Notification.read == True, Notification.created_at < read_cutoff),
+    }
+    counts, unread_deleted = {}, 0
+    for reason, condition in conditions.items():
+        counts[reason] = 0
+        while True:
+            deleted, unread = _purge_batch(db, condition)
+            counts[reason] += deleted
+            unread_deleted += unread
+            if deleted < NOTIFICATION_PURGE_BATCH_SIZE:
+                break
+    counts["unread"] = unread_deleted
+    return counts
+
+def run_purge():
+    db = SessionLocal()
+    try:
+        return purge(db)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    counts = run_purge()
+    print(f"Purged {counts['expired']} expired and {counts['read']} old read notifications")
@@ -0,0 +1,211 @@
+"""Transactional outbox for the side effects of complaint writes.
+
+Request handlers record what happened (``complaint.created``,
+``complaint.moderated``) as rows in ``outbox_events``, in the same
+transaction as the change itself, and return. A background dispatcher
+claims events in batches and fans them out: reporter notifications and
+audit entries (see audit.py) are bulk-inserted and the analytics deltas of
+the whole batch applied in one pass, in a single transaction that also
+deletes the events. Either all of a batch's effects are committed or the
+events stay queued, so a crash cannot lose or half-apply them.
+
+Claiming deletes the events up front (``DELETE ... RETURNING``), which on
+SQLite takes the write lock and on PostgreSQL skips rows another worker
+has locked, so concurrent dispatchers never process an event twice. An
+event whose handler keeps failing is retried OUTBOX_MAX_ATTEMPTS times and
+then left in the table, with its error, for inspection.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decouple import config
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from types import SimpleNamespace
+
+from analytics import ComplaintChange, record_complaint_changes, record_complaints_created
+from database import SessionLocal, OutboxEvent, Notification
+from notifications import expiry
+import audit
+
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=500, cast=int)
+OUTBOX_POLL_SECONDS = config("OUTBOX_POLL_SECONDS", default=1.0, cast=float)
+OUTBOX_MAX_ATTEMPTS = 5
+
+def _json_value(value):
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+def event_row(event_type: str, payload: dict):
+    """A row for ``insert(OutboxEvent)``; datetimes are stored as ISO strings."""
+    return {
+        "event_type": event_type,
+        "payload": _json_value(payload),
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+    }
+
+def emit(db, event_type: str, payload: dict):
+    # Works with both sync and async sessions; committed by the caller
+    db.add(OutboxEvent(**event_row(event_type, payload)))
+
+def notification_row(user_id: int, title: str, message: str, kind: str, complaint_id: int, created_at):
+    return {
+        "user_id": user_id, "title": title, "message": message, "type": kind,
+        "category": "complaint", "action_url": "/track-complaints",
+        "meta_data": {"complaint_id": complaint_id}, "created_at": created_at,
+        "expires_at": expiry(created_at),
+    }
+
+def audit_row(user_id: int, user_name: str, action: str, complaint_id: int, details: dict, timestamp):
+    return {
+        "user_id": user_id, "user_name": user_name, "action": action, "resource": "complaint",
+        "resource_id": str(complaint_id), "details": details, "timestamp": timestamp,
+    }
+
+def _created_complaint(event: dict):
+    # What analytics needs to count a complaint.created event
+    return SimpleNamespace(
+        status=event["status"], complaint_type=event["complaint_type"],
+        priority=event["priority"], created_at=_datetime(event["created_at"])
+    )
+
+def _complaint_change(event: dict):
+    change = event["change"]
+    return ComplaintChange(
+        created_at=_datetime(change["created_at"]),
+        old_status=change["old_status"], new_status=change["new_status"],
+        old_decided_at=_datetime(change["old_decided_at"]),
+        new_decided_at=_datetime(change["new_decided_at"]),
+        old_priority=change["old_priority"], new_priority=change["new_priority"],
+    )
+
+def handle_complaint_created(db: Session, events: list):
+    notifications, audits, complaints = [], [], []
+    for event in events:
+        created_at = _datetime(event["created_at"])
+        notifications.append(notification_row(
+            event["user_id"], "Complaint Submitted",
+            f"Your complaint '{event['title']}' has been submitted successfully.",
+            "success", event["complaint_id"], created_at
+        ))
+        audits.append(audit_row(
+            event["user_id"], event["user_name"], "CREATE_COMPLAINT", event["complaint_id"],
+            {"category": event["complaint_type"], "priority": event["priority"]}, created_at
+        ))
+        complaints.append(_created_complaint(event))
+    db.execute(insert(Notification), notifications)
+    audit.write(db, audits)
+    record_complaints_created(db, complaints)
+
+def handle_complaint_moderated(db: Session, events: list):
+    notifications, audits, changes = [], [], []
+    for event in events:
+        at = _datetime(event["at"])
+        if event.get("notification"):
+            title, message, kind = event["notification"]
+            notifications.append(notification_row(event["reporter_id"], title, message, kind, event["complaint_id"], at))
+        audits.append(audit_row(
+            event["officer_id"], event["officer_name"], event["audit_action"], event["complaint_id"],
+            event["details"], at
+        ))
+        changes.append(_complaint_change(event))
+    if notifications:
+        db.execute(insert(Notification), notifications)
+    audit.write(db, audits)
+    record_complaint_changes(db, changes)
+
+HANDLERS = {
+    "complaint.created": handle_complaint_created,
+    "complaint.moderated": handle_complaint_moderated,
+}
+
+def pending():
+    return OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS
+
+def claim(db: Session, ids=None, limit: int = OUTBOX_BATCH_SIZE):
+    """Delete and return the next pending events (or exactly ``ids``), oldest first."""
+    if ids is None:
+        ids = (
+            select(OutboxEvent.id).filter(pending()).order_by(OutboxEvent.id).limit(limit)
+            .with_for_update(skip_locked=True).scalar_subquery()
+        )
+    rows = db.execute(
+        delete(OutboxEvent).where(OutboxEvent.id.in_(ids))
+        .returning(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.attempts)
+    ).all()
+    return sorted(rows, key=lambda row: row.id)
+
+def apply(db: Session, rows):
+    by_type = defaultdict(list)
+    for row in rows:
+        by_type[row.event_type].append(row.payload)
+    for event_type, events in by_type.items():
+        HANDLERS[event_type](db, events)
+
+def dispatch(db: Session, limit: int = OUTBOX_BATCH_SIZE):
+    """Dispatch one batch and commit; returns how many events were handled."""
+    # A plain read first, so idle polling never takes SQLite's write lock
+    if db.execute(select(OutboxEvent.id).filter(pending()).limit(1)).first() is None:
+        db.rollback()
+        return 0
+    try:
+        rows = claim(db, limit=limit)
+        apply(db, rows)
+        db.commit()
+        return len(rows)
+    except Exception as e:
+        db.rollback()
+        print(f"Outbox batch failed ({e}), retrying its events one at a time")
+
+    # Isolate the failing event(s) so the rest of the batch still goes out
+    dispatched = 0
+    ids = db.execute(select(OutboxEvent.id).filter(pending()).order_by(OutboxEvent.id).limit(limit)).scalars().all()
+    db.rollback()
+    for event_id in ids:
+        try:
+            rows = claim(db, ids=[event_id])
+            apply(db, rows)
+            db.commit()
+            dispatched += len(rows)
+        except Exception as e:
+            db.rollback()
+            print(f"Outbox event {event_id} failed: {e}")
+            db.execute(
+                update(OutboxEvent).where(OutboxEvent.id == event_id)
+                .values(attempts=OutboxEvent.attempts + 1, last_error=str(e)[:1000])
+            )
+            db.commit()
+    return dispatched
+
+def pending_analytics(db: Session):
+    """The complaints created and the complaint changes of the pending
+    events, whose analytics deltas are not applied yet (used by analytics
+    reconciliation)."""
+    created, changes = [], []
+    events = db.execute(select(OutboxEvent.event_type, OutboxEvent.payload).filter(pending()))
+    for event_type, payload in events:
+        if event_type == "complaint.created":
+            created.append(_created_complaint(payload))
+        elif event_type == "complaint.moderated":
+            changes.append(_complaint_change(payload))
+    return created, changes
+
+def run_dispatch():
+    db = SessionLocal()
+    try:
+        return dispatch(db)
+    finally:
+        db.close()
+
+def stats(db: Session):
+    pending_count, failed_count = db.execute(
+        select(
+            func.count().filter(pending()),
+            func.count().filter(OutboxEvent.attempts >= OUTBOX_MAX_ATTEMPTS),
+        ).select_from(OutboxEvent)
+    ).one()
+    return {"pending": pending_count, "failed": failed_count}
@@ -0,0 +1,109 @@
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Cursors are opaque to clients: the sort key name plus the (value, id) of the
+# last row on the page, base64 encoded
+def encode_cursor(sort: str, value, row_id: int):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, column):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort:
+            raise ValueError("cursor was issued for a different sort order")
+        if value is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def resolve_sort(sort: str, columns: dict):
+    # "created_at" sorts ascending, "-created_at" descending
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort, expected one of: {', '.join(sorted(columns))}"
+        )
+    return columns[name], descending
+
+def _row_value(row, key: str):
+    if isinstance(row, dict):
+        return row[key]
+    return getattr(row, key)
+
+async def paginate(
+    db: AsyncSession,
+    statement,
+    sort: str,
+    columns: dict,
+    id_column,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    scalars: bool = False
+):
+    """Keyset pagination on (sort column, id).
+
+    Each page is a bounded index range scan that continues after the last
+    row of the previous page, so latency stays flat however deep the client
+    pages, unlike OFFSET which rescans every skipped row. Rows with a NULL
+    sort value come last in either direction, ordered by id; a page that
+    runs out of non-NULL rows is topped up from them with a second range
+    scan rather than one OR-ed predicate, which no index can serve in order.
+    """
+    sort_column, descending = resolve_sort(sort, columns)
+    if descending:
+        order = (sort_column.desc().nulls_last(), id_column.desc())
+        after = lambda left, right: left < right
+    else:
+        order = (sort_column.asc().nulls_last(), id_column.asc())
+        after = lambda left, right: left > right
+
+    if not cursor:
+        result = await db.execute(statement.order_by(*order).limit(limit + 1))
+        rows = _rows(result, scalars)
+    else:
+        value, row_id = decode_cursor(cursor, sort, sort_column)
+        rows = []
+        if value is not None:
+            result = await db.execute(
+                statement.filter(after(tuple_(sort_column, id_column), (value, row_id)))
+                .order_by(*order).limit(limit + 1)
+            )
+            rows = _rows(result, scalars)
+        if len(rows) <= limit:
+            nulls = statement.filter(sort_column.is_(None))
+            if value is None:
+                nulls = nulls.filter(after(id_column, row_id))
+            result = await db.execute(nulls.order_by(order[1]).limit(limit + 1 - len(rows)))
+            rows += _rows(result, scalars)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, _row_value(last, sort_column.key), _row_value(last, id_column.key))
+
+    return rows, next_cursor
+
+def _rows(result, scalars: bool):
+    return list(result.scalars().all() if scalars else result.all())
+
+def set_page_headers(request: Request, response: Response, next_cursor: str):
+    # The body stays a plain list; the next page is advertised in headers
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
@@ -0,0 +1,192 @@
+"""Password hashing off the request path.
+
+bcrypt is deliberately slow (100-300ms per call), so hashes and checks run
+on a dedicated, size-limited process pool rather than the event loop's
+threadpool. When too many are queued new calls fail fast with 503 instead
+of starving other endpoints, and login attempts are throttled per account
+and per client IP before any hashing happens.
+
+This module is imported by the pool's worker processes, so it must stay
+free of database and app imports.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from decouple import config
+from fastapi import HTTPException
+from passlib.context import CryptContext
+import asyncio
+import math
+import multiprocessing
+import time
+
+from cache import TTLCache
+from sketches import QuantileSketch
+
+PASSWORD_WORKERS = config("PASSWORD_WORKERS", default=2, cast=int)
+# Calls allowed in flight (running plus queued) before answering 503
+PASSWORD_QUEUE_LIMIT = config("PASSWORD_QUEUE_LIMIT", default=32, cast=int)
+
+LOGIN_ATTEMPTS_PER_IP = config("LOGIN_ATTEMPTS_PER_IP", default=30, cast=int)
+LOGIN_IP_WINDOW_SECONDS = config("LOGIN_IP_WINDOW_SECONDS", default=60, cast=float)
+LOGIN_FAILURES_PER_ACCOUNT = config("LOGIN_FAILURES_PER_ACCOUNT", default=5, cast=int)
+LOGIN_ACCOUNT_WINDOW_SECONDS = config("LOGIN_ACCOUNT_WINDOW_SECONDS", default=15 * 60, cast=float)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Run inside the pool; each returns its result and the time spent hashing
+def _hash(password: str):
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+def _verify(password: str, hashed: str):
+    started = time.perf_counter()
+    return pwd_context.verify(password, hashed), time.perf_counter() - started
+
+class PasswordPool:
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.hash_seconds = QuantileSketch()
+        self.wait_seconds = QuantileSketch()
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            # spawn: workers must not inherit the event loop or open DB connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def restart(self, broken):
+        # A worker died (crash, OOM kill) and the executor refuses all work
+        # from then on; replace it once, however many calls noticed
+        if self._executor is broken:
+            print("Password pool broken, starting a new one")
+            self.shutdown()
+            self.restarts += 1
+        return self.start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        executor = self.start()
+        self.in_flight += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                result, hash_seconds = await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                executor = self.restart(executor)
+                result, hash_seconds = await loop.run_in_executor(executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+        self.hash_seconds.add(hash_seconds)
+        self.wait_seconds.add(max(time.perf_counter() - started - hash_seconds, 0.0))
+        return result
+
+    def metrics(self):
+        def milliseconds(sketch, q):
+            value = sketch.quantile(q)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(self.in_flight - self.workers, 0),
+            "queue_limit": self.queue_limit,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "completed": self.hash_seconds.count,
+            "hash_ms": {q: milliseconds(self.hash_seconds, p) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "queue_wait_ms": {q: milliseconds(self.wait_seconds, p) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        }
+
+password_pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT)
+
+async def hash_password(password: str):
+    return await password_pool.run(_hash, password)
+
+async def check_password(password: str, hashed: str):
+    return await password_pool.run(_verify, password, hashed)
+
+class SlidingWindowLimiter:
+    """At most ``limit`` hits per key within any ``window`` seconds."""
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.throttled = 0
+        self._hits = TTLCache(maxsize, window)
+
+    def _recent(self, key: str, now: float):
+        hits = self._hits.get(key)
+        if hits is None:
+            return deque()
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        return hits
+
+    def retry_after(self, key: str):
+        # Seconds until another hit is allowed, 0 when it is allowed now
+        now = time.monotonic()
+        hits = self._recent(key, now)
+        if len(hits) < self.limit:
+            return 0
+        return max(math.ceil(hits[0] + self.window - now), 1)
+
+    def hit(self, key: str):
+        now = time.monotonic()
+        hits = self._recent(key, now)
+        hits.append(now)
+        self._hits.set(key, hits)
+
+    def reset(self, key: str):
+        self._hits.pop(key)
+
+ip_limiter = SlidingWindowLimiter(LOGIN_ATTEMPTS_PER_IP, LOGIN_IP_WINDOW_SECONDS)
+account_limiter = SlidingWindowLimiter(LOGIN_FAILURES_PER_ACCOUNT, LOGIN_ACCOUNT_WINDOW_SECONDS)
+
+def check_throttle(ip: str, email: str = None):
+    # Called before any hashing, so throttled requests never reach the pool
+    checks = [(ip_limiter, ip)]
+    if email:
+        checks.append((account_limiter, email.lower()))
+    for limiter, key in checks:
+        retry_after = limiter.retry_after(key)
+        if retry_after:
+            limiter.throttled += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(retry_after)}
+            )
+    ip_limiter.hit(ip)
+
+def record_login_failure(email: str):
+    account_limiter.hit(email.lower())
+
+def record_login_success(email: str):
+    account_limiter.reset(email.lower())
+
+def metrics():
+    return {
+        "pool": password_pool.metrics(),
+        "throttled": {"ip": ip_limiter.throttled, "account": account_limiter.throttled},
+    }
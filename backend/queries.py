@@ -0,0 +1,117 @@
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from datetime import datetime
+from typing import Optional
+
+from database import User, Complaint
+
+COMPLAINT_SORTS = {
+    "created_at": Complaint.created_at,
+    "updated_at": Complaint.updated_at,
+    "incident_date": Complaint.incident_date,
+}
+
+USER_SORTS = {
+    "created_at": User.created_at,
+    "email": User.email,
+    "full_name": User.full_name,
+}
+
+class ComplaintFilters:
+    # Query parameters shared by every complaint listing, used with Depends()
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        complaint_type: Optional[str] = None,
+        priority: Optional[str] = None,
+        crime_type: Optional[str] = None,
+        assigned_officer: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        incident_from: Optional[datetime] = None,
+        incident_to: Optional[datetime] = None,
+        is_duplicate: Optional[bool] = None
+    ):
+        self.status = status
+        self.complaint_type = complaint_type
+        self.priority = priority
+        self.crime_type = crime_type
+        self.assigned_officer = assigned_officer
+        self.created_from = created_from
+        self.created_to = created_to
+        self.incident_from = incident_from
+        self.incident_to = incident_to
+        self.is_duplicate = is_duplicate
+
+    def apply(self, query):
+        if self.status:
+            query = query.filter(Complaint.status == self.status)
+        if self.complaint_type:
+            query = query.filter(Complaint.complaint_type == self.complaint_type)
+        if self.priority:
+            query = query.filter(Complaint.priority == self.priority)
+        if self.crime_type:
+            query = query.filter(Complaint.crime_type == self.crime_type)
+        if self.assigned_officer:
+            query = query.filter(Complaint.assigned_officer == self.assigned_officer)
+        if self.created_from:
+            query = query.filter(Complaint.created_at >= self.created_from)
+        if self.created_to:
+            query = query.filter(Complaint.created_at < self.created_to)
+        if self.incident_from:
+            query = query.filter(Complaint.incident_date >= self.incident_from)
+        if self.incident_to:
+            query = query.filter(Complaint.incident_date < self.incident_to)
+        if self.is_duplicate is not None:
+            flagged = Complaint.duplicate_of.is_not(None)
+            query = query.filter(flagged if self.is_duplicate else ~flagged)
+        return query
+
+class UserFilters:
+    def __init__(
+        self,
+        role: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ):
+        self.role = role
+        self.is_active = is_active
+        self.created_from = created_from
+        self.created_to = created_to
+
+    def apply(self, query):
+        if self.role:
+            query = query.filter(User.role == self.role)
+        if self.is_active is not None:
+            query = query.filter(User.is_active == self.is_active)
+        if self.created_from:
+            query = query.filter(User.created_at >= self.created_from)
+        if self.created_to:
+            query = query.filter(User.created_at < self.created_to)
+        return query
+
+# Listing projections: fetch exactly the ComplaintResponse columns with the
+# reporter joined in, so a page costs one statement however many rows it has
+# and no ORM identity-map objects are built
+Reporter = aliased(User, name="reporter")
+
+COMPLAINT_COLUMNS = [
+    Complaint.id, Complaint.title, Complaint.description, Complaint.incident_date,
+    Complaint.incident_location, Complaint.complaint_type, Complaint.status,
+    Complaint.priority, Complaint.crime_type, Complaint.witnesses,
+    Complaint.assigned_officer, Complaint.review_notes, Complaint.images,
+    Complaint.user_id, Complaint.created_at, Complaint.updated_at,
+    Complaint.latitude, Complaint.longitude, Complaint.duplicate_of, Complaint.duplicate_score,
+]
+
+REPORTER_FIELDS = ["id", "email", "full_name", "phone", "address", "role", "created_at", "is_active"]
+REPORTER_COLUMNS = [getattr(Reporter, field).label(f"user_{field}") for field in REPORTER_FIELDS]
+
+def complaint_projection():
+    return select(*COMPLAINT_COLUMNS, *REPORTER_COLUMNS).join(Reporter, Complaint.user_id == Reporter.id)
+
+def complaint_to_dict(row):
+    data = {column.key: row._mapping[column.key] for column in COMPLAINT_COLUMNS}
+    data["user"] = {field: row._mapping[f"user_{field}"] for field in REPORTER_FIELDS}
+    return data
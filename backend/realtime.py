@@ -0,0 +1,197 @@
+"""Push delivery of notifications over Server-Sent Events and WebSocket.
+
+Notifications are inserted by the outbox dispatcher of whichever worker
+claims the event (see outbox.py). Each worker runs one NotificationFeed that
+tails the notifications table by id, one indexed query per
+REALTIME_POLL_SECONDS however many clients are connected, and publishes new
+rows to the hub keyed by user id. Each connection holds a bounded queue in
+the hub; a client too slow to drain it is disconnected and, reconnecting
+with its last event id, gets the missed notifications replayed from the
+table.
+
+The hub is in-process. Anything with the same subscribe / unsubscribe /
+publish methods, e.g. a client of a local broker, can be assigned to
+``hub`` instead; the feed should then run in one process only
+(REALTIME_FEED=false in the others).
+
+Unread counts are cached per user and kept current by the feed (new rows)
+and by mark-as-read, so polling them costs no query while cached. Expiry
+is only picked up when an entry is reloaded, within the cache TTL.
+"""
+from collections import defaultdict
+from decouple import config
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import orjson
+
+from cache import TTLCache
+from database import AsyncSessionLocal, Notification
+from notifications import not_expired
+
+REALTIME_FEED = config("REALTIME_FEED", default=True, cast=bool)
+REALTIME_POLL_SECONDS = config("REALTIME_POLL_SECONDS", default=1.0, cast=float)
+HEARTBEAT_SECONDS = config("REALTIME_HEARTBEAT_SECONDS", default=15, cast=float)
+SUBSCRIBER_QUEUE_SIZE = 100
+REPLAY_LIMIT = 100
+FEED_BATCH_SIZE = 1000
+UNREAD_CACHE_SIZE = config("UNREAD_CACHE_SIZE", default=50000, cast=int)
+# Bounds drift from reads marked in other workers
+UNREAD_CACHE_TTL_SECONDS = config("UNREAD_CACHE_TTL_SECONDS", default=60, cast=float)
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, message: dict):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Ends the stream; the client reconnects and replays
+            self.overflowed = True
+
+class InProcessHub:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id: int):
+        subscription = Subscription(user_id)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, message: dict):
+        for subscription in tuple(self._subscribers.get(user_id, ())):
+            subscription.deliver(message)
+
+    def stats(self):
+        return {"users": len(self._subscribers), "connections": sum(map(len, self._subscribers.values()))}
+
+hub = InProcessHub()
+unread_counts = TTLCache(UNREAD_CACHE_SIZE, UNREAD_CACHE_TTL_SECONDS)
+
+def notification_message(notification: Notification):
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "category": notification.category,
+        "read": notification.read,
+        "action_url": notification.action_url,
+        "created_at": notification.created_at,
+    }
+
+class NotificationFeed:
+    def __init__(self):
+        self.cursor = None  # highest notification id published
+        self.wakeup = asyncio.Event()
+
+    async def poll(self, db: AsyncSession):
+        if self.cursor is None:
+            # Start from now; reconnecting clients replay what came before
+            self.cursor = (await db.execute(select(func.max(Notification.id)))).scalar() or 0
+            return 0
+        rows = (await db.execute(
+            select(Notification).filter(Notification.id > self.cursor)
+            .order_by(Notification.id).limit(FEED_BATCH_SIZE)
+        )).scalars().all()
+        for notification in rows:
+            if not notification.read:
+                unread_counts.incr(notification.user_id)
+            hub.publish(notification.user_id, {
+                "notification": notification_message(notification),
+                "unread": unread_counts.get(notification.user_id),  # None if not cached
+            })
+            self.cursor = notification.id
+        return len(rows)
+
+notification_feed = NotificationFeed()
+
+async def unread_count(db: AsyncSession, user_id: int):
+    count = unread_counts.get(user_id)
+    if count is not None:
+        return count
+    cursor = notification_feed.cursor
+    statement = select(func.count()).select_from(Notification).filter(
+        Notification.user_id == user_id, Notification.read == False, not_expired()
+    )
+    if cursor is not None:
+        # Rows past the cursor are counted by the feed when it publishes them
+        statement = statement.filter(Notification.id <= cursor)
+    count = (await db.execute(statement)).scalar()
+    if cursor is not None and cursor == notification_feed.cursor:
+        unread_counts.set(user_id, count)
+    return count
+
+def notifications_read(user_id: int, notification_ids: list):
+    # Only rows the feed has counted are in the cached number
+    cursor = notification_feed.cursor
+    if cursor is not None:
+        counted = sum(1 for notification_id in notification_ids if notification_id <= cursor)
+        if counted:
+            unread_counts.incr(user_id, -counted)
+
+async def notification_events(user_id: int, last_event_id: int = None):
+    """(event, id, data) tuples for one connection: replay, then live
+    notifications with unread counts, and heartbeats while idle."""
+    subscription = hub.subscribe(user_id)
+    try:
+        last_id = 0
+        async with AsyncSessionLocal() as db:
+            if last_event_id is not None:
+                last_id = last_event_id
+                rows = (await db.execute(
+                    select(Notification).filter(Notification.user_id == user_id, Notification.id > last_event_id)
+                    .order_by(Notification.id.desc()).limit(REPLAY_LIMIT)
+                )).scalars().all()
+                if len(rows) == REPLAY_LIMIT:
+                    # Too far behind to replay everything; the client reloads its list
+                    yield "reset", None, {}
+                for notification in reversed(rows):
+                    last_id = max(last_id, notification.id)
+                    yield "notification", notification.id, notification_message(notification)
+            yield "unread", None, {"unread": await unread_count(db, user_id)}
+
+        while not subscription.overflowed:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield "heartbeat", None, None
+                continue
+            notification = message["notification"]
+            if notification["id"] <= last_id:
+                continue  # already replayed
+            last_id = notification["id"]
+            yield "notification", last_id, notification
+            if message["unread"] is not None:
+                yield "unread", None, {"unread": message["unread"]}
+    finally:
+        hub.unsubscribe(subscription)
+
+async def sse_stream(events):
+    yield f"retry: {int(HEARTBEAT_SECONDS * 1000)}\n\n"
+    async for event, event_id, data in events:
+        if event == "heartbeat":
+            yield ": heartbeat\n\n"
+            continue
+        # Only notifications carry an id, so the browser's Last-Event-ID
+        # always points at the last notification received
+        head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+        yield head + "data: " + orjson.dumps(data).decode() + "\n\n"
+
+def websocket_message(event: str, event_id, data):
+    if event == "heartbeat":
+        return '{"type":"ping"}'
+    return orjson.dumps({"type": event, "id": event_id, "data": data}).decode()
+
+def stats():
+    return {**hub.stats(), "feed_cursor": notification_feed.cursor, "unread_cache": unread_counts.stats()}
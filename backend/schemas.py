@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, computed_field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
+
+import evidence_urls
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -57,14 +59,66 @@ class ComplaintResponse(BaseModel):
     user_id: int
     created_at: datetime
     updated_at: datetime
+    latitude: Optional[float]  # None until the location is geocoded
+    longitude: Optional[float]
+    duplicate_of: Optional[int]  # first complaint of its near-duplicate cluster
+    duplicate_score: Optional[float]
     user: UserResponse
+
+    # Per image: the original plus "thumb" and "web" derivative URLs
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[List[Dict[str, str]]]:
+        if self.images is None:
+            return None
+        return [evidence_urls.image_variants(url) for url in self.images]
     
     class Config:
         from_attributes = True
 
+class ComplaintSearchResult(ComplaintResponse):
+    score: Optional[float]  # higher is more relevant; None with sort=newest
+    snippet: Optional[str]  # matched text with <mark> highlights
+
+class ComplaintNearbyResult(ComplaintResponse):
+    distance_km: float
+
+class HotspotCell(BaseModel):
+    geohash: str
+    count: int
+    latitude: float  # cell centre
+    longitude: float
+    bounds: List[float]  # min_lat, min_lon, max_lat, max_lon
+
+class DuplicateCluster(BaseModel):
+    cluster_id: int
+    complaints: List[ComplaintResponse]  # the first complaint, then its duplicates
+
+class DuplicateLink(BaseModel):
+    duplicate_of: Optional[int]  # None clears the flag
+
 class ComplaintApprove(BaseModel):
     crime_type: str
 
+class BulkModeration(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+    action: Literal["approve", "reject", "assign", "priority"]
+    crime_type: Optional[str] = None  # required to approve
+    assigned_officer: Optional[str] = None  # required to assign
+    priority: Optional[Literal["low", "medium", "high", "urgent"]] = None  # required for priority
+    # Skip (as "conflict") complaints no longer in this status, e.g. "pending"
+    # so two officers clearing the same queue do not overwrite each other
+    expected_status: Optional[str] = None
+
+class BulkItemResult(BaseModel):
+    id: int
+    result: Literal["updated", "unchanged", "not_found", "conflict"]
+    status: Optional[str] = None  # current status of a conflicting or unchanged complaint
+
+class BulkModerationResult(BaseModel):
+    updated: int
+    results: List[BulkItemResult]
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
@@ -86,6 +140,9 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class NotificationReadMany(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=1000)  # None marks all read
+
 class AnalyticsResponse(BaseModel):
     totalComplaints: int
     complaintsByStatus: dict
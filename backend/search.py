@@ -0,0 +1,163 @@
+"""Full-text complaint search (index maintained by migration 0006).
+
+Scoring costs the same for every match, so ranking all of a very common
+term's matches grows with the table. Relevance is instead ranked within
+windows of SEARCH_RANK_WINDOW matches, newest window first: once a window's
+matches run out, paging carries on into the next older one, so every match
+is reached. The current window's id bounds are carried in the cursor, so
+later pages walk the same set. ``sort=newest`` skips ranking altogether and
+streams matches in id order (its results carry no score).
+"""
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import Float, Integer, func, literal_column, null, select, text, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import table, column
+import re
+
+from database import Complaint
+from pagination import encode_cursor, decode_cursor
+from queries import complaint_projection, complaint_to_dict
+
+SEARCH_RANK_WINDOW = config("SEARCH_RANK_WINDOW", default=5000, cast=int)
+SEARCH_SORTS = ["relevance", "newest"]
+MAX_SEARCH_TERMS = 16
+SNIPPET_TOKENS = 12
+# "quoted phrases", words and prefix* terms; everything else is ignored so
+# user input can never be a malformed MATCH expression
+SEARCH_TOKEN = re.compile(r'"([^"]*)"|(\w+)(\*?)', re.UNICODE)
+
+complaints_fts = table("complaints_fts", column("rowid", Integer), column("rank", Float))
+
+def fts_query(query: str):
+    """Turn free text into an FTS5 query: every term must match."""
+    terms = []
+    for phrase, word, prefix in SEARCH_TOKEN.findall(query):
+        if phrase:
+            words = re.findall(r"\w+", phrase, re.UNICODE)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word:
+            terms.append(f'"{word}"{prefix}')
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no searchable terms")
+    return " ".join(terms[:MAX_SEARCH_TERMS])
+
+class SearchIndex:
+    """Dialect-specific pieces of a search: how to match, score and order.
+
+    Lower scores rank higher on both backends (SQLite's bm25 is negative,
+    the PostgreSQL rank is negated).
+    """
+
+    def __init__(self, query: str, dialect: str):
+        if dialect == "postgresql":
+            tsquery = func.websearch_to_tsquery("english", query)
+            vector = literal_column("complaints.search_vector")
+            self.match = vector.op("@@")(tsquery)
+            self.row_id = Complaint.id
+            self.score = type_coerce(-func.ts_rank_cd(vector, tsquery), Float).label("score")
+            self.snippet = func.ts_headline(
+                "english", Complaint.title + " " + Complaint.description, tsquery,
+                f"StartSel=<mark>, StopSel=</mark>, MaxWords={SNIPPET_TOKENS * 2}, MinWords={SNIPPET_TOKENS}"
+            ).label("snippet")
+            self.join = None
+        else:
+            self.match = text("complaints_fts MATCH :search_query").bindparams(search_query=fts_query(query))
+            # The FTS table's rowid is the complaint id; constraining and
+            # ordering on it lets FTS5 stream matches without a sort
+            self.row_id = complaints_fts.c.rowid
+            # rank uses the bm25 column weights configured by migration 0006
+            self.score = type_coerce(complaints_fts.c.rank, Float).label("score")
+            self.snippet = func.snippet(
+                literal_column("complaints_fts"), -1, "<mark>", "</mark>", "…", SNIPPET_TOKENS
+            ).label("snippet")
+            self.join = (complaints_fts, complaints_fts.c.rowid == Complaint.id)
+
+    def matches(self, filters=None):
+        statement = select(self.row_id)
+        if self.join is not None:
+            statement = statement.select_from(complaints_fts)
+            if filters is not None:
+                statement = statement.join(Complaint, self.join[1])
+        statement = statement.filter(self.match)
+        return filters.apply(statement) if filters is not None else statement
+
+    def projection(self, scored: bool = True):
+        # Any score makes bm25 gather term statistics over every match, so
+        # orderings that do not need one leave it out
+        score = self.score if scored else null().label("score")
+        statement = complaint_projection().add_columns(score, self.snippet)
+        if self.join is not None:
+            statement = statement.join(*self.join)
+        return statement.filter(self.match)
+
+async def window_floor(db: AsyncSession, index: SearchIndex, filters, below: int = None):
+    """Lowest id of the SEARCH_RANK_WINDOW newest matches (below ``below``)
+    that pass the filters, or None when fewer are left."""
+    statement = index.matches(filters)
+    if below is not None:
+        statement = statement.filter(index.row_id < below)
+    return (await db.execute(
+        statement.order_by(index.row_id.desc()).offset(SEARCH_RANK_WINDOW - 1).limit(1)
+    )).scalar()
+
+async def search_complaints(db: AsyncSession, query: str, filters, sort: str, cursor: str = None, limit: int = 50):
+    """One page of matching complaints (as response dicts) and the next cursor."""
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort, expected one of: {', '.join(SEARCH_SORTS)}")
+    index = SearchIndex(query, db.bind.dialect.name)
+    statement = filters.apply(index.projection(scored=sort == "relevance"))
+
+    if sort == "newest":
+        if cursor:
+            _, row_id = decode_cursor(cursor, sort, Complaint.id)
+            statement = statement.filter(index.row_id < row_id)
+        rows = (await db.execute(statement.order_by(index.row_id.desc()).limit(limit + 1))).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort, None, rows[-1].id)
+        return [search_result_to_dict(row) for row in rows], next_cursor
+
+    after = None
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort, Complaint.id)
+        try:
+            score, floor = float(value[0]), value[1] and int(value[1])
+            ceiling = int(value[2]) if len(value) > 2 and value[2] is not None else None
+        except (TypeError, ValueError, IndexError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (score, row_id)
+    else:
+        floor, ceiling = await window_floor(db, index, filters), None
+
+    # Fill the page from as many windows as it takes; each row keeps the
+    # bounds of its window for the cursor
+    rows = []
+    while True:
+        window = statement
+        if floor is not None:
+            window = window.filter(index.row_id >= floor)
+        if ceiling is not None:
+            window = window.filter(index.row_id < ceiling)
+        if after is not None:
+            window = window.filter(tuple_(index.score, Complaint.id) > after)
+        window = window.order_by(index.score, Complaint.id).limit(limit + 1 - len(rows))
+        rows.extend((row, floor, ceiling) for row in (await db.execute(window)).all())
+        if len(rows) > limit or floor is None:
+            break
+        after, ceiling, floor = None, floor, await window_floor(db, index, filters, below=floor)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, floor, ceiling = rows[-1]
+        next_cursor = encode_cursor(sort, [last.score, floor, ceiling], last.id)
+    return [search_result_to_dict(row) for row, _, _ in rows], next_cursor
+
+def search_result_to_dict(row):
+    data = complaint_to_dict(row)
+    data["score"] = -row.score if row.score is not None else None
+    data["snippet"] = row.snippet
+    return data
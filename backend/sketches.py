@@ -0,0 +1,141 @@
+import math
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values are counted in logarithmically sized buckets, so any quantile is
+    accurate to within ``relative_accuracy`` of the true value. Two sketches
+    built with the same accuracy can be merged by adding bucket counts, and a
+    value can be removed again when a complaint changes state.
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _key(self, value: float):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _bucket_value(self, key: int):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        value = max(value, 0.0)
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def remove(self, value: float):
+        value = max(value, 0.0)
+        if value <= self.MIN_VALUE:
+            if not self.zero_count:
+                return
+            self.zero_count -= 1
+        else:
+            key = self._key(value)
+            if not self.bins.get(key):
+                return
+            self.bins[key] -= 1
+            if not self.bins[key]:
+                del self.bins[key]
+        self.count -= 1
+        self.sum -= value
+        self._fit_extremes()
+
+    def _fit_extremes(self):
+        # Exact extremes cannot be recovered after a removal; once their
+        # bucket empties, fall back to the outermost non-empty bucket
+        if not self.count:
+            self.sum, self.min, self.max = 0.0, None, None
+            return
+        if self.min is None or not self._occupied(self.min):
+            self.min = 0.0 if self.zero_count else self._bucket_value(min(self.bins))
+        if self.max is None or not self._occupied(self.max):
+            self.max = self._bucket_value(max(self.bins)) if self.bins else 0.0
+
+    def _occupied(self, value: float):
+        if value <= self.MIN_VALUE:
+            return self.zero_count > 0
+        return self._key(value) in self.bins
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def shift(self, plus: "QuantileSketch", minus: "QuantileSketch"):
+        """Add ``plus`` and take ``minus`` away, bucket by bucket, e.g. to
+        move a live sketch by the difference between a recomputed one and a
+        stale copy. Buckets never go below zero."""
+        if plus.relative_accuracy != self.relative_accuracy or minus.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot shift sketches with different accuracy")
+        for key in set(plus.bins) | set(minus.bins):
+            count = self.bins.get(key, 0) + plus.bins.get(key, 0) - minus.bins.get(key, 0)
+            if count > 0:
+                self.bins[key] = count
+            else:
+                self.bins.pop(key, None)
+        self.zero_count = max(self.zero_count + plus.zero_count - minus.zero_count, 0)
+        self.count = self.zero_count + sum(self.bins.values())
+        self.sum += plus.sum - minus.sum
+        # Keep whichever exact extremes are still occupied
+        bounds = [value for value in (self.min, self.max, plus.min, plus.max) if value is not None and self._occupied(value)]
+        self.min, self.max = min(bounds, default=None), max(bounds, default=None)
+        self._fit_extremes()
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return min(max(self._bucket_value(key), self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "bins": {str(key): count for key, count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch.bins = {int(key): count for key, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
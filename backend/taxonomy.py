@@ -0,0 +1,23 @@
+# Complaint vocabulary shared by the API, bulk_import.py and the benchmarks
+
+CATEGORIES = [
+    "Theft/Burglary", "Assault/Violence", "Vandalism/Property Damage",
+    "Fraud/Scam", "Drug-related", "Traffic Violation", "Cybercrime",
+    "Domestic Violence", "Public Disturbance", "Other"
+]
+
+CRIME_TYPES = {
+    "Theft/Burglary": ["Petty Theft", "Grand Theft", "Burglary", "Robbery", "Shoplifting"],
+    "Assault/Violence": ["Simple Assault", "Aggravated Assault", "Battery", "Domestic Violence"],
+    "Vandalism/Property Damage": ["Graffiti", "Property Destruction", "Trespassing"],
+    "Fraud/Scam": ["Identity Theft", "Credit Card Fraud", "Online Scam", "Check Fraud"],
+    "Drug-related": ["Possession", "Distribution", "Manufacturing", "Public Intoxication"],
+    "Traffic Violation": ["Reckless Driving", "DUI", "Hit and Run", "Speeding"],
+    "Cybercrime": ["Hacking", "Online Harassment", "Data Breach", "Phishing"],
+    "Domestic Violence": ["Physical Abuse", "Emotional Abuse", "Stalking", "Harassment"],
+    "Public Disturbance": ["Noise Complaint", "Public Intoxication", "Disorderly Conduct"],
+    "Other": ["Other Crime"]
+}
+
+STATUSES = ["pending", "approved", "rejected", "under_review"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
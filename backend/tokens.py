@@ -0,0 +1,178 @@
+"""JWT issuing and verification.
+
+Signing keys are identified by a ``kid`` header, so a new key can be rolled
+out while tokens signed with the previous one stay valid until they expire:
+
+    JWT_SIGNING_KEYS=2024-06:old-secret,2024-09:new-secret
+    JWT_ACTIVE_KID=2024-09
+
+Tokens issued before kids existed carry no header and are checked against
+SECRET_KEY, but once JWT_SIGNING_KEYS is set they are rejected, unless
+JWT_LEGACY_TOKENS_UNTIL names the date to stop accepting them (which needs
+SECRET_KEY set to something other than its placeholder default). PyJWT is used when installed (it verifies noticeably faster than
+python-jose), and verified tokens are cached until they expire, so a client
+polling with the same token pays for the signature check once.
+
+Refresh tokens carry a ``jti`` and are single use: /auth/refresh and
+/auth/logout record it in ``revoked_tokens``, mirrored in memory for the
+fast path.
+"""
+from datetime import datetime, timedelta
+from decouple import config
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import time
+import uuid
+
+from cache import TTLCache
+from database import RevokedToken
+
+try:
+    import jwt as pyjwt
+except ImportError:
+    pyjwt = None
+from jose import jwt as jose_jwt, JWTError
+
+DEFAULT_SECRET_KEY = "your-secret-key-change-in-production"
+SECRET_KEY = config("SECRET_KEY", default=DEFAULT_SECRET_KEY)
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+LEGACY_KID = "default"
+
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+# Upper bound on how long a verified token is trusted without re-checking
+TOKEN_CACHE_TTL_SECONDS = config("TOKEN_CACHE_TTL_SECONDS", default=300, cast=float)
+
+class InvalidToken(Exception):
+    pass
+
+def parse_signing_keys(value: str):
+    keys = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        kid, _, secret = entry.partition(":")
+        if not secret:
+            raise ValueError(f"JWT_SIGNING_KEYS entry {kid!r} must be kid:secret")
+        keys[kid] = secret
+    return keys
+
+ROTATION_KEYS = parse_signing_keys(config("JWT_SIGNING_KEYS", default=""))
+SIGNING_KEYS = ROTATION_KEYS or {LEGACY_KID: SECRET_KEY}
+ACTIVE_KID = config("JWT_ACTIVE_KID", default=next(iter(SIGNING_KEYS)))
+if ACTIVE_KID not in SIGNING_KEYS:
+    raise ValueError(f"JWT_ACTIVE_KID {ACTIVE_KID!r} is not in JWT_SIGNING_KEYS")
+LEGACY_TOKENS_UNTIL = config("JWT_LEGACY_TOKENS_UNTIL", default="", cast=lambda value: (
+    datetime.fromisoformat(value) if value else None
+))
+if LEGACY_TOKENS_UNTIL and SECRET_KEY == DEFAULT_SECRET_KEY:
+    raise ValueError("JWT_LEGACY_TOKENS_UNTIL needs SECRET_KEY set to the key legacy tokens were signed with")
+
+class JoseBackend:
+    name = "python-jose"
+    errors = (JWTError,)
+
+    def encode(self, claims, key, headers):
+        return jose_jwt.encode(claims, key, algorithm=ALGORITHM, headers=headers)
+
+    def header(self, token):
+        return jose_jwt.get_unverified_header(token)
+
+    def decode(self, token, key):
+        return jose_jwt.decode(token, key, algorithms=[ALGORITHM])
+
+class PyJWTBackend:
+    name = "pyjwt"
+    errors = (pyjwt.PyJWTError,) if pyjwt else ()
+
+    def encode(self, claims, key, headers):
+        return pyjwt.encode(claims, key, algorithm=ALGORITHM, headers=headers)
+
+    def header(self, token):
+        return pyjwt.get_unverified_header(token)
+
+    def decode(self, token, key):
+        return pyjwt.decode(token, key, algorithms=[ALGORITHM])
+
+def get_backend(name: str = "auto"):
+    if name == "pyjwt" or (name == "auto" and pyjwt is not None):
+        if pyjwt is None:
+            raise ValueError("JWT_BACKEND=pyjwt but PyJWT is not installed")
+        return PyJWTBackend()
+    return JoseBackend()
+
+backend = get_backend(config("JWT_BACKEND", default="auto"))
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+# Revoked refresh token ids -> expiry, pruned as they expire
+_revoked = {}
+
+def _encode(data: dict, token_type: str, lifetime: timedelta):
+    claims = data.copy()
+    claims.update({"exp": datetime.utcnow() + lifetime, "type": token_type})
+    if token_type == "refresh":
+        claims["jti"] = uuid.uuid4().hex
+    return backend.encode(claims, SIGNING_KEYS[ACTIVE_KID], {"kid": ACTIVE_KID})
+
+def create_access_token(data: dict):
+    return _encode(data, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def create_refresh_token(data: dict):
+    return _encode(data, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def legacy_key():
+    """Key for tokens without a kid, or None once they are no longer accepted."""
+    if not ROTATION_KEYS:
+        return SECRET_KEY
+    if LEGACY_TOKENS_UNTIL and datetime.utcnow() < LEGACY_TOKENS_UNTIL:
+        return SECRET_KEY
+    return None
+
+def decode_token(token: str, token_type: str):
+    """Verified claims of ``token``, which must be of ``token_type``."""
+    claims = token_cache.get(token)
+    if claims is None or claims["exp"] <= time.time():
+        try:
+            kid = backend.header(token).get("kid")
+            key = SIGNING_KEYS.get(kid) if kid else legacy_key()
+            if key is None:
+                raise InvalidToken(f"unknown signing key {kid!r}" if kid else "token has no signing key id")
+            claims = backend.decode(token, key)
+        except backend.errors as e:
+            raise InvalidToken(str(e))
+        if not isinstance(claims.get("exp"), (int, float)):
+            raise InvalidToken("token has no expiry")
+        token_cache.set(token, claims)
+    if claims.get("type") != token_type or claims.get("sub") is None:
+        raise InvalidToken("wrong token type")
+    return claims
+
+def is_revoked(claims: dict):
+    return claims.get("jti") in _revoked
+
+async def revoke(db: AsyncSession, claims: dict):
+    """Record a refresh token as used. False if it already was, which for a
+    rotated token means it is being replayed."""
+    jti = claims.get("jti")
+    if jti is None:
+        # Issued before rotation existed; honoured until it expires
+        return True
+    expires_at = datetime.utcfromtimestamp(claims["exp"])
+    _revoked[jti] = expires_at
+    db.add(RevokedToken(jti=jti, expires_at=expires_at))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return True
+
+async def load_revocations(db: AsyncSession):
+    # Drop rows for tokens that have expired anyway, then mirror the rest.
+    # Run periodically, which also picks up revocations made by other workers
+    now = datetime.utcnow()
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    await db.commit()
+    rows = await db.execute(select(RevokedToken.jti, RevokedToken.expires_at))
+    _revoked.clear()
+    _revoked.update(dict(rows.all()))
+    return len(_revoked)
@@ -0,0 +1,178 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from decouple import config
+from typing import NamedTuple
+from PIL import Image
+import hashlib
+import io
+import os
+import struct
+import tempfile
+
+UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = config("MAX_UPLOAD_BYTES", default=10 * 1024 * 1024, cast=int)
+MAX_IMAGES_PER_COMPLAINT = config("MAX_IMAGES_PER_COMPLAINT", default=10, cast=int)
+# Whole multipart body: every image at its limit plus room for the form fields
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * MAX_IMAGES_PER_COMPLAINT + 1024 * 1024
+
+# The type is decided from the file's magic bytes, not the client's claim
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+]
+
+class StoredUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    content_type: str
+
+def sniff_image_type(head: bytes):
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return None, None
+
+# Metadata dropped from originals: EXIF (GPS, camera serial), XMP, IPTC and
+# text comments. Only container segments are removed, pixel data is copied
+# byte for byte
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}  # APP1 (EXIF, XMP), APP13 (IPTC), COM
+PNG_METADATA_CHUNKS = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+WEBP_METADATA_CHUNKS = {b"EXIF", b"XMP "}
+WEBP_METADATA_FLAGS = 0x08 | 0x04  # VP8X "has EXIF" and "has XMP"
+
+def _jpeg_orientation(data: bytes):
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.getexif().get(0x0112, 1)
+    except Exception:
+        return 1
+
+def _strip_jpeg(data: bytes):
+    segments, position = [], 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if marker == 0xDA or 0xD0 <= marker <= 0xD9:  # start of scan: the rest is image data
+            break
+        end = position + 2 + struct.unpack(">H", data[position + 2:position + 4])[0]
+        if marker not in JPEG_METADATA_MARKERS:
+            segments.append(data[position:end])
+        position = end
+
+    # EXIF orientation decides how the image is displayed, so it survives in
+    # a minimal EXIF segment of its own, after the JFIF header if there is one
+    orientation = _jpeg_orientation(data)
+    if orientation != 1:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        payload = exif.tobytes()
+        at = 1 if segments and segments[0][1] == 0xE0 else 0
+        segments.insert(at, b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload)
+    return data[:2] + b"".join(segments) + data[position:]
+
+def _strip_png(data: bytes):
+    out, position = [data[:8]], 8
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        end = position + 12 + length
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            out.append(data[position:end])
+        position = end
+    return b"".join(out)
+
+def _strip_webp(data: bytes):
+    out, position = [], 12
+    while position + 8 <= len(data):
+        chunk_type, length = struct.unpack("<4sI", data[position:position + 8])
+        end = position + 8 + length + (length & 1)
+        chunk = data[position:end]
+        if chunk_type == b"VP8X":
+            chunk = chunk[:8] + bytes([chunk[8] & ~WEBP_METADATA_FLAGS & 0xFF]) + chunk[9:]
+        if chunk_type not in WEBP_METADATA_CHUNKS:
+            out.append(chunk)
+        position = end
+    body = b"WEBP" + b"".join(out)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+METADATA_STRIPPERS = {
+    "image/jpeg": _strip_jpeg,
+    "image/png": _strip_png,
+    "image/webp": _strip_webp,
+}
+
+def strip_metadata(path: str, content_type: str):
+    """Remove location and camera metadata from the image at ``path`` in place.
+
+    GIFs carry none worth removing and are left alone. Returns the new size,
+    or None if the file did not change.
+    """
+    stripper = METADATA_STRIPPERS.get(content_type)
+    if stripper is None:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    stripped = stripper(data)
+    if stripped == data:
+        return None
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".strip-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(stripped)
+        os.replace(temp_path, path)
+    except BaseException:
+        _discard(temp_path)
+        raise
+    return len(stripped)
+
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+async def stream_to_temp(upload: UploadFile, directory: str = UPLOAD_DIR):
+    """Copy an upload into a temp file in ``directory`` chunk by chunk.
+
+    Type and size limits are enforced as the data arrives and the SHA-256 is
+    computed on the way through; blocking file writes run in the threadpool
+    so a large file never stalls the event loop. Metadata is then stripped
+    (see strip_metadata), so the hash names the upload as received and the
+    size is that of the stored file. Returns the temp path, which the caller
+    moves into place.
+    """
+    head = await upload.read(CHUNK_SIZE)
+    content_type, extension = sniff_image_type(head)
+    if content_type is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {upload.filename}")
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{upload.filename} exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+                chunk = await upload.read(CHUNK_SIZE)
+            await run_in_threadpool(out.flush)
+        size = await run_in_threadpool(strip_metadata, temp_path, content_type) or size
+    except BaseException:
+        _discard(temp_path)
+        raise
+
+    return temp_path, StoredUpload(temp_path, digest.hexdigest(), size, content_type), extension
@@ -16,6 +16,29 @@ class ApiClient {
     endpoint: string,
     options: RequestInit = {}
   ): Promise<T> {
+    const { data } = await this.send<T>(endpoint, options)
+    return data
+  }
+
+  // List endpoints return one page at a time and advertise the next one in
+  // the X-Next-Cursor header; follow it until the last page
+  private async requestAll<T>(endpoint: string, pageSize: number = 200): Promise<T[]> {
+    const separator = endpoint.includes('?') ? '&' : '?'
+    const rows: T[] = []
+    let cursor: string | null = null
+    do {
+      const query: string = `limit=${pageSize}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '')
+      const { data, headers } = await this.send<T[]>(`${endpoint}${separator}${query}`)
+      rows.push(...data)
+      cursor = headers.get('X-Next-Cursor')
+    } while (cursor)
+    return rows
+  }
+
+  private async send<T>(
+    endpoint: string,
+    options: RequestInit = {}
+  ): Promise<{ data: T; headers: Headers }> {
     const url = `${this.baseURL}${endpoint}`
     
     const headers: HeadersInit = {
@@ -50,7 +73,7 @@ class ApiClient {
         throw new Error(errorMessage)
       }
 
-      return await response.json()
+      return { data: await response.json(), headers: response.headers }
     } catch (error) {
       console.error(`API request failed: ${endpoint}`, error)
       throw error
@@ -138,11 +161,11 @@ class ApiClient {
   }
 
   async getComplaints() {
-    return this.request('/complaints/')
+    return this.requestAll('/complaints/')
   }
 
   async getMyComplaints() {
-    return this.request('/complaints/my')
+    return this.requestAll('/complaints/my')
   }
 
   async getComplaint(id: string) {
@@ -185,7 +208,7 @@ class ApiClient {
 
   // Users endpoints (admin only)
   async getUsers() {
-    return this.request('/users/')
+    return this.requestAll('/users/')
   }
 
   async createUser(userData: any) {